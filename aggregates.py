@@ -0,0 +1,131 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bin_store import STATUS_LABELS, status_codes
+
+
+class BinAggregates:
+    """KPI aggregates over a BinStore, kept current as readings are applied
+
+    Holds the bin count, counts per status, the running sum and sum of
+    squares of fill (for mean and variance), total capacity and the same
+    rollups per location. The aggregates subscribe to the store and apply
+    each write as a delta, so reading a KPI never scans the bins.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        with store.lock:
+            self._rebuild()
+            store.subscribe(self)
+
+    def _rebuild(self):
+        store = self.store
+        fill = store.fill_level.astype(np.float64)
+        location = store.location
+        n_locations = len(store.location_labels)
+        self._count = len(store)
+        self._fill_sum = fill.sum()
+        self._fill_sq_sum = (fill ** 2).sum()
+        self._capacity = int(store.capacity.sum())
+        self._status = np.bincount(store.status, minlength=len(STATUS_LABELS)).astype(np.int64)
+        self._loc_count = np.bincount(location, minlength=n_locations).astype(np.int64)
+        self._loc_fill_sum = np.bincount(location, weights=fill, minlength=n_locations)
+        self._loc_capacity = np.bincount(location, weights=store.capacity,
+                                         minlength=n_locations).astype(np.int64)
+        self._loc_status = np.zeros((n_locations, len(STATUS_LABELS)), dtype=np.int64)
+        np.add.at(self._loc_status, (location, store.status), 1)
+
+    def _grow_locations(self, n_locations):
+        extra = n_locations - len(self._loc_count)
+        if extra > 0:
+            self._loc_count = np.concatenate([self._loc_count, np.zeros(extra, np.int64)])
+            self._loc_fill_sum = np.concatenate([self._loc_fill_sum, np.zeros(extra)])
+            self._loc_capacity = np.concatenate([self._loc_capacity, np.zeros(extra, np.int64)])
+            self._loc_status = np.vstack([self._loc_status,
+                                          np.zeros((extra, len(STATUS_LABELS)), np.int64)])
+
+    def bins_added(self, rows):
+        store = self.store
+        fill = store.fill_level[rows].astype(np.float64)
+        location = store.location[rows]
+        status = store.status[rows]
+        capacity = store.capacity[rows]
+        with self._lock:
+            self._grow_locations(len(store.location_labels))
+            self._count += len(rows)
+            self._fill_sum += fill.sum()
+            self._fill_sq_sum += (fill ** 2).sum()
+            self._capacity += int(capacity.sum())
+            self._status += np.bincount(status, minlength=len(STATUS_LABELS))
+            np.add.at(self._loc_count, location, 1)
+            np.add.at(self._loc_fill_sum, location, fill)
+            np.add.at(self._loc_capacity, location, capacity)
+            np.add.at(self._loc_status, (location, status), 1)
+
+    def values_changed(self, name, rows, old, new):
+        if name == "fill_level":
+            self._fill_changed(rows, old, new)
+        elif name == "capacity":
+            delta = np.asarray(new, dtype=np.int64) - np.asarray(old, dtype=np.int64)
+            with self._lock:
+                self._capacity += int(delta.sum())
+                np.add.at(self._loc_capacity, self.store.location[rows], delta)
+
+    def _fill_changed(self, rows, old, new):
+        old = np.asarray(old, dtype=np.float64)
+        new = np.asarray(new, dtype=np.float64)
+        old_status, new_status = status_codes(old), status_codes(new)
+        location = self.store.location[rows]
+        moved = old_status != new_status
+        with self._lock:
+            self._fill_sum += (new - old).sum()
+            self._fill_sq_sum += (new ** 2 - old ** 2).sum()
+            np.add.at(self._loc_fill_sum, location, new - old)
+            if moved.any():
+                self._status -= np.bincount(old_status[moved], minlength=len(STATUS_LABELS))
+                self._status += np.bincount(new_status[moved], minlength=len(STATUS_LABELS))
+                np.add.at(self._loc_status, (location[moved], old_status[moved]), -1)
+                np.add.at(self._loc_status, (location[moved], new_status[moved]), 1)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def status_counts(self):
+        """Bins per status, as [green, yellow, red]"""
+        return self._status.copy()
+
+    @property
+    def fill_mean(self):
+        return self._fill_sum / self._count if self._count else float("nan")
+
+    @property
+    def fill_variance(self):
+        if not self._count:
+            return float("nan")
+        mean = self._fill_sum / self._count
+        return max(self._fill_sq_sum / self._count - mean ** 2, 0.0)
+
+    @property
+    def total_capacity(self):
+        return self._capacity
+
+    def location_summary(self):
+        """Per-location rollup: bins, average fill, capacity and status counts"""
+        with self._lock:
+            count = self._loc_count.copy()
+            frame = pd.DataFrame({
+                "location_name": self.store.location_labels[:len(count)],
+                "bins": count,
+                "avg_fill": np.divide(self._loc_fill_sum, count,
+                                      out=np.full(len(count), np.nan), where=count > 0),
+                "capacity": self._loc_capacity,
+            })
+            for code, label in enumerate(STATUS_LABELS):
+                frame[label] = self._loc_status[:, code]
+        return frame
@@ -5,14 +5,34 @@ import plotly.express as px
 import plotly.graph_objects as go
 import folium
 from streamlit_folium import folium_static
-from datetime import datetime, timedelta
+from datetime import datetime
+import os
 import time
-import requests
-from PIL import Image
-import io
-import base64
 import random
+import threading
 import google.generativeai as genai
+from state import SharedState
+from bin_store import BinStore, STATUS_LABELS, RED, YELLOW
+from ingestion import IngestionPipeline, NDJSONFileSource, SocketSource
+from spatial import GridIndex
+from map_layers import add_bin_layer, CLUSTER_THRESHOLD
+from bin_filter import BinFilterIndex
+from forecasting import FillForecaster
+from aggregates import BinAggregates
+from rollups import RollupEngine, lttb
+from archive import ReadingArchive, WeatherArchive
+from routing import Route
+from route_objectives import OBJECTIVES, RouteCosts, plan_objectives
+from fleet_routing import Fleet, plan_fleet, trip_pool
+from distance_cache import DistanceCache
+from road_network import RoadNetwork
+from jobs import JobRunner, DONE, FAILED, CANCELLED
+from ledger import LegLedger, route_legs, FUEL_PRICE_PER_L
+from simulation import FleetSimulator, FixedSchedule, ThresholdPolicy, ForecastPolicy
+from weather import (WeatherClient, WeatherService, WeatherGrid, OPENWEATHER_URL,
+                     HEAVY_RAIN_MM, HIGH_WIND_KMH, travel_time_factor)
+from weather_impact import learn_weather_impact
+from response_cache import ResponseCache
 
 # Page configuration
 st.set_page_config(
@@ -25,10 +45,51 @@ st.set_page_config(
 # API Keys Configuration
 OPENWEATHER_API_KEY = "YOUR_OPENWEATHER_API_KEY"  # Replace with your actual OpenWeather API key
 GEMINI_API_KEY = "YOUR_GEMINI_API_KEY"  # Replace with your actual Gemini API key
+WEATHER_URL = OPENWEATHER_URL  # Point at weather_stub.py to develop offline
+WEATHER_LOCATION = (40.7128, -74.0060)  # New York
+# Local weather over the service area: cells of about this size around the bins
+WEATHER_CELL_KM = 2.0
+WEATHER_MAX_CELLS = 64  # Cells grow until the bins fit in this many
+WEATHER_MAX_CONCURRENT = 4  # Weather requests in flight at once
+WEATHER_IMPACT_DAYS = 180  # Days of archived readings and weather the impact model learns from
+# Learned weather effect on fill rates (%/day) at which the weather page raises an alert
+WEATHER_IMPACT_ALERT = 1.0
+
+# IoT sensor feeds (NDJSON readings: bin_id, ts, fill_level, temperature, humidity)
+IOT_FEED_PATH = None  # Set to an NDJSON file to tail for live readings
+IOT_FEED_PORT = None  # Set to a local TCP port to accept live readings
+
+# On-disk archive of every applied reading, kept across restarts
+ARCHIVE_PATH = None  # Set to a directory to archive readings
+
+# Collection routes start and end at the depot (latitude, longitude)
+DEPOT = (40.7128, -74.0060)
+ROUTE_TIME_BUDGET = 1.0  # Seconds of local search per route
+URBAN_SPEED_KMH = 24  # Average truck speed when not routing by road
+DEPOTS = [DEPOT]  # Depots the fleet's trucks are spread over
+DISTANCE_CACHE_PATH = None  # Set to a directory to persist the distance matrix
+ROAD_NETWORK_PATH = None  # Set to an OSM (.osm/.osm.pbf) or GraphML extract to route by road
+
+# Background jobs (e.g. fleet plans) shared by every session
+JOB_WORKERS = 2
 
 # Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Assistant answers reused for the same or a paraphrased question in a similar situation
+RESPONSE_CACHE_MB = 16
+RESPONSE_CACHE_TTL_SECONDS = 6 * 60 * 60
+RESPONSE_CACHE_SIMILARITY = 0.7  # Estimated word-shingle Jaccard similarity for a paraphrase hit
+
+# Shared data refresh intervals (seconds)
+WEATHER_TTL_SECONDS = 30 * 60
+
+
+@st.cache_resource
+def get_shared_state():
+    """Process-wide state shared by all sessions and reruns"""
+    return SharedState()
+
 # Custom CSS with enhanced light green and blue theme
 st.markdown("""
 <style>
@@ -218,13 +279,223 @@ st.markdown("""
 
 class WasteManagementApp:
     def __init__(self):
-        self.bin_data = self.generate_bin_data()
-        self.waste_data = self.generate_waste_data()
-        self.weather_data = self.get_weather_data()
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
+        # Heavy data lives in shared state so a rerun only costs rendering
+        self.state = get_shared_state()
+        self.state.register("archive",
+                            lambda: ReadingArchive(ARCHIVE_PATH) if ARCHIVE_PATH else None)
+        self.state.register("bin_store", self.generate_bin_data)
+        self.state.register("waste_data", self.generate_waste_data)
+        # Refreshes itself in the background; reading it never waits on the network
+        self.state.register("weather_client", lambda: WeatherClient(OPENWEATHER_API_KEY, WEATHER_URL))
+        self.state.register("weather", lambda: WeatherService(
+            self.state.get("weather_client"), *WEATHER_LOCATION,
+            ttl=WEATHER_TTL_SECONDS, fallback=self.generate_mock_weather_data))
+        self.state.register("weather_archive", lambda: WeatherArchive(os.path.join(ARCHIVE_PATH, "weather"))
+                            if ARCHIVE_PATH else None)
+        self.state.register("weather_grid", self.load_weather_grid, depends_on=("bin_store",))
+        # Fitted by a background job from the archives; None until then
+        self.state.register("weather_impact", lambda: None)
+        self.state.register("gemini_model", lambda: genai.GenerativeModel('gemini-pro'))
+        self.state.register("response_cache", lambda: ResponseCache(
+            RESPONSE_CACHE_MB * 1024 * 1024, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY))
+        self.state.register("ingestion", self.start_ingestion)
+        self.state.register("spatial_index", lambda: GridIndex.from_store(self.bin_store),
+                            depends_on=("bin_store",))
+        self.state.register("bin_filter", lambda: BinFilterIndex(self.bin_store),
+                            depends_on=("bin_store",))
+        self.state.register("forecaster", lambda: FillForecaster(self.bin_store),
+                            depends_on=("bin_store",))
+        self.state.register("kpis", lambda: BinAggregates(self.bin_store),
+                            depends_on=("bin_store",))
+        self.state.register("rollups", self.load_rollups, depends_on=("bin_store",))
+        # Keyed by bin id, so it outlives reloads of the bin store
+        self.state.register("distance_cache", lambda: DistanceCache(DISTANCE_CACHE_PATH))
+        self.state.register("jobs", lambda: JobRunner(JOB_WORKERS))
+        # Worker processes for fleet trips, started on first use and shared by every plan
+        self.state.register("trip_pool", trip_pool)
+        self.state.register("ledger", LegLedger)
+        self.state.register("road_network", self.load_road_network)
+    
+    @property
+    def bin_store(self):
+        return self.state.get("bin_store")
+    
+    @property
+    def waste_data(self):
+        return self.state.get("waste_data")
+    
+    @property
+    def weather(self):
+        return self.state.get("weather")
+    
+    @property
+    def weather_data(self):
+        return self.weather.get()
+    
+    @property
+    def weather_grid(self):
+        return self.state.get("weather_grid").get()
+    
+    @property
+    def weather_archive(self):
+        return self.state.get("weather_archive")
+    
+    def load_weather_grid(self):
+        """Weather grid over the bins, archiving every fetched observation if configured"""
+        grid = WeatherGrid(self.state.get("weather_client"), self.bin_store.latitude,
+                           self.bin_store.longitude, WEATHER_CELL_KM, WEATHER_MAX_CELLS,
+                           ttl=WEATHER_TTL_SECONDS, max_concurrent=WEATHER_MAX_CONCURRENT)
+        if self.weather_archive is not None:
+            grid.add_listener(self.weather_archive.append)
+        return grid
+    
+    def fill_forecast(self):
+        """Fill forecast for every bin, with the learned weather impact of the forecast days once fitted"""
+        impact = self.state.get("weather_impact")
+        outlook = self.weather_data.get("outlook")
+        if impact is None or outlook is None:
+            return self.forecaster.forecast()
+        effect = impact.forecast_effect(outlook, len(self.bin_store), datetime.now().date(),
+                                        self.forecaster.horizon_days)
+        return self.forecaster.forecast(weather_effect=effect)
+    
+    def submit_weather_impact(self):
+        """Start learning every bin's weather sensitivity from the archives in the background"""
+        store = self.bin_store
+        with store.lock:
+            bin_ids = store.ids.copy()
+            latitude, longitude = store.latitude.copy(), store.longitude.copy()
+        archive, weather_archive = self.archive, self.weather_archive
+        
+        def learn(job):
+            impact = learn_weather_impact(
+                archive, weather_archive, bin_ids, latitude, longitude, time.time(), WEATHER_IMPACT_DAYS,
+                progress=lambda done, total: job.report(bins_fitted=done, bins=total)
+            )
+            self.state.set("weather_impact", impact)
+            return impact
         
+        job = self.jobs.submit("weather_impact", learn)
+        st.session_state["weather_impact_job"] = job.id
+    
+    def travel_factors(self, depots, rows):
+        """Driving-time multipliers under local rain and wind at ``depots`` followed by bin ``rows``"""
+        store = self.bin_store
+        local = self.weather_grid.at(
+            np.concatenate([[d[0] for d in depots], store.latitude[rows]]),
+            np.concatenate([[d[1] for d in depots], store.longitude[rows]]))
+        return travel_time_factor(local["rain_mm"], local["wind_speed"])
+    
+    @property
+    def gemini_model(self):
+        return self.state.get("gemini_model")
+    
+    @property
+    def response_cache(self):
+        return self.state.get("response_cache")
+    
+    @property
+    def spatial_index(self):
+        index = self.state.get("spatial_index")
+        index.sync(self.bin_store)  # picks up added or moved bins
+        return index
+    
+    @property
+    def bin_filter(self):
+        return self.state.get("bin_filter")
+    
+    @property
+    def forecaster(self):
+        return self.state.get("forecaster")
+    
+    @property
+    def kpis(self):
+        return self.state.get("kpis")
+    
+    @property
+    def rollups(self):
+        return self.state.get("rollups")
+    
+    @property
+    def archive(self):
+        return self.state.get("archive")
+    
+    @property
+    def distance_cache(self):
+        cache = self.state.get("distance_cache")
+        # Adds new or moved bins and depots; unchanged bins are never recomputed
+        cache.sync(self.bin_store, {f"DEPOT_{i+1}": depot for i, depot in enumerate(DEPOTS)})
+        return cache
+    
+    @property
+    def trip_pool(self):
+        return self.state.get("trip_pool")
+    
+    @property
+    def ledger(self):
+        return self.state.get("ledger")
+    
+    @property
+    def jobs(self):
+        return self.state.get("jobs")
+    
+    @property
+    def road_network(self):
+        return self.state.get("road_network")
+    
+    def load_road_network(self):
+        """The saved road network, or None while its hierarchy is built in the background
+        
+        Building a contraction hierarchy takes minutes on a city extract, so it
+        never runs inside a page render; routes use great-circle distances
+        until the built network replaces the None.
+        """
+        if not ROAD_NETWORK_PATH:
+            return None
+        network = RoadNetwork.cached(ROAD_NETWORK_PATH)
+        if network is None:
+            threading.Thread(target=lambda: self.state.set("road_network", RoadNetwork.open(ROAD_NETWORK_PATH)),
+                             name="road-network", daemon=True).start()
+        return network
+    
+    def road_matrices(self, depots, rows):
+        """(km, minutes) by road between ``depots`` followed by the given bin rows, or None"""
+        road = self.road_network
+        if road is None:
+            return None
+        store = self.bin_store
+        return road.matrices(np.concatenate([[lat for lat, _ in depots], store.latitude[rows]]),
+                             np.concatenate([[lon for _, lon in depots], store.longitude[rows]]))
+    
+    @property
+    def ingestion(self):
+        return self.state.get("ingestion")
+    
+    def start_ingestion(self):
+        """Start streaming IoT readings into the bin store, if a feed is configured"""
+        if IOT_FEED_PATH is None and IOT_FEED_PORT is None:
+            return None
+        
+        pipeline = IngestionPipeline(self.bin_store)
+        pipeline.add_listener(self.rollups.add_batch)
+        if self.archive is not None:
+            pipeline.add_listener(self.archive_batch)
+        if IOT_FEED_PATH is not None:
+            pipeline.add_source(NDJSONFileSource(IOT_FEED_PATH))
+        if IOT_FEED_PORT is not None:
+            pipeline.add_source(SocketSource(port=IOT_FEED_PORT))
+        pipeline.start()
+        return pipeline
+    
+    def archive_batch(self, rows, batch):
+        """Ingestion listener: append an applied batch to the reading archive"""
+        fill = np.full(len(rows), np.nan)
+        fill[np.isin(rows, batch["fill_rows"])] = batch["fill_level"]
+        self.archive.append(self.bin_store.ids[rows], batch["ts"], fill,
+                            batch["temperature"], batch["humidity"])
+    
     def generate_bin_data(self):
-        """Generate enhanced sample bin data"""
+        """Generate enhanced sample bin data into a columnar BinStore"""
         locations = [
             (40.7128, -74.0060, "Financial District"),
             (40.7589, -73.9851, "Times Square"),
@@ -237,32 +508,75 @@ class WasteManagementApp:
             (40.7549, -73.9840, "Bryant Park")
         ]
         
-        data = []
-        for i, (lat, lon, location_name) in enumerate(locations):
-            fill_level = np.random.randint(0, 100)
-            status = "green" if fill_level < 30 else "yellow" if fill_level < 80 else "red"
-            last_collected = datetime.now() - timedelta(days=np.random.randint(1, 7))
-            
-            # Generate realistic fill patterns
-            fill_history = [max(0, fill_level + np.random.randint(-10, 10)) for _ in range(7)]
-            
-            data.append({
-                "id": f"BIN_{i+1:03d}",
-                "latitude": lat,
-                "longitude": lon,
-                "location_name": location_name,
-                "fill_level": fill_level,
-                "status": status,
-                "last_collected": last_collected,
-                "address": f"{i+100} {location_name} St, New York",
-                "capacity": np.random.randint(100, 200),
-                "fill_history": fill_history,
-                "temperature": np.random.randint(15, 30),
-                "humidity": np.random.randint(40, 80),
-                "collection_count": np.random.randint(10, 50)
-            })
+        n = len(locations)
+        lats, lons, names = zip(*locations)
+        fill_level = np.random.randint(0, 100, n)
+        last_collected = np.datetime64(datetime.now(), 's') - \
+            np.random.randint(1, 7, n).astype('timedelta64[D]')
+        
+        # Generate realistic fill patterns: steady daily growth up to today's level
+        daily_rate = np.random.uniform(4, 15, n)
+        fill_history = np.clip(
+            fill_level[:, None] - daily_rate[:, None] * np.arange(6, -1, -1)
+            + np.random.randint(-3, 4, (n, 7)), 0, 100
+        )
         
-        return pd.DataFrame(data)
+        # Restore archived daily fill levels where we have them
+        bin_ids = [f"BIN_{i+1:03d}" for i in range(n)]
+        if self.archive is not None:
+            archived = self.archive.daily_means(bin_ids, time.time(), 7)
+            fill_history = np.where(np.isnan(archived), fill_history, archived)
+        
+        store = BinStore(capacity=n, history_length=7)
+        store.add_bins(
+            ids=bin_ids,
+            latitude=lats,
+            longitude=lons,
+            location_name=names,
+            fill_level=fill_level,
+            capacity=np.random.randint(100, 200, n),
+            last_collected=last_collected,
+            address=[f"{i+100} {name} St, New York" for i, name in enumerate(names)],
+            temperature=np.random.randint(15, 30, n),
+            humidity=np.random.randint(40, 80, n),
+            collection_count=np.random.randint(10, 50, n),
+            fill_history=fill_history,
+            history_ts=time.time()  # The newest sample is today's
+        )
+        return store
+    
+    def load_rollups(self):
+        """Build fill level rollups, back-filled from the archive or sample readings"""
+        store = self.bin_store
+        archive = self.archive
+        
+        if archive is not None and len(archive):
+            def backfill(start, end):
+                # Replay the window one archive segment at a time
+                row_of_code = store.index_of(archive.bin_ids)
+                for chunk in archive.scan(start, end):
+                    rows = row_of_code[chunk["bin"]]
+                    known = rows >= 0
+                    yield rows[known], chunk["ts"][known], chunk["fill_level"][known]
+            
+            # Each chart replays only the window it shows, when first drawn
+            return RollupEngine(store, backfill=backfill)
+        
+        rollups = RollupEngine(store)
+        # Simulate 5-minute readings between the daily history samples
+        history = store.history()
+        now = time.time()
+        days = history.shape[1] - 1
+        ts = np.arange(now - days * 86400, now, 300)
+        position = (ts - ts[0]) / 86400
+        day = np.minimum(position.astype(int), days - 1)
+        frac = position - day
+        readings = history[:, day] * (1 - frac) + history[:, day + 1] * frac
+        readings = np.clip(readings + np.random.uniform(-2, 2, readings.shape), 0, 100)
+        
+        rows = np.repeat(np.arange(len(store)), len(ts))
+        rollups.add(rows, np.tile(ts, len(store)), readings.ravel())
+        return rollups
     
     def generate_waste_data(self):
         """Generate enhanced waste classification data"""
@@ -286,66 +600,6 @@ class WasteManagementApp:
             'energy_saved_kwh': [3.0, 2.2, 1.5, 2.5, 0.3, 4.0, 20.0, 0, 1.0, 2.0, 1.2, 1.5]
         })
     
-    def get_weather_data(self):
-        """Fetch real weather data using OpenWeather API"""
-        try:
-            # New York coordinates
-            lat = 40.7128
-            lon = -74.0060
-            
-            # Make API call to OpenWeather
-            url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-            response = requests.get(url)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Get 5-day forecast
-                forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-                forecast_response = requests.get(forecast_url)
-                
-                forecast_data = []
-                if forecast_response.status_code == 200:
-                    forecast_json = forecast_response.json()
-                    # Get unique days from forecast
-                    seen_days = set()
-                    for item in forecast_json['list']:
-                        day = datetime.fromtimestamp(item['dt']).strftime('%A')[:3]
-                        if day not in seen_days and len(forecast_data) < 5:
-                            seen_days.add(day)
-                            forecast_data.append({
-                                "day": day,
-                                "temp": round(item['main']['temp']),
-                                "condition": item['weather'][0]['main']
-                            })
-                
-                return {
-                    "temperature": round(data['main']['temp']),
-                    "feels_like": round(data['main']['feels_like']),
-                    "humidity": data['main']['humidity'],
-                    "pressure": data['main']['pressure'],
-                    "wind_speed": round(data['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
-                    "wind_direction": self.degrees_to_direction(data['wind']['deg']),
-                    "clouds": data['clouds']['all'],
-                    "description": data['weather'][0]['description'],
-                    "icon": data['weather'][0]['icon'],
-                    "forecast": forecast_data if forecast_data else self.generate_mock_forecast()
-                }
-            else:
-                # Fallback to mock data if API fails
-                return self.generate_mock_weather_data()
-                
-        except Exception as e:
-            st.warning(f"Using mock weather data due to API error: {str(e)}")
-            return self.generate_mock_weather_data()
-    
-    def degrees_to_direction(self, degrees):
-        """Convert wind degrees to cardinal direction"""
-        directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 
-                     'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
-        ix = round(degrees / (360. / len(directions)))
-        return directions[ix % len(directions)]
-    
     def generate_mock_weather_data(self):
         """Generate mock weather data as fallback"""
         return {
@@ -372,25 +626,37 @@ class WasteManagementApp:
             for i in range(5)
         ]
     
-    def get_gemini_response(self, prompt, context=""):
-        """Get AI-generated response from Gemini"""
+    def get_gemini_response(self, prompt, context="", fingerprint=None):
+        """Get AI-generated response from Gemini
+        
+        With a context ``fingerprint``, answers come from the shared response
+        cache when the same or a paraphrased question was answered in the
+        same situation. Failed requests fall back and are not cached.
+        """
         try:
-            # Create a contextual prompt
-            full_prompt = f"""You are an EcoSmart Waste Management AI Assistant. 
-            Context about current situation: {context}
-            
-            User query: {prompt}
-            
-            Provide a helpful, concise response about waste management, recycling, or environmental sustainability.
-            Include specific tips and actionable advice when relevant.
-            """
-            
-            response = self.gemini_model.generate_content(full_prompt)
-            return response.text
+            if fingerprint is None:
+                return self.ask_gemini(prompt, context)
+            return self.response_cache.get_or_create(
+                prompt, lambda: self.ask_gemini(prompt, context), fingerprint)
             
         except Exception as e:
             return f"I'm having trouble connecting to my AI services. Here's a helpful tip: {self.get_fallback_response(prompt)}"
     
+    def ask_gemini(self, prompt, context=""):
+        """Send one prompt with its context to Gemini; raises on failure"""
+        # Create a contextual prompt
+        full_prompt = f"""You are an EcoSmart Waste Management AI Assistant. 
+        Context about current situation: {context}
+        
+        User query: {prompt}
+        
+        Provide a helpful, concise response about waste management, recycling, or environmental sustainability.
+        Include specific tips and actionable advice when relevant.
+        """
+        
+        response = self.gemini_model.generate_content(full_prompt)
+        return response.text
+    
     def get_fallback_response(self, prompt):
         """Fallback responses if Gemini API fails"""
         prompt_lower = prompt.lower()
@@ -449,16 +715,36 @@ class WasteManagementApp:
             st.markdown("### 📊 Quick Stats")
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("Active Bins", len(self.bin_data))
+                st.metric("Active Bins", self.kpis.count)
             with col2:
-                full_bins = len(self.bin_data[self.bin_data['status'] == 'red'])
+                full_bins = int(self.kpis.status_counts[RED])
                 st.metric("Full Bins", full_bins, delta="-2")
             
+            if self.ingestion is not None:
+                stats = self.ingestion.stats
+                st.caption(f"📡 Live feed: {stats['applied']:,} readings applied "
+                           f"({stats['last_batch_ms']:.0f} ms last batch)")
+            
+            if st.button("🔄 Refresh Data", use_container_width=True):
+                if self.ingestion is not None:
+                    self.ingestion.stop()
+                self.state.invalidate("bin_store", "ingestion")
+                self.weather.refresh()
+                st.rerun()
+            
             # Notifications
             st.markdown("---")
             st.markdown("### 🔔 Notifications")
             st.info("3 bins need collection")
-            st.warning("Weather alert: Rain expected")
+            local = self.weather_grid.at(self.bin_store.latitude, self.bin_store.longitude)
+            raining = int((local["rain_mm"] > 0).sum())
+            windy = int((local["wind_speed"] >= HIGH_WIND_KMH).sum())
+            if raining:
+                heavy = int((local["rain_mm"] >= HEAVY_RAIN_MM).sum())
+                st.warning(f"Weather alert: Rain at {raining:,} bins"
+                           + (f", heavy at {heavy:,}" if heavy else ""))
+            if windy:
+                st.warning(f"Weather alert: High wind at {windy:,} bins - check lids")
             
             return selection
     
@@ -480,13 +766,13 @@ class WasteManagementApp:
         with col1:
             with st.container():
                 st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                st.metric("Total Bins", len(self.bin_data), "Active")
+                st.metric("Total Bins", self.kpis.count, "Active")
                 st.markdown('</div>', unsafe_allow_html=True)
         
         with col2:
             with st.container():
                 st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                full_bins = len(self.bin_data[self.bin_data['status'] == 'red'])
+                full_bins = int(self.kpis.status_counts[RED])
                 st.metric("Bins Needing Collection", f"{full_bins}", 
                          delta="-" + str(max(0, full_bins - 3)))
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -494,7 +780,7 @@ class WasteManagementApp:
         with col3:
             with st.container():
                 st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-                avg_fill = self.bin_data['fill_level'].mean()
+                avg_fill = self.kpis.fill_mean
                 st.metric("Avg. Fill Level", f"{avg_fill:.1f}%", 
                          delta=f"{avg_fill - 50:.1f}%")
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -512,11 +798,11 @@ class WasteManagementApp:
         
         with col1:
             st.markdown("### 🎯 Bin Status Distribution")
-            status_counts = self.bin_data['status'].value_counts()
+            status_counts = self.kpis.status_counts
             
             fig = go.Figure(data=[go.Pie(
                 labels=['Empty/Good', 'Half Full', 'Full'],
-                values=status_counts.values,
+                values=status_counts,
                 hole=.4,
                 marker_colors=['#4CAF50', '#FFC107', '#F44336']
             )])
@@ -535,11 +821,11 @@ class WasteManagementApp:
         with col2:
             st.markdown("### 📈 Fill Level Trends")
             
-            # Create trend data
+            # City-wide 5-minute rollups, downsampled to a bounded number of points
+            trend = self.rollups.chart_series("5min", start=time.time() - 24 * 3600)
             trend_data = pd.DataFrame({
-                'Time': pd.date_range(start='00:00', periods=24, freq='H'),
-                'Average Fill': [30 + 20 * np.sin(i/12 * np.pi) + np.random.randint(-5, 5) 
-                                for i in range(24)]
+                'Time': trend['time'],
+                'Average Fill': trend['mean']
             })
             
             fig = px.line(trend_data, x='Time', y='Average Fill', 
@@ -574,6 +860,7 @@ class WasteManagementApp:
         """Enhanced smart bin monitoring section"""
         st.markdown('<h2 class="section-header">🗑️ Smart Bin Monitoring & Analytics</h2>', 
                    unsafe_allow_html=True)
+        store = self.bin_store
         
         # Filters
         col1, col2, col3 = st.columns(3)
@@ -588,22 +875,18 @@ class WasteManagementApp:
         with col2:
             location_filter = st.selectbox(
                 "Filter by Location",
-                options=["All Locations"] + list(self.bin_data['location_name'].unique())
+                options=["All Locations"] + store.location_labels
             )
         
         with col3:
             fill_threshold = st.slider("Fill Level Threshold", 0, 100, 50)
         
-        # Apply filters
-        filtered_data = self.bin_data.copy()
-        
-        if status_filter:
-            filtered_data = filtered_data[filtered_data['status'].str.capitalize().isin(status_filter)]
-        
-        if location_filter != "All Locations":
-            filtered_data = filtered_data[filtered_data['location_name'] == location_filter]
-        
-        filtered_data = filtered_data[filtered_data['fill_level'] >= fill_threshold]
+        # Resolve the filters once to row numbers; every view below reuses them
+        filtered_rows = self.bin_filter.select(
+            statuses=[STATUS_LABELS.index(s.lower()) for s in status_filter] or None,
+            location=None if location_filter == "All Locations" else store.location_code(location_filter),
+            min_fill=fill_threshold
+        )
         
         # Map and data
         col1, col2 = st.columns([2, 1])
@@ -618,42 +901,10 @@ class WasteManagementApp:
                 tiles='CartoDB positron'
             )
             
-            # Add markers for each bin
-            for _, bin in filtered_data.iterrows():
-                # Determine color and icon
-                if bin['status'] == 'green':
-                    color = 'green'
-                    icon = 'check'
-                elif bin['status'] == 'yellow':
-                    color = 'orange'
-                    icon = 'info-sign'
-                else:
-                    color = 'red'
-                    icon = 'exclamation-sign'
-                
-                # Create popup with detailed info
-                popup_html = f"""
-                <div style="font-family: Arial; min-width: 200px;">
-                    <h4 style="color: #4CAF50; margin: 0;">{bin['id']}</h4>
-                    <p style="margin: 5px 0;"><b>Location:</b> {bin['location_name']}</p>
-                    <p style="margin: 5px 0;"><b>Fill Level:</b> {bin['fill_level']}%</p>
-                    <p style="margin: 5px 0;"><b>Status:</b> 
-                        <span style="color: {'green' if bin['status'] == 'green' else 'orange' if bin['status'] == 'yellow' else 'red'};">
-                            {bin['status'].upper()}
-                        </span>
-                    </p>
-                    <p style="margin: 5px 0;"><b>Last Collected:</b> {bin['last_collected'].strftime('%Y-%m-%d')}</p>
-                    <p style="margin: 5px 0;"><b>Temperature:</b> {bin['temperature']}°C</p>
-                    <p style="margin: 5px 0;"><b>Humidity:</b> {bin['humidity']}%</p>
-                </div>
-                """
-                
-                folium.Marker(
-                    [bin['latitude'], bin['longitude']],
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{bin['id']} - {bin['fill_level']}%",
-                    icon=folium.Icon(color=color, icon=icon)
-                ).add_to(m)
+            # Add all bins as one GeoJSON layer (clustered when there are many)
+            mode = add_bin_layer(m, store, filtered_rows, CLUSTER_THRESHOLD)
+            if mode == "clusters":
+                st.caption(f"Showing {len(filtered_rows):,} bins as aggregated clusters")
             
             # Display map
             folium_static(m, width=800, height=500)
@@ -663,18 +914,16 @@ class WasteManagementApp:
             
             # Summary statistics
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("Filtered Bins", len(filtered_data))
-            st.metric("Average Fill", f"{filtered_data['fill_level'].mean():.1f}%")
-            st.metric("Total Capacity", f"{filtered_data['capacity'].sum()} kg")
+            st.metric("Filtered Bins", len(filtered_rows))
+            st.metric("Average Fill", f"{store.fill_level[filtered_rows].mean():.1f}%")
+            st.metric("Total Capacity", f"{store.capacity[filtered_rows].sum()} kg")
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Status breakdown
-            status_counts = filtered_data['status'].value_counts()
+            status_counts = store.status_counts(filtered_rows)
             fig = go.Figure(data=[go.Bar(
                 x=['Good', 'Half', 'Full'],
-                y=[status_counts.get('green', 0), 
-                   status_counts.get('yellow', 0), 
-                   status_counts.get('red', 0)],
+                y=status_counts,
                 marker_color=['#4CAF50', '#FFC107', '#F44336']
             )])
             fig.update_layout(
@@ -691,14 +940,14 @@ class WasteManagementApp:
             if st.button("Generate Report", use_container_width=True):
                 st.success("Report generated successfully!")
             if st.button("Export Data", use_container_width=True):
-                csv = filtered_data.to_csv(index=False)
+                csv = store.to_frame(filtered_rows).to_csv(index=False)
                 st.download_button("Download CSV", csv, "bin_data.csv", "text/csv")
         
         # Detailed data table
         st.markdown("### 📋 Detailed Bin Information")
         st.dataframe(
-            filtered_data[['id', 'location_name', 'fill_level', 'status', 
-                          'last_collected', 'temperature', 'humidity']],
+            store.to_frame(filtered_rows, ['id', 'location_name', 'fill_level', 'status', 
+                                           'last_collected', 'temperature', 'humidity']),
             use_container_width=True,
             hide_index=True
         )
@@ -713,13 +962,11 @@ class WasteManagementApp:
             
             if st.button("Generate Prediction", use_container_width=True):
                 with st.spinner("Analyzing historical patterns..."):
-                    time.sleep(2)
-                    
-                    # Generate mock prediction
-                    future_fill = []
-                    for i in range(days):
-                        daily_fill = min(100, 50 + 15 * i + np.random.randint(-10, 10))
-                        future_fill.append(daily_fill)
+                    # Forecasts for every bin come from one batched fit, cached
+                    # until new readings arrive
+                    forecast = self.fill_forecast()
+                    future_fill = forecast.predicted[filtered_rows, :days].mean(axis=0) \
+                        if len(filtered_rows) else np.zeros(days)
                     
                     pred_data = pd.DataFrame({
                         'Day': range(1, days + 1),
@@ -736,20 +983,34 @@ class WasteManagementApp:
                     )
                     st.plotly_chart(fig, use_container_width=True)
                     
-                    st.success(f"Prediction complete: {np.random.randint(3, 8)} bins will reach capacity")
+                    full_soon = forecast.full_within(days, filtered_rows)
+                    st.success(f"Prediction complete: {len(full_soon)} bins will reach capacity "
+                               f"within {days} days")
+                    if len(full_soon):
+                        st.dataframe(
+                            pd.DataFrame({
+                                'Bin': store.ids[full_soon],
+                                'Current Fill %': store.fill_level[full_soon].round(),
+                                'Days to Full': forecast.days_to_full[full_soon]
+                            }).sort_values('Days to Full'),
+                            use_container_width=True,
+                            hide_index=True
+                        )
         
         with col2:
             st.markdown("### 📈 Historical Trends")
             
             # Display fill history for selected bin
-            selected_bin = st.selectbox("Select Bin for History", filtered_data['id'].tolist())
+            selected_bin = st.selectbox("Select Bin for History", store.ids[filtered_rows].tolist())
             
             if selected_bin:
-                bin_history = filtered_data[filtered_data['id'] == selected_bin].iloc[0]['fill_history']
+                row = store.index_of([selected_bin])[0]
+                bin_history = self.rollups.chart_series("daily", row=row,
+                                                        start=time.time() - 7 * 86400)
                 
                 hist_data = pd.DataFrame({
-                    'Day': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-                    'Fill Level': bin_history
+                    'Day': bin_history['time'].dt.strftime('%a %d'),
+                    'Fill Level': bin_history['mean'].round(1)
                 })
                 
                 fig = px.bar(hist_data, x='Day', y='Fill Level',
@@ -761,36 +1022,93 @@ class WasteManagementApp:
                     plot_bgcolor='rgba(0,0,0,0)'
                 )
                 st.plotly_chart(fig, use_container_width=True)
+                
+                if self.archive is not None:
+                    # Long-term readings straight from the on-disk archive
+                    range_days = st.selectbox("Archive Range", [30, 90, 365],
+                                              format_func=lambda d: f"Last {d} days")
+                    archived = self.archive.read_bin(selected_bin, start=time.time() - range_days * 86400)
+                    archived = archived.dropna(subset=['fill_level'])
+                    if len(archived):
+                        keep = lttb(archived['ts'], archived['fill_level'], 300)
+                        fig = px.line(archived.iloc[keep], x='time', y='fill_level',
+                                      title=f"Archived Readings - {selected_bin}",
+                                      labels={'time': 'Time', 'fill_level': 'Fill Level'})
+                        fig.update_traces(line_color='#4CAF50')
+                        fig.update_layout(
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            plot_bgcolor='rgba(0,0,0,0)'
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                
+                # Nearest neighbouring bins, e.g. to combine pickups
+                st.markdown("**📍 Nearby Bins**")
+                near_rows, near_km = self.spatial_index.nearest(
+                    store.latitude[row], store.longitude[row], k=3, exclude=[row]
+                )
+                for near_row, km in zip(near_rows, near_km):
+                    st.markdown(f"• {store.ids[near_row]} - {km:.2f} km "
+                                f"({store.fill_level[near_row]:.0f}% full)")
     
     def route_optimization(self):
         """Enhanced route optimization section"""
         st.markdown('<h2 class="section-header">🚚 Smart Route Optimization</h2>', 
                    unsafe_allow_html=True)
         
+        planning_mode = st.radio("Planning Mode", ["Single Truck", "Fleet", "Strategy Simulator"],
+                                 horizontal=True)
+        if planning_mode == "Fleet":
+            self.fleet_route_optimization()
+            return
+        if planning_mode == "Strategy Simulator":
+            self.collection_strategy_simulator()
+            return
+        
         col1, col2 = st.columns([2, 1])
         
         with col1:
             st.markdown("### 🗺️ Optimized Collection Route")
             
             # Get bins that need collection (red and yellow)
-            collection_bins = self.bin_data[self.bin_data['status'].isin(['red', 'yellow'])].copy()
+            store = self.bin_store
+            collection_rows = np.flatnonzero(store.status >= YELLOW)
+            
+            # Round trip from the depot through every stop, by road if configured
+            stop_ids = store.ids[collection_rows].tolist()
+            road = self.road_matrices([DEPOT], collection_rows)
+            if road is None:
+                road_km = self.distance_cache.submatrix(["DEPOT_1"] + stop_ids)
+                road_minutes = road_km / URBAN_SPEED_KMH * 60
+            else:
+                road_km, road_minutes = road
+            # Rain and wind where each leg ends slow the truck down
+            road_minutes = road_minutes * self.travel_factors([DEPOT], collection_rows)
+            route, plan, costs = self.collection_route(collection_rows, road_km, road_minutes)
+            collection_bins = store.to_frame(collection_rows[route.stops])
+            
+            # Visiting by priority alone (red first, fullest first), for comparison
+            priority_order = np.lexsort((-store.fill_level[collection_rows],
+                                         -store.status[collection_rows]))
+            priority_path = np.concatenate([[0], priority_order + 1, [0]])
+            
+            # Per-leg distance, time, fuel and CO2 of both, with the load on board
+            stop_load_kg = store.capacity[collection_rows] * store.fill_level[collection_rows] / 100
+            path = np.concatenate([[0], route.stops + 1, [0]])
+            legs = route_legs(road_km[path[:-1], path[1:]], road_minutes[path[:-1], path[1:]],
+                              stop_load_kg[route.stops])
+            priority_legs = route_legs(road_km[priority_path[:-1], priority_path[1:]],
+                                       road_minutes[priority_path[:-1], priority_path[1:]],
+                                       stop_load_kg[priority_order])
+            priority_km = priority_legs["km"].sum()
             
             if len(collection_bins) > 0:
                 # Create map
-                m = folium.Map(location=[40.7128, -74.0060], zoom_start=13,
+                m = folium.Map(location=list(DEPOT), zoom_start=13,
                               tiles='CartoDB positron')
                 
-                # Generate optimal route (simplified TSP)
-                route_points = []
-                current_pos = [40.7128, -74.0060]  # Start from depot
+                route_points = [list(DEPOT)]
                 
-                # Sort by priority (red first) and distance
-                priority_bins = collection_bins.sort_values(
-                    by=['status', 'fill_level'], 
-                    ascending=[True, False]
-                )
-                
-                for idx, (_, bin) in enumerate(priority_bins.iterrows()):
+                for idx, (_, bin) in enumerate(collection_bins.iterrows()):
                     point = [bin['latitude'], bin['longitude']]
                     route_points.append(point)
                     
@@ -802,7 +1120,7 @@ class WasteManagementApp:
                     <div style="font-family: Arial;">
                         <h4>Stop {idx + 1}: {bin['id']}</h4>
                         <p><b>Status:</b> {bin['status'].upper()}</p>
-                        <p><b>Fill Level:</b> {bin['fill_level']}%</p>
+                        <p><b>Fill Level:</b> {bin['fill_level']:.0f}%</p>
                         <p><b>Location:</b> {bin['location_name']}</p>
                     </div>
                     """
@@ -810,11 +1128,12 @@ class WasteManagementApp:
                     folium.Marker(
                         point,
                         popup=folium.Popup(popup_html, max_width=200),
-                        tooltip=f"Stop {idx + 1}: {bin['fill_level']}%",
+                        tooltip=f"Stop {idx + 1}: {bin['fill_level']:.0f}%",
                         icon=folium.Icon(color=color, icon='truck' if idx == 0 else 'info-sign')
                     ).add_to(m)
                 
-                # Add route line
+                # Add route line, back to the depot
+                route_points.append(list(DEPOT))
                 if len(route_points) > 1:
                     folium.PolyLine(
                         route_points,
@@ -830,17 +1149,17 @@ class WasteManagementApp:
                             (route_points[i][0] + route_points[i+1][0])/2,
                             (route_points[i][1] + route_points[i+1][1])/2
                         ]
-                        distance = np.random.randint(1, 5)  # Mock distance
+                        distance = route.leg_km[i]
                         folium.Marker(
                             mid_point,
                             icon=folium.DivIcon(
-                                html=f'<div style="background: white; padding: 2px 5px; border-radius: 10px; border: 2px solid #2196F3;">{distance}km</div>'
+                                html=f'<div style="background: white; padding: 2px 5px; border-radius: 10px; border: 2px solid #2196F3;">{distance:.1f}km</div>'
                             )
                         ).add_to(m)
                 
                 # Add depot marker
                 folium.Marker(
-                    [40.7128, -74.0060],
+                    list(DEPOT),
                     popup="Depot",
                     tooltip="Start/End Point",
                     icon=folium.Icon(color='green', icon='home')
@@ -855,40 +1174,369 @@ class WasteManagementApp:
             
             # Route statistics
             num_stops = len(collection_bins)
-            total_distance = num_stops * 3.2  # Mock calculation
-            estimated_time = total_distance * 2.5  # Mock calculation
+            total_distance = route.total_km
+            objectives = costs.summary(plan["tours"])
+            estimated_time = legs["minutes"].sum()
             
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.metric("Total Stops", num_stops)
-            st.metric("Total Distance", f"{total_distance:.1f} km")
+            st.metric("Total Distance", f"{total_distance:.1f} km",
+                      delta=f"{total_distance - priority_km:.1f} km vs. priority order",
+                      delta_color="inverse")
             st.metric("Estimated Time", f"{estimated_time:.1f} min")
-            st.metric("Fuel Required", f"{(total_distance/5):.1f} L")
+            st.metric("Fuel Required", f"{legs['fuel_l'].sum():.1f} L")
+            st.metric("CO2 Emitted", f"{legs['co2_kg'].sum():.1f} kg")
             st.markdown('</div>', unsafe_allow_html=True)
             
-            # Savings
+            # Savings against visiting the same stops in priority order
             st.markdown("### 💰 Estimated Savings")
+            saved = priority_legs[["minutes", "fuel_l", "co2_kg"]].sum() - legs[["minutes", "fuel_l", "co2_kg"]].sum()
             
             savings_data = {
-                "Fuel Savings": f"${num_stops * 3:.2f}",
-                "Time Savings": f"{num_stops * 5} min",
-                "CO2 Reduction": f"{num_stops * 2.5} kg"
+                "Fuel Savings": f"${saved['fuel_l'] * FUEL_PRICE_PER_L:.2f}",
+                "Time Savings": f"{saved['minutes']:.0f} min",
+                "CO2 Reduction": f"{saved['co2_kg']:.1f} kg"
             }
             
             for label, value in savings_data.items():
                 st.success(f"**{label}:** {value}")
             
+            with st.expander("Per-Leg Accounting"):
+                st.dataframe(
+                    legs.assign(leg=legs["leg"] + 1).rename(columns={
+                        "leg": "Leg", "km": "Distance (km)", "minutes": "Time (min)",
+                        "load_kg": "Load (kg)", "fuel_l": "Fuel (L)", "co2_kg": "CO2 (kg)"
+                    }).round(2),
+                    use_container_width=True, hide_index=True
+                )
+            
             # Route optimization options
             st.markdown("### ⚙️ Optimization Options")
             
-            optimization_goal = st.radio(
-                "Optimize for:",
-                ["Shortest Time", "Minimum Fuel", "Priority Bins First"]
+            st.radio("Optimize for:", OBJECTIVES, key="route_goal")
+            
+            # Every objective's plan side by side; dominated plans are worse on all three
+            st.dataframe(
+                objectives.reset_index().rename(columns={
+                    "objective": "Objective", "minutes": "Time (min)", "km": "Distance (km)",
+                    "fuel_l": "Fuel (L)", "overflow_risk": "Overflow Risk", "pareto": "Pareto-Optimal"
+                }).round(2),
+                use_container_width=True, hide_index=True
+            )
+            
+            st.button("Re-optimize Route", use_container_width=True,
+                      on_click=lambda: st.session_state.update(route_reoptimize=True))
+            if plan["reoptimized"]:
+                st.success(f"Routes re-optimized in {plan['ms']:.0f} ms "
+                           f"({plan['added']} stops added, {plan['removed']} removed)!")
+    
+    def collection_strategy_simulator(self):
+        """Compare collection policies over simulated months of operation"""
+        st.markdown("### 🧪 Collection Strategy Simulator")
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            days = st.slider("Simulated Days", 30, 365, 365, step=5)
+        with col2:
+            trucks = st.number_input("Trucks", 1, 100, 3, key="sim_trucks")
+        with col3:
+            payload_kg = st.number_input("Payload per Truck (kg)", 100, 20000, 500, step=100,
+                                         key="sim_payload")
+        with col4:
+            threshold = st.slider("Threshold Policy (% full)", 50, 95, 80, step=5)
+        
+        policies = [FixedSchedule(1), FixedSchedule(3), ThresholdPolicy(threshold), ForecastPolicy(1)]
+        simulator = FleetSimulator.from_store(self.bin_store, self.fill_forecast(), DEPOTS,
+                                              trucks=trucks, payload_kg=payload_kg)
+        started = time.perf_counter()
+        runs = {policy.name: simulator.run(policy, days) for policy in policies}
+        elapsed = time.perf_counter() - started
+        
+        totals = pd.DataFrame([{"Policy": name, **run.drop(columns="day").sum().to_dict()}
+                               for name, run in runs.items()])
+        st.dataframe(
+            totals.rename(columns={
+                "collections": "Collections", "overflows": "Overflows",
+                "overflow_hours": "Overflow Hours", "km": "Distance (km)", "fuel_l": "Fuel (L)"
+            }).round(0),
+            use_container_width=True, hide_index=True
+        )
+        st.caption(f"{len(policies)} policies × {days} days × {len(simulator.fill_level)} bins "
+                   f"simulated in {elapsed:.2f} s")
+        
+        cumulative = pd.concat([
+            pd.DataFrame({"Day": run["day"], "Overflows": run["overflows"].cumsum(),
+                          "Distance (km)": run["km"].cumsum(), "Policy": name})
+            for name, run in runs.items()
+        ])
+        col1, col2 = st.columns(2)
+        for col, metric in ((col1, "Overflows"), (col2, "Distance (km)")):
+            fig = px.line(cumulative, x="Day", y=metric, color="Policy",
+                          title=f"Cumulative {metric}")
+            fig.update_layout(
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)'
+            )
+            with col:
+                st.plotly_chart(fig, use_container_width=True)
+    
+    def submit_fleet_plan(self, params):
+        """Start planning the fleet's routes for the bins needing collection now"""
+        store = self.bin_store
+        with store.lock:
+            collection_rows = np.flatnonzero(store.status >= YELLOW)
+            latitude = store.latitude[collection_rows].copy()
+            longitude = store.longitude[collection_rows].copy()
+            load_kg = store.capacity[collection_rows] * store.fill_level[collection_rows] / 100
+            stop_ids = store.ids[collection_rows].tolist()
+        trucks, payload_kg, shift_hours = params
+        fleet = Fleet(DEPOTS, trucks, payload_kg, shift_hours)
+        if len(collection_rows):
+            fleet.speed_kmh /= np.median(self.travel_factors(DEPOTS, collection_rows))
+        road_network, pool = self.road_network, self.trip_pool
+        
+        def solve(job):
+            # Only the copies taken under the lock; the store may change meanwhile
+            road = None if road_network is None else road_network.matrices(
+                np.r_[[lat for lat, _ in DEPOTS], latitude], np.r_[[lon for _, lon in DEPOTS], longitude])
+            if road is None:
+                cache = self.distance_cache
+                distances = lambda d, stops: cache.submatrix([f"DEPOT_{d+1}"] + [stop_ids[i] for i in stops])
+            else:
+                # One road matrix over every depot and stop, sliced per trip
+                road_km = (road[0] + road[0].T) / 2
+                
+                def distances(d, stops):
+                    points = np.concatenate([[d], len(DEPOTS) + stops])
+                    return road_km[np.ix_(points, points)]
+            plan = plan_fleet(
+                fleet, latitude, longitude, load_kg, ROUTE_TIME_BUDGET, distances=distances,
+                progress=lambda solved, total, km: job.report(trips_solved=solved, trips=total, km=km),
+                pool=pool
+            )
+            return {"params": params, "fleet": fleet, "rows": collection_rows, "plan": plan}
+        
+        job = self.jobs.submit("fleet_plan", solve)
+        st.session_state["fleet_job"] = {"id": job.id, "params": params}
+        return job
+    
+    def collection_route(self, rows, km, minutes):
+        """Round trip from the depot (row/column 0 of ``km``/``minutes``) through bin ``rows``
+        
+        One shared set of cost matrices yields the best route under every
+        objective, so switching "Optimize for" is instant. The first plan of
+        a session is solved from scratch; after that the session's routes
+        are warm-started: collected bins are dropped, new ones inserted, and
+        local moves run only around the changed stops. "Re-optimize Route"
+        re-improves the whole of every route.
+        Returns the selected route, the session's plan record and the costs.
+        """
+        store = self.bin_store
+        stop_ids = store.ids[rows].tolist()
+        costs = RouteCosts(km, minutes, store.fill_level[rows],
+                           self.fill_forecast().next_day_rate[rows], store.status[rows])
+        previous = st.session_state.get("route_plan")
+        reoptimize = st.session_state.pop("route_reoptimize", False)
+        goal = st.session_state.get("route_goal", OBJECTIVES[0])
+        
+        started = time.perf_counter()
+        if previous is None:
+            tours = plan_objectives(costs, ROUTE_TIME_BUDGET)
+            added, removed = len(stop_ids), 0
+        else:
+            index = {stop_id: i + 1 for i, stop_id in enumerate(stop_ids)}
+            tours = {objective: [0] + [index.get(stop_id, -1) for stop_id in stops]
+                     for objective, stops in previous["stops"].items()}
+            inserted = sorted(set(index.values()) - set(tours[goal]))
+            added, removed = len(inserted), tours[goal].count(-1)
+            tours = plan_objectives(costs, ROUTE_TIME_BUDGET, tours, inserted, full=reoptimize)
+        
+        tour = tours[goal]
+        route = Route(tour[1:] - 1, km[tour, np.roll(tour, -1)])
+        plan = st.session_state["route_plan"] = {
+            "stops": {objective: [stop_ids[i - 1] for i in t[1:]] for objective, t in tours.items()},
+            "tours": tours,
+            "ms": (time.perf_counter() - started) * 1000,
+            "added": added,
+            "removed": removed,
+            "reoptimized": reoptimize,
+        }
+        return route, plan, costs
+    
+    def fleet_route_optimization(self):
+        """Capacitated multi-truck collection plan, solved in the background"""
+        replan = st.session_state.pop("fleet_replan", False)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            trucks = st.number_input("Trucks", 1, 100, 3)
+        with col2:
+            payload_kg = st.number_input("Payload per Truck (kg)", 100, 20000, 500, step=100)
+        with col3:
+            shift_hours = st.slider("Shift Length (hours)", 2, 12, 8)
+        params = (trucks, payload_kg, shift_hours)
+        
+        # Hand a finished job's plan over to the session
+        submitted = st.session_state.get("fleet_job")
+        job = self.jobs.get(submitted["id"]) if submitted else None
+        if submitted and (job is None or job.finished):
+            self.jobs.pop(submitted["id"])
+            del st.session_state["fleet_job"]
+            if job is not None and job.state == DONE:
+                st.session_state["fleet_plan"] = job.result
+            elif job is not None and job.state == FAILED:
+                st.error(f"Fleet planning failed: {job.error}")
+            elif job is not None and job.state == CANCELLED:
+                st.session_state["fleet_cancelled"] = submitted["params"]
+            job = None
+        
+        result = st.session_state.get("fleet_plan")
+        stale = result is None or result["params"] != params
+        if job is None and (replan or (stale and st.session_state.get("fleet_cancelled") != params)):
+            job = self.submit_fleet_plan(params)
+        
+        if job is not None:
+            @st.fragment(run_every=1.0)
+            def planning_status():
+                if job.finished:
+                    st.rerun()
+                progress = job.snapshot()
+                solved, total = progress.get("trips_solved", 0), progress.get("trips", 0)
+                st.progress(solved / total if total else 0.0,
+                            text=f"Planning fleet routes in the background: {solved} / {total} trips, "
+                                 f"{progress.get('km', 0.0):.1f} km so far")
+                st.button("Cancel Planning", on_click=job.cancel)
+            planning_status()
+        else:
+            st.button("Plan Fleet Routes", on_click=lambda: st.session_state.update(fleet_replan=True))
+        
+        if result is None:
+            if job is None and st.session_state.get("fleet_cancelled") == params:
+                st.info("Fleet planning was cancelled.")
+            return
+        if stale:
+            st.caption("Showing the last completed plan.")
+        fleet, collection_rows, plan = result["fleet"], result["rows"], result["plan"]
+        store = self.bin_store
+        summary = plan.summary()
+        
+        col1, col2 = st.columns([2, 1])
+        
+        with col1:
+            st.markdown("### 🗺️ Fleet Collection Routes")
+            m = folium.Map(location=list(DEPOTS[0]), zoom_start=13, tiles='CartoDB positron')
+            palette = px.colors.qualitative.Bold
+            
+            for trip in plan.trips:
+                if trip.truck < 0:
+                    continue
+                color = palette[trip.truck % len(palette)]
+                depot = list(fleet.depots[trip.depot])
+                rows = collection_rows[trip.stops]
+                points = [[lat, lon] for lat, lon in zip(store.latitude[rows], store.longitude[rows])]
+                folium.PolyLine([depot] + points + [depot], color=color, weight=4,
+                                opacity=0.8, tooltip=f"Truck {trip.truck + 1}").add_to(m)
+                for stop, (row, point) in enumerate(zip(rows, points)):
+                    folium.CircleMarker(
+                        point, radius=6, color=color, fill=True, fill_opacity=0.9,
+                        tooltip=f"Truck {trip.truck + 1}, stop {stop + 1}: {store.ids[row]} "
+                                f"({store.fill_level[row]:.0f}%)"
+                    ).add_to(m)
+            
+            for row in collection_rows[plan.unserved]:
+                folium.CircleMarker(
+                    [store.latitude[row], store.longitude[row]], radius=6, color='black',
+                    fill=True, fill_opacity=0.5, tooltip=f"Unserved: {store.ids[row]}"
+                ).add_to(m)
+            
+            for i, depot in enumerate(fleet.depots):
+                folium.Marker(
+                    list(depot),
+                    popup=f"Depot {i + 1}",
+                    tooltip="Start/End Point",
+                    icon=folium.Icon(color='green', icon='home')
+                ).add_to(m)
+            
+            folium_static(m, width=800, height=500)
+        
+        with col2:
+            st.markdown("### 📊 Fleet Summary")
+            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+            st.metric("Trucks Used", f"{len(summary)} / {fleet.trucks}")
+            st.metric("Trips", int(summary['trips'].sum()))
+            st.metric("Total Distance", f"{plan.total_km:.1f} km")
+            st.metric("Unserved Stops", len(plan.unserved))
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown("### 🚛 Truck Plans")
+        st.dataframe(
+            summary.assign(truck=summary['truck'] + 1, depot=summary['depot'] + 1)
+                   .round({'load_kg': 0, 'km': 1, 'minutes': 0}),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        if len(summary):
+            truck = st.selectbox("Load Profile for Truck", (summary['truck'] + 1).tolist()) - 1
+            profile = pd.concat([
+                pd.DataFrame({'Trip': f"Trip {i + 1}",
+                              'Stop': np.arange(1, len(trip.stops) + 1),
+                              'Load (kg)': trip.load_kg})
+                for i, trip in enumerate(plan.truck_trips(truck))
+            ])
+            fig = px.line(profile, x='Stop', y='Load (kg)', color='Trip', markers=True,
+                          title=f"Truck {truck + 1} Load Profile")
+            fig.add_hline(y=fleet.payload_kg[truck], line_dash='dash', annotation_text='Payload')
+            fig.update_layout(
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)'
             )
+            st.plotly_chart(fig, use_container_width=True)
             
-            if st.button("Re-optimize Route", use_container_width=True):
-                with st.spinner("Calculating optimal route..."):
-                    time.sleep(2)
-                    st.success(f"Route optimized for {optimization_goal}!")
+            if st.button("Dispatch Plan", disabled=result.get("dispatched", False)):
+                # Record every trip's legs as driven today
+                today = datetime.now().date()
+                for i, trip in enumerate(t for t in plan.trips if t.truck >= 0):
+                    stop_load_kg = np.diff(trip.load_kg, prepend=0.0)
+                    self.ledger.append(today, trip.depot, trip.truck, i, route_legs(
+                        trip.leg_km, trip.leg_km / fleet.speed_kmh * 60, stop_load_kg))
+                result["dispatched"] = True
+                st.success(f"Dispatched {int(summary['trips'].sum())} trips to the ledger")
+        
+        self.fleet_report()
+    
+    def fleet_report(self):
+        """Weekly or monthly distance, time, fuel and CO2 from the leg ledger"""
+        st.markdown("### 📒 Fleet Report")
+        ledger = self.ledger
+        if not len(ledger):
+            st.info("No dispatched routes yet. Dispatch a fleet plan to start the ledger.")
+            return
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            freq = st.radio("Period", ["Weekly", "Monthly"], horizontal=True)
+        with col2:
+            group = st.radio("Per", ["Truck", "Depot"], horizontal=True)
+        report = ledger.report({"Weekly": "W", "Monthly": "M"}[freq], by=(group.lower(),))
+        report[group.lower()] += 1
+        
+        fig = px.bar(report, x='period', y='fuel_l', color=report[group.lower()].astype(str),
+                     labels={'period': "Week" if freq == "Weekly" else "Month",
+                             'fuel_l': 'Fuel (L)', 'color': group},
+                     title=f"Fuel per {group}")
+        fig.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(
+            report.rename(columns={
+                "period": "Period", group.lower(): group, "km": "Distance (km)",
+                "minutes": "Time (min)", "fuel_l": "Fuel (L)", "co2_kg": "CO2 (kg)", "legs": "Legs"
+            }).round(1),
+            use_container_width=True, hide_index=True
+        )
     
     def waste_classification(self):
         """Enhanced waste classification section"""
@@ -1413,42 +2061,104 @@ class WasteManagementApp:
         st.markdown('<h2 class="section-header">🌤️ Weather Impact Analysis</h2>', 
                    unsafe_allow_html=True)
         
+        if self.weather.last_error is not None:
+            shown = "sample data" if self.weather.age is None else "the last known conditions"
+            st.warning(f"Weather service unavailable ({self.weather.last_error}); showing {shown}.")
+        
+        # One snapshot for the whole page; a background refresh may land mid-render
+        weather = self.weather_data
+        
         # Current weather
         col1, col2, col3 = st.columns(3)
         
         with col1:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.markdown(f"### 🌡️ {self.weather_data['temperature']}°C")
-            st.markdown(f"Feels like: {self.weather_data['feels_like']}°C")
-            st.markdown(f"**{self.weather_data['description'].title()}**")
+            st.markdown(f"### 🌡️ {weather['temperature']}°C")
+            st.markdown(f"Feels like: {weather['feels_like']}°C")
+            st.markdown(f"**{weather['description'].title()}**")
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col2:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.markdown(f"### 💧 Humidity")
-            st.markdown(f"{self.weather_data['humidity']}%")
-            st.markdown(f"Pressure: {self.weather_data['pressure']} hPa")
+            st.markdown(f"{weather['humidity']}%")
+            st.markdown(f"Pressure: {weather['pressure']} hPa")
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col3:
             st.markdown('<div class="metric-card">', unsafe_allow_html=True)
             st.markdown(f"### 💨 Wind")
-            st.markdown(f"{self.weather_data['wind_speed']} km/h")
-            st.markdown(f"Direction: {self.weather_data['wind_direction']}")
+            st.markdown(f"{weather['wind_speed']} km/h")
+            st.markdown(f"Direction: {weather['wind_direction']}")
             st.markdown('</div>', unsafe_allow_html=True)
         
+        # Local conditions across the service area
+        grid = self.weather_grid
+        with st.expander(f"🗺️ Local Conditions ({grid.fetched} of {len(grid)} areas, "
+                         f"~{grid.cell_km:.1f} km cells)"):
+            st.dataframe(grid.frame().rename(columns={
+                "latitude": "Latitude", "longitude": "Longitude", "temperature": "Temp (°C)",
+                "humidity": "Humidity (%)", "wind_speed": "Wind (km/h)", "rain_mm": "Rain (mm/h)",
+                "age_s": "Age (s)"
+            }).round(2), use_container_width=True, hide_index=True)
+        
         # Forecast
         st.markdown("### 📅 5-Day Forecast")
         
         forecast_cols = st.columns(5)
-        for i, (col, forecast) in enumerate(zip(forecast_cols, self.weather_data['forecast'])):
+        for i, (col, forecast) in enumerate(zip(forecast_cols, weather['forecast'])):
             with col:
                 st.markdown('<div class="metric-card">', unsafe_allow_html=True)
                 st.markdown(f"**{forecast['day']}**")
                 st.markdown(f"## {forecast['temp']}°C")
+                if 'temp_min' in forecast:
+                    st.markdown(f"Low {forecast['temp_min']}°C · 💧 {forecast['precip_mm']} mm · "
+                                f"💨 {forecast['wind_max']} km/h")
                 st.markdown(f"_{forecast['condition']}_")
                 st.markdown('</div>', unsafe_allow_html=True)
         
+        # Hour-by-hour outlook from every 3-hour forecast step
+        outlook = weather.get('outlook')
+        if outlook is not None and len(outlook):
+            hourly = outlook.hourly()
+            fig = go.Figure()
+            fig.add_trace(go.Bar(x=hourly['time'], y=hourly['rain_mm'], name='Rain (mm/h)',
+                                 marker_color='#2196F3', yaxis='y2'))
+            fig.add_trace(go.Scatter(x=hourly['time'], y=hourly['temperature'], name='Temperature (°C)',
+                                     line=dict(color='#4CAF50', width=3)))
+            fig.update_layout(
+                title='Hourly Outlook',
+                height=350,
+                yaxis=dict(title='°C'),
+                yaxis2=dict(title='mm/h', overlaying='y', side='right', showgrid=False),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='#1E2B3C')
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        
+        # Tomorrow's impact comes from the learned model once fitted, else from fixed thresholds
+        impact = self.state.get("weather_impact")
+        learned = None
+        if impact is not None and outlook is not None:
+            tomorrow = impact.forecast_features(outlook, datetime.now().date(), 1)[0]
+            learned = impact.contributions(tomorrow)
+            driver, effect = max(learned.items(), key=lambda item: item[1])
+            if effect < WEATHER_IMPACT_ALERT:
+                driver = None
+        else:
+            description = weather['description']
+            wind_speed = weather['wind_speed']
+            temperature = weather['temperature']
+            rain_soon = 'rain' in description
+            if outlook is not None:
+                next_day = outlook.window(24)
+                rain_soon = rain_soon or next_day['precip_mm'] >= 1.0
+                wind_speed = np.nanmax([wind_speed, next_day['wind_max']])
+                temperature = np.nanmax([temperature, next_day['temp_max']])
+            driver = "rain" if rain_soon else "wind" if wind_speed > 20 \
+                else "heat" if temperature > 30 else None
+        
         # Impact on waste management
         st.markdown("### 🗑️ Impact on Waste Management")
         
@@ -1457,34 +2167,39 @@ class WasteManagementApp:
         with col1:
             st.markdown("**Weather Alerts**")
             
-            if self.weather_data['description'] == 'rain':
+            if driver == "rain":
                 st.error("🚨 Heavy rain expected - Secure all bins!")
-            elif self.weather_data['wind_speed'] > 20:
+            elif driver == "wind":
                 st.warning("💨 Strong winds - Check bin lids")
-            elif self.weather_data['temperature'] > 30:
+            elif driver == "heat":
                 st.warning("🔥 Heat wave - Increase collection frequency")
             else:
                 st.success("✅ Optimal conditions for waste management")
+            if learned is not None:
+                st.caption("Tomorrow's weather changes fill rates by "
+                           f"{sum(learned.values()):+.1f} %/day on average ("
+                           + ", ".join(f"{name} {value:+.1f}" for name, value in learned.items())
+                           + "), learned from history.")
         
         with col2:
             st.markdown("**Recommendations**")
             
             recommendations = []
-            if self.weather_data['description'] in ['rain', 'rainy']:
+            if driver == "rain":
                 recommendations = [
                     "Cover waste bins to prevent overflow",
                     "Postpone outdoor composting activities",
                     "Check drainage around waste sites",
                     "Use waterproof covers for recycling"
                 ]
-            elif self.weather_data['wind_speed'] > 20:
+            elif driver == "wind":
                 recommendations = [
                     "Secure lightweight materials",
                     "Check bin lids are properly closed",
                     "Avoid open burning of waste",
                     "Postpone paper/cardboard collection"
                 ]
-            elif self.weather_data['temperature'] > 30:
+            elif driver == "heat":
                 recommendations = [
                     "Increase organic waste collection frequency",
                     "Provide shade for composting areas",
@@ -1501,6 +2216,66 @@ class WasteManagementApp:
             
             for rec in recommendations:
                 st.markdown(f"• {rec}")
+        
+        self.weather_impact_model(impact, outlook)
+    
+    def weather_impact_model(self, impact, outlook):
+        """Learned weather sensitivity of fill rates, and the job that fits it"""
+        st.markdown("### 📈 Learned Weather Impact")
+        if self.archive is None or self.weather_archive is None:
+            st.info("Set `ARCHIVE_PATH` to archive readings and weather; the impact model "
+                    "learns each bin's sensitivity to heat, rain and wind from that history.")
+            return
+        
+        # Hand a finished fit over; the job itself publishes the model to every session
+        job_id = st.session_state.get("weather_impact_job")
+        job = self.jobs.get(job_id) if job_id else None
+        if job_id and (job is None or job.finished):
+            self.jobs.pop(job_id)
+            del st.session_state["weather_impact_job"]
+            if job is not None and job.state == FAILED:
+                st.error(f"Learning the weather impact failed: {job.error}")
+            job = None
+        
+        if job is not None:
+            @st.fragment(run_every=1.0)
+            def learning_status():
+                if job.finished:
+                    st.rerun()
+                progress = job.snapshot()
+                fitted, total = progress.get("bins_fitted", 0), progress.get("bins", 0)
+                st.progress(fitted / total if total else 0.0,
+                            text=f"Learning from {WEATHER_IMPACT_DAYS} days of history: "
+                                 f"{fitted:,} / {total:,} bins")
+                st.button("Cancel Learning", on_click=job.cancel)
+            learning_status()
+        else:
+            st.button("🧠 Learn from History", on_click=self.submit_weather_impact)
+        
+        if impact is None:
+            return
+        
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.metric("Bins Modelled", f"{len(impact):,}")
+            st.metric("Days of History", f"{int(np.median(impact.observations))} per bin")
+            st.dataframe(pd.DataFrame({
+                "Factor": ["Heat (per °C above 20)", "Rain (per mm)", "Wind (per km/h)"],
+                "Fill Rate (%/day)": impact.fleet_rate,
+                "Overflow Risk (pp)": impact.fleet_risk * 100
+            }).round(3), use_container_width=True, hide_index=True)
+        with col2:
+            if outlook is not None:
+                store = self.bin_store
+                effect = impact.forecast_effect(outlook, len(store), datetime.now().date(),
+                                                self.forecaster.horizon_days)[:, 0]
+                top = np.argsort(-effect, kind="stable")[:10]
+                affected = store.to_frame(top, columns=['id', 'location_name'])
+                affected['extra_fill'] = effect[top].round(2)
+                st.markdown("**Most affected bins tomorrow**")
+                st.dataframe(affected.rename(columns={
+                    'id': 'Bin ID', 'location_name': 'Location', 'extra_fill': 'Extra Fill (%/day)'
+                }), use_container_width=True, hide_index=True)
     
     def water_pollution(self):
         """Enhanced water pollution management section"""
@@ -2070,6 +2845,11 @@ class WasteManagementApp:
             # Generate AI response
             self.generate_ai_response(prompt)
         
+        cache = self.response_cache
+        if len(cache):
+            st.caption(f"⚡ {len(cache):,} answers cached ({cache.bytes / 1024:.0f} KB), "
+                       f"{cache.hit_rate:.0%} of questions answered from cache")
+        
         # Clear chat button
         if st.button("Clear Chat History", use_container_width=True):
             st.session_state.messages = [
@@ -2082,15 +2862,22 @@ class WasteManagementApp:
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 # Create context about current app state
+                weather = self.weather_data
+                count, full = self.kpis.count, int(self.kpis.status_counts[RED])
                 context = f"""
-                Current weather: {self.weather_data['temperature']}°C, {self.weather_data['description']}
-                Active bins: {len(self.bin_data)}
-                Bins needing collection: {len(self.bin_data[self.bin_data['status'] == 'red'])}
-                Average fill level: {self.bin_data['fill_level'].mean():.1f}%
+                Current weather: {weather['temperature']}°C, {weather['description']}
+                Active bins: {count}
+                Bins needing collection: {full}
+                Average fill level: {self.kpis.fill_mean:.1f}%
                 """
                 
-                # Get response from Gemini
-                response = self.get_gemini_response(prompt, context)
+                # Answers are shared while the situation is about the same: weather
+                # within 5°C, share of full bins and average fill within 10 points
+                fingerprint = (round(weather['temperature'] / 5), weather['description'],
+                               round(10 * full / max(count, 1)), round(self.kpis.fill_mean / 10))
+                
+                # Get response from Gemini, or the cache
+                response = self.get_gemini_response(prompt, context, fingerprint)
                 
                 # Add response to session state and display
                 st.session_state.messages.append({"role": "assistant", "content": response})
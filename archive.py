@@ -0,0 +1,381 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Archived columns and their on-disk dtypes; "bin" is the archive's bin code
+ARCHIVE_COLUMNS = {
+    "bin": np.int32,
+    "ts": np.float64,
+    "fill_level": np.float32,
+    "temperature": np.float32,
+    "humidity": np.float32,
+}
+
+VALUE_COLUMNS = ("fill_level", "temperature", "humidity")
+
+
+class _Segment:
+    """A sealed, read-only segment of readings sorted by (bin, ts)
+
+    Columns are ``.npy`` files opened as read-only memory maps on first
+    use, so only the pages a query touches are read from disk.
+    ``offsets[code]:offsets[code + 1]`` spans one bin's readings.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.rows = meta["rows"]
+        self.ts_min = meta["ts_min"]
+        self.ts_max = meta["ts_max"]
+        self._columns = {}
+
+    def column(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"),
+                                                   mmap_mode="r")
+        return column
+
+    def overlaps(self, start, end):
+        return (start is None or self.ts_max >= start) and (end is None or self.ts_min < end)
+
+    def bin_slice(self, code):
+        offsets = self.column("offsets")
+        if code + 1 >= len(offsets):
+            return slice(0, 0)
+        return slice(int(offsets[code]), int(offsets[code + 1]))
+
+
+class ReadingArchive:
+    """Append-only, memory-mapped columnar archive of bin readings on disk
+
+    New readings are appended to raw column files of an active segment.
+    Once it holds ``segment_rows`` readings it is sorted by (bin, ts) and
+    sealed into ``.npy`` columns plus a per-bin offsets index, which makes
+    a single bin's range a contiguous slice of each segment. Opening an
+    archive only reads the bin dictionary and segment metadata, and queries
+    memory-map the segments they overlap, so start-up time and resident
+    memory do not grow with the size of the archive.
+    """
+
+    def __init__(self, path, segment_rows=1_000_000):
+        self.path = path
+        self.segment_rows = segment_rows
+        self._lock = threading.RLock()
+        self._active_path = os.path.join(path, "active")
+        os.makedirs(self._active_path, exist_ok=True)
+
+        self._bins_path = os.path.join(path, "bins.txt")
+        self._bin_ids = []
+        if os.path.exists(self._bins_path):
+            with open(self._bins_path) as f:
+                self._bin_ids = f.read().splitlines()
+        self._code_of = {bin_id: code for code, bin_id in enumerate(self._bin_ids)}
+
+        self._segments = [_Segment(os.path.join(path, name))
+                          for name in sorted(os.listdir(path))
+                          if name.startswith("segment_")
+                          and os.path.exists(os.path.join(path, name, "meta.json"))]
+        self._recover_active()
+
+    def _active_file(self, name):
+        return os.path.join(self._active_path, f"{name}.bin")
+
+    def _recover_active(self):
+        """Trim active columns to a common length after an interrupted append
+
+        Also finishes an interrupted seal: ``seal()`` writes a ``sealed_as``
+        marker naming the new segment before moving it into place, so if
+        that segment exists the active rows are already in it and are
+        dropped, and otherwise the marker and partial segment are discarded.
+        """
+        marker = os.path.join(self._active_path, "sealed_as")
+        if os.path.exists(marker):
+            with open(marker) as f:
+                name = f.read().strip()
+            if name and os.path.exists(os.path.join(self.path, name, "meta.json")):
+                shutil.rmtree(self._active_path)
+                os.makedirs(self._active_path)
+            else:
+                shutil.rmtree(os.path.join(self.path, f".{name}.tmp"), ignore_errors=True)
+                os.remove(marker)
+        sizes = {}
+        for name, dtype in ARCHIVE_COLUMNS.items():
+            path = self._active_file(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            sizes[name] = size // np.dtype(dtype).itemsize
+        self._active_rows = min(sizes.values())
+        for name, dtype in ARCHIVE_COLUMNS.items():
+            with open(self._active_file(name), "ab") as f:
+                f.truncate(self._active_rows * np.dtype(dtype).itemsize)
+
+    def __len__(self):
+        return sum(segment.rows for segment in self._segments) + self._active_rows
+
+    @property
+    def bin_ids(self):
+        return list(self._bin_ids)
+
+    def bin_codes(self, bin_ids, create=False):
+        """Archive codes for bin ids; unknown ids are added if ``create``, else -1"""
+        unique, inverse = np.unique(np.asarray(bin_ids).astype(str), return_inverse=True)
+        codes = np.empty(len(unique), dtype=np.int32)
+        new_ids = []
+        with self._lock:
+            for i, bin_id in enumerate(unique.tolist()):
+                code = self._code_of.get(bin_id, -1)
+                if code < 0 and create:
+                    code = self._code_of[bin_id] = len(self._bin_ids)
+                    self._bin_ids.append(bin_id)
+                    new_ids.append(bin_id)
+                codes[i] = code
+            if new_ids:
+                with open(self._bins_path, "a") as f:
+                    f.write("".join(f"{bin_id}\n" for bin_id in new_ids))
+        return codes[inverse.ravel()]
+
+    def append(self, bin_ids, ts, fill_level, temperature=None, humidity=None):
+        """Append readings; missing values are stored as NaN"""
+        n = len(bin_ids)
+        if not n:
+            return
+        columns = {
+            "bin": self.bin_codes(bin_ids, create=True),
+            "ts": ts,
+            "fill_level": fill_level,
+            "temperature": np.nan if temperature is None else temperature,
+            "humidity": np.nan if humidity is None else humidity,
+        }
+        with self._lock:
+            for name, dtype in ARCHIVE_COLUMNS.items():
+                values = np.broadcast_to(np.asarray(columns[name], dtype=dtype), (n,))
+                with open(self._active_file(name), "ab") as f:
+                    f.write(np.ascontiguousarray(values).tobytes())
+            self._active_rows += n
+            if self._active_rows >= self.segment_rows:
+                self.seal()
+
+    def _read_active(self):
+        return {name: np.memmap(self._active_file(name), dtype=dtype, mode="r",
+                                shape=(self._active_rows,))
+                for name, dtype in ARCHIVE_COLUMNS.items()}
+
+    def seal(self):
+        """Sort the active segment and write it out as a sealed segment"""
+        with self._lock:
+            if not self._active_rows:
+                return
+            columns = self._read_active()
+            order = np.lexsort((columns["ts"], columns["bin"]))
+            name = f"segment_{len(self._segments):06d}"
+            tmp = os.path.join(self.path, f".{name}.tmp")
+            os.makedirs(tmp, exist_ok=True)
+            for column, values in columns.items():
+                np.save(os.path.join(tmp, f"{column}.npy"), values[order])
+            offsets = np.searchsorted(columns["bin"][order], np.arange(len(self._bin_ids) + 1))
+            np.save(os.path.join(tmp, "offsets.npy"), offsets.astype(np.int64))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"rows": int(self._active_rows),
+                           "ts_min": float(columns["ts"].min()),
+                           "ts_max": float(columns["ts"].max())}, f)
+            # Mark the active rows as sealed before the segment appears, so a
+            # restart between the two never reads them twice
+            with open(os.path.join(self._active_path, "sealed_as"), "w") as f:
+                f.write(name)
+            final = os.path.join(self.path, name)
+            os.replace(tmp, final)
+            self._segments.append(_Segment(final))
+
+            shutil.rmtree(self._active_path)
+            os.makedirs(self._active_path)
+            self._recover_active()
+
+    def read_bin(self, bin_id, start=None, end=None):
+        """One bin's readings with ``start <= ts < end``, in time order"""
+        code = self._code_of.get(str(bin_id), -1)
+        parts = []
+        if code >= 0:
+            with self._lock:
+                for segment in self._segments:
+                    if not segment.overlaps(start, end):
+                        continue
+                    span = segment.bin_slice(code)
+                    ts = segment.column("ts")[span]
+                    lo = 0 if start is None else np.searchsorted(ts, start, side="left")
+                    hi = len(ts) if end is None else np.searchsorted(ts, end, side="left")
+                    if hi > lo:
+                        window = slice(span.start + lo, span.start + hi)
+                        parts.append({name: np.array(segment.column(name)[window])
+                                      for name in ("ts",) + VALUE_COLUMNS})
+                if self._active_rows:
+                    active = self._read_active()
+                    keep = self._in_range(active["ts"], start, end) & (active["bin"] == code)
+                    parts.append({name: active[name][keep] for name in ("ts",) + VALUE_COLUMNS})
+        frame = pd.DataFrame({name: np.concatenate([p[name] for p in parts])
+                              if parts else np.zeros(0, ARCHIVE_COLUMNS[name])
+                              for name in ("ts",) + VALUE_COLUMNS})
+        frame = frame.sort_values("ts", kind="stable").reset_index(drop=True)
+        frame.insert(0, "time", pd.to_datetime(frame["ts"], unit="s"))
+        return frame
+
+    @staticmethod
+    def _in_range(ts, start, end):
+        keep = np.ones(len(ts), dtype=bool)
+        if start is not None:
+            keep &= ts >= start
+        if end is not None:
+            keep &= ts < end
+        return keep
+
+    def scan(self, start=None, end=None, columns=("fill_level",)):
+        """Yield fleet-wide readings with ``start <= ts < end``, one chunk per segment
+
+        Each chunk is a dict of arrays holding "bin", "ts" and the requested
+        columns. Chunks are bounded by the segment size, so a scan over the
+        whole archive never holds more than one segment in memory.
+        """
+        names = ("bin", "ts") + tuple(columns)
+        with self._lock:
+            segments = [s for s in self._segments if s.overlaps(start, end)]
+            active = self._read_active() if self._active_rows else None
+        for segment in segments:
+            keep = self._in_range(segment.column("ts"), start, end)
+            if keep.any():
+                yield {name: segment.column(name)[keep] for name in names}
+        if active is not None:
+            keep = self._in_range(active["ts"], start, end)
+            if keep.any():
+                yield {name: active[name][keep] for name in names}
+
+    def daily_means(self, bin_ids, end, days):
+        """(bins x days) mean fill per calendar day (UTC) up to ``end``, NaN if none
+
+        Days are ordered oldest first and the last one contains ``end``.
+        """
+        codes = self.bin_codes(bin_ids)
+        last_day = int(end // 86400)
+        first_day = last_day - days + 1
+        position = np.full(len(self._bin_ids), -1, dtype=np.int64)
+        known = codes >= 0
+        position[codes[known]] = np.flatnonzero(known)
+
+        total = np.zeros(len(codes) * days)
+        count = np.zeros(len(codes) * days)
+        for chunk in self.scan(first_day * 86400, (last_day + 1) * 86400):
+            row = position[chunk["bin"]]
+            fill = chunk["fill_level"].astype(np.float64)
+            keep = (row >= 0) & ~np.isnan(fill)
+            cell = row[keep] * days + (chunk["ts"][keep] // 86400).astype(np.int64) - first_day
+            total += np.bincount(cell, weights=fill[keep], minlength=len(total))
+            count += np.bincount(cell, minlength=len(count))
+        with np.errstate(invalid="ignore"):
+            return (total / count).reshape(len(codes), days)
+
+
+# Archived weather observations; values follow weather.GRID_FIELDS
+WEATHER_ARCHIVE_COLUMNS = {
+    "ts": np.float64,
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "temperature": np.float32,
+    "humidity": np.float32,
+    "wind_speed": np.float32,
+    "rain_mm": np.float32,
+}
+
+
+class WeatherArchive:
+    """Append-only, memory-mapped log of weather observations on disk
+
+    Every observation is a place (a weather grid cell centre), a time and
+    the current conditions there. A city's grid adds a few thousand rows a
+    day, so the log is kept as raw column files without segments and read
+    through memory maps. Places are identified by their coordinates,
+    rounded to ``places_decimals``.
+    """
+
+    def __init__(self, path, places_decimals=4):
+        self.path = path
+        self.places_decimals = places_decimals
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        sizes = {}
+        for name, dtype in WEATHER_ARCHIVE_COLUMNS.items():
+            file = self._file(name)
+            sizes[name] = (os.path.getsize(file) if os.path.exists(file) else 0) \
+                // np.dtype(dtype).itemsize
+        # Trim to a common length after an interrupted append
+        self._rows = min(sizes.values())
+        for name, dtype in WEATHER_ARCHIVE_COLUMNS.items():
+            with open(self._file(name), "ab") as f:
+                f.truncate(self._rows * np.dtype(dtype).itemsize)
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, ts, latitude, longitude, values):
+        """Append observations; ``values`` is (places x 4) in WEATHER_ARCHIVE_COLUMNS order"""
+        n = len(latitude)
+        if not n:
+            return
+        values = np.asarray(values)
+        columns = {"ts": ts, "latitude": latitude, "longitude": longitude,
+                   **{name: values[:, i] for i, name in enumerate(list(WEATHER_ARCHIVE_COLUMNS)[3:])}}
+        with self._lock:
+            for name, dtype in WEATHER_ARCHIVE_COLUMNS.items():
+                column = np.broadcast_to(np.asarray(columns[name], dtype=dtype), (n,))
+                with open(self._file(name), "ab") as f:
+                    f.write(np.ascontiguousarray(column).tobytes())
+            self._rows += n
+
+    def read(self, start=None, end=None):
+        """Observations with ``start <= ts < end``, as a dict of arrays"""
+        with self._lock:
+            rows = self._rows
+        columns = {name: np.memmap(self._file(name), dtype=dtype, mode="r", shape=(rows,))
+                   if rows else np.zeros(0, dtype)
+                   for name, dtype in WEATHER_ARCHIVE_COLUMNS.items()}
+        keep = ReadingArchive._in_range(columns["ts"], start, end)
+        return {name: np.asarray(column[keep]) for name, column in columns.items()}
+
+    def daily(self, end, days):
+        """Daily weather per place over the ``days`` calendar days (UTC) up to ``end``
+
+        Returns (latitude, longitude, daily) for the places observed, where
+        ``daily`` maps "temp_max" (°C), "rain_mm" (estimated day total from
+        the mean hourly rate) and "wind_max" (km/h) to (places x days)
+        arrays, NaN for days without observations.
+        """
+        last_day = int(end // 86400)
+        first_day = last_day - days + 1
+        obs = self.read(first_day * 86400, (last_day + 1) * 86400)
+        places = np.round(np.column_stack([obs["latitude"], obs["longitude"]]),
+                          self.places_decimals)
+        places, place = np.unique(places, axis=0, return_inverse=True)
+        place = place.ravel()
+        cell = place * days + (obs["ts"] // 86400).astype(np.int64) - first_day
+        size = len(places) * days
+
+        count = np.bincount(cell, minlength=size).astype(np.float64)
+        rain = np.bincount(cell, weights=np.nan_to_num(obs["rain_mm"]), minlength=size)
+        temp_max = np.full(size, -np.inf)
+        np.maximum.at(temp_max, cell, np.nan_to_num(obs["temperature"], nan=-np.inf))
+        wind_max = np.full(size, -np.inf)
+        np.maximum.at(wind_max, cell, np.nan_to_num(obs["wind_speed"], nan=-np.inf))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            daily = {
+                "temp_max": np.where(np.isfinite(temp_max), temp_max, np.nan),
+                "rain_mm": np.where(count > 0, rain / count * 24, np.nan),
+                "wind_max": np.where(np.isfinite(wind_max), wind_max, np.nan),
+            }
+        return places[:, 0], places[:, 1], {name: value.reshape(len(places), days)
+                                            for name, value in daily.items()}
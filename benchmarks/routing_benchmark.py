@@ -0,0 +1,182 @@
+"""Routing benchmark on seeded synthetic cities
+
+Generates cities of increasing size and depot layout, plans them with the
+fleet planner (and, up to ``--single-max`` bins, as one truck round trip),
+and records solve time, peak traced memory and route km next to the
+sort-by-status baseline (red first, fullest first, cut into payload-sized
+trips). Results are written as JSON so runs can be compared between
+releases:
+
+    python benchmarks/routing_benchmark.py --output benchmarks/results.json
+    python benchmarks/routing_benchmark.py --sizes 100 1000 --time-budget 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bin_store import RED, YELLOW, status_codes  # noqa: E402
+from fleet_routing import Fleet, nearest_depot, plan_fleet  # noqa: E402
+from routing import leg_distances, plan_route  # noqa: E402
+
+DEFAULT_SIZES = (100, 1000, 5000, 20000, 50000)
+
+# Depot layouts as (lat, lon) offsets from the city centre, in degrees
+LAYOUTS = {
+    "central": [(0.0, 0.0)],
+    "edge": [(-0.1, -0.1)],
+    "four": [(-0.05, -0.05), (-0.05, 0.05), (0.05, -0.05), (0.05, 0.05)],
+}
+
+CITY_CENTRE = (40.7128, -74.0060)
+PAYLOAD_KG = 2000.0
+SHIFT_HOURS = 8
+
+
+def synthetic_city(bins, seed):
+    """Bins in a few dense neighbourhoods plus uniform sprawl, with fill and capacity"""
+    rng = np.random.default_rng(seed)
+    clustered = bins * 2 // 3
+    centres = rng.uniform(-0.1, 0.1, size=(max(bins // 500, 4), 2))
+    which = rng.integers(0, len(centres), clustered)
+    offsets = np.vstack([centres[which] + rng.normal(0, 0.01, size=(clustered, 2)),
+                         rng.uniform(-0.12, 0.12, size=(bins - clustered, 2))])
+    fill_level = np.clip(rng.beta(2, 2, bins) * 110, 0, 100)
+    return {
+        "latitude": CITY_CENTRE[0] + offsets[:, 0],
+        "longitude": CITY_CENTRE[1] + offsets[:, 1],
+        "fill_level": fill_level,
+        "status": status_codes(fill_level),
+        "capacity": rng.choice([100.0, 150.0, 200.0], bins),
+    }
+
+
+def status_order_km(depots, latitude, longitude, status, fill_level, load_kg):
+    """Baseline: per depot, visit stops red first then fullest first, in payload-sized trips"""
+    depot_of_stop = nearest_depot(depots, latitude, longitude)
+    total = 0.0
+    for d, depot in enumerate(depots):
+        stops = np.flatnonzero(depot_of_stop == d)
+        order = stops[np.lexsort((-fill_level[stops], -status[stops]))]
+        trip = np.floor(np.cumsum(load_kg[order]) / PAYLOAD_KG).astype(np.int64)
+        for t in np.unique(trip):
+            run = order[trip == t]
+            total += leg_distances(depot, latitude, longitude, run).sum()
+    return float(total)
+
+
+def measure(fn):
+    """(result, seconds, peak traced MB) of calling ``fn``"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def run_case(bins, layout, seed, time_budget, single_max, workers):
+    city = synthetic_city(bins, seed)
+    depots = [(CITY_CENTRE[0] + dlat, CITY_CENTRE[1] + dlon) for dlat, dlon in LAYOUTS[layout]]
+    stops = np.flatnonzero(city["status"] >= YELLOW)
+    latitude, longitude = city["latitude"][stops], city["longitude"][stops]
+    fill_level, status = city["fill_level"][stops], city["status"][stops]
+    load_kg = city["capacity"][stops] * fill_level / 100
+    baseline_km = status_order_km(depots, latitude, longitude, status, fill_level, load_kg)
+
+    record = {
+        "bins": bins,
+        "layout": layout,
+        "depots": len(depots),
+        "stops": int(len(stops)),
+        "red_stops": int((status == RED).sum()),
+        "baseline_km": round(baseline_km, 3),
+    }
+
+    trucks = max(int(np.ceil(load_kg.sum() / PAYLOAD_KG)), len(depots))
+    fleet = Fleet(depots, trucks, PAYLOAD_KG, SHIFT_HOURS)
+    plan, seconds, peak_mb = measure(
+        lambda: plan_fleet(fleet, latitude, longitude, load_kg, time_budget, workers=workers))
+    record["fleet"] = {
+        "seconds": round(seconds, 4),
+        "peak_mb": round(peak_mb, 2),
+        "km": round(plan.total_km, 3),
+        "trips": len(plan.trips),
+        "unserved": int(len(plan.unserved)),
+        "vs_baseline": round(plan.total_km / baseline_km, 4) if baseline_km else None,
+    }
+
+    if len(stops) <= single_max and len(depots) == 1:
+        single_baseline = leg_distances(depots[0], latitude, longitude,
+                                        np.lexsort((-fill_level, -status))).sum()
+        route, seconds, peak_mb = measure(
+            lambda: plan_route(depots[0], latitude, longitude, time_budget))
+        record["single"] = {
+            "seconds": round(seconds, 4),
+            "peak_mb": round(peak_mb, 2),
+            "km": round(route.total_km, 3),
+            "baseline_km": round(float(single_baseline), 3),
+            "vs_baseline": round(route.total_km / single_baseline, 4) if single_baseline else None,
+        }
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="city sizes in bins")
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--time-budget", type=float, default=1.0,
+                        help="seconds of local search per route or trip")
+    parser.add_argument("--single-max", type=int, default=2000,
+                        help="largest stop count also planned as a single round trip")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="fleet planner processes; 1 keeps timings and memory comparable")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    args = parser.parse_args(argv)
+
+    cases = []
+    for bins in args.sizes:
+        for layout in args.layouts:
+            record = run_case(bins, layout, args.seed, args.time_budget, args.single_max,
+                              args.workers)
+            cases.append(record)
+            fleet = record["fleet"]
+            print(f"{bins:>6} bins  {layout:<8} {record['stops']:>6} stops  "
+                  f"fleet {fleet['seconds']:8.2f} s {fleet['peak_mb']:8.1f} MB "
+                  f"{fleet['km']:10.1f} km ({fleet['vs_baseline']:.2f}x baseline)"
+                  + (f"  single {record['single']['seconds']:.2f} s "
+                     f"({record['single']['vs_baseline']:.2f}x)" if "single" in record else ""),
+                  flush=True)
+
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "time_budget": args.time_budget,
+        "payload_kg": PAYLOAD_KG,
+        "cases": cases,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {len(cases)} cases to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class BinFilterIndex:
+    """Bitmap and sorted indexes for filtering a BinStore without copying it
+
+    Status and location filters use packed bitmaps (one bit per bin) built
+    lazily per code; the fill threshold uses a sorted fill-level index. Any
+    combination resolves to an array of row numbers, and recent selections
+    are memoized until the store changes, so repeated reruns with the same
+    filters cost a dictionary lookup.
+    """
+
+    def __init__(self, store, cache_size=64):
+        self.store = store
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._version = None
+
+    def _refresh(self):
+        """Drop every index if the store has changed since they were built"""
+        if self._version == self.store.version:
+            return
+        store = self.store
+        self._n = len(store)
+        self._status_bitmaps = {}
+        self._location_bitmaps = {}
+        self._fill_order = np.argsort(store.fill_level, kind="stable")
+        self._sorted_fill = store.fill_level[self._fill_order]
+        self._selections = OrderedDict()
+        self._version = store.version
+
+    def _bitmap(self, cache, column, code):
+        bitmap = cache.get(code)
+        if bitmap is None:
+            bitmap = cache[code] = np.packbits(self.store.column(column) == code)
+        return bitmap
+
+    def _fill_bitmap(self, min_fill):
+        start = np.searchsorted(self._sorted_fill, min_fill, side="left")
+        mask = np.zeros(self._n, dtype=bool)
+        mask[self._fill_order[start:]] = True
+        return np.packbits(mask)
+
+    def select(self, statuses=None, location=None, min_fill=None):
+        """Row numbers matching every given filter, in row order
+
+        ``statuses`` is an iterable of status codes (any of them matches),
+        ``location`` a location code and ``min_fill`` an inclusive fill
+        threshold; ``None`` disables a filter. The returned array is
+        read-only and shared between callers.
+        """
+        statuses = None if statuses is None else tuple(sorted(set(statuses)))
+        key = (statuses, location, min_fill)
+        with self._lock:
+            self._refresh()
+            rows = self._selections.get(key)
+            if rows is not None:
+                self._selections.move_to_end(key)
+                return rows
+
+            bits = None
+            if statuses is not None:
+                bits = np.zeros((self._n + 7) // 8, dtype=np.uint8)
+                for code in statuses:
+                    bits |= self._bitmap(self._status_bitmaps, "status", code)
+            if location is not None:
+                location_bits = self._bitmap(self._location_bitmaps, "location", location)
+                bits = location_bits if bits is None else bits & location_bits
+
+            if bits is None and min_fill is None:
+                rows = np.arange(self._n)
+            elif bits is None:
+                start = np.searchsorted(self._sorted_fill, min_fill, side="left")
+                rows = np.sort(self._fill_order[start:])
+            else:
+                if min_fill is not None:
+                    bits = bits & self._fill_bitmap(min_fill)
+                rows = np.flatnonzero(np.unpackbits(bits, count=self._n))
+
+            rows.flags.writeable = False
+            self._selections[key] = rows
+            if len(self._selections) > self.cache_size:
+                self._selections.popitem(last=False)
+            return rows
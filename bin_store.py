@@ -0,0 +1,325 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Status codes, ordered by urgency
+GREEN, YELLOW, RED = 0, 1, 2
+STATUS_LABELS = ("green", "yellow", "red")
+
+# Fill level thresholds (%) separating green/yellow and yellow/red
+STATUS_THRESHOLDS = (30, 80)
+
+# Fixed-width column layout of the store
+COLUMNS = {
+    "id": "U16",
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "location": np.int32,
+    "address": "U48",
+    "fill_level": np.float32,
+    "status": np.int8,
+    "last_collected": "datetime64[s]",
+    "capacity": np.int32,
+    "temperature": np.float32,
+    "humidity": np.float32,
+    "collection_count": np.int32,
+}
+
+
+def status_codes(fill_level):
+    """Map fill levels (%) to GREEN/YELLOW/RED codes"""
+    return np.digitize(fill_level, STATUS_THRESHOLDS).astype(np.int8)
+
+
+class BinStore:
+    """Columnar store for bin telemetry
+
+    Every attribute is a preallocated NumPy column; the first ``len(store)``
+    rows are live. Status and location are stored as small integer codes and
+    the fill history is a bins x samples ring buffer that is appended in
+    place. Column accessors return views, so reading never copies the data.
+    Writers should hold ``store.lock``; every write bumps ``store.version`` so
+    derived indexes and caches can tell when they are out of date. Observers
+    registered with ``subscribe()`` are told about each write as it happens.
+    """
+
+    def __init__(self, capacity=1024, history_length=7):
+        self.lock = threading.RLock()
+        self.version = 0
+        self.history_length = history_length
+        self._n = 0
+        self._capacity = 0
+        self._columns = {}
+        self._history = np.zeros((0, history_length), dtype=np.float32)
+        self._history_head = np.zeros(0, dtype=np.int32)
+        self._history_count = np.zeros(0, dtype=np.int32)
+        self._history_ts = np.zeros(0)
+        self._row_of = {}
+        self._location_labels = []
+        self._location_codes = {}
+        self._observers = []
+        self._grow(capacity)
+
+    def __len__(self):
+        return self._n
+
+    def subscribe(self, observer):
+        """Register an observer for writes
+
+        The observer's ``bins_added(rows)`` and
+        ``values_changed(name, rows, old, new)`` are called under the store
+        lock right after each write.
+        """
+        with self.lock:
+            self._observers.append(observer)
+
+    def unsubscribe(self, observer):
+        with self.lock:
+            self._observers = [o for o in self._observers if o is not observer]
+
+    def _grow(self, capacity):
+        """Reallocate every column to hold at least ``capacity`` rows"""
+        capacity = max(capacity, 1)
+        for name, dtype in COLUMNS.items():
+            column = np.zeros(capacity, dtype=self._columns[name].dtype if name in self._columns else dtype)
+            if name in self._columns:
+                column[:self._n] = self._columns[name][:self._n]
+            self._columns[name] = column
+        history = np.zeros((capacity, self.history_length), dtype=np.float32)
+        history[:self._n] = self._history[:self._n]
+        self._history = history
+        for attr in ("_history_head", "_history_count", "_history_ts"):
+            old = getattr(self, attr)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self._n] = old[:self._n]
+            setattr(self, attr, grown)
+        self._capacity = capacity
+
+    def _fit_strings(self, name, values):
+        """Widen a fixed-width string column if the incoming values need it"""
+        values = np.asarray(values, dtype=str)
+        column = self._columns[name]
+        if values.dtype.itemsize > column.dtype.itemsize:
+            self._columns[name] = column.astype(values.dtype)
+        return values
+
+    @property
+    def location_labels(self):
+        return list(self._location_labels)
+
+    def location_code(self, name):
+        """Return the code for a location name, or -1 if it is unknown"""
+        return self._location_codes.get(name, -1)
+
+    def _encode_locations(self, names):
+        codes = np.empty(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            code = self._location_codes.get(name)
+            if code is None:
+                code = len(self._location_labels)
+                self._location_labels.append(name)
+                self._location_codes[name] = code
+            codes[i] = code
+        return codes
+
+    def add_bins(self, ids, latitude, longitude, location_name, fill_level,
+                 capacity, last_collected, address=None, temperature=None,
+                 humidity=None, collection_count=None, fill_history=None, history_ts=None):
+        """Append bins and return their row numbers
+
+        ``history_ts`` is when the newest ``fill_history`` sample was taken
+        (epoch seconds, one or per bin), if known.
+        """
+        ids = np.asarray(ids, dtype=str)
+        count = len(ids)
+        with self.lock:
+            duplicates = [bin_id for bin_id in ids if bin_id in self._row_of]
+            if duplicates:
+                raise ValueError(f"Bins already in store: {duplicates[:5]}")
+            if self._n + count > self._capacity:
+                self._grow(max(self._n + count, 2 * self._capacity))
+
+            rows = np.arange(self._n, self._n + count)
+            fill_level = np.asarray(fill_level, dtype=np.float32)
+            values = {
+                "id": self._fit_strings("id", ids),
+                "latitude": latitude,
+                "longitude": longitude,
+                "location": self._encode_locations(location_name),
+                "address": self._fit_strings("address", address if address is not None else [""] * count),
+                "fill_level": fill_level,
+                "status": status_codes(fill_level),
+                "last_collected": np.asarray(last_collected, dtype="datetime64[s]"),
+                "capacity": capacity,
+                "temperature": temperature if temperature is not None else np.nan,
+                "humidity": humidity if humidity is not None else np.nan,
+                "collection_count": collection_count if collection_count is not None else 0,
+            }
+            for name, value in values.items():
+                self._columns[name][rows] = value
+
+            self._history[rows] = 0
+            self._history_head[rows] = 0
+            self._history_count[rows] = 0
+            self._history_ts[rows] = np.nan if history_ts is None else history_ts
+            if fill_history is not None:
+                fill_history = np.asarray(fill_history, dtype=np.float32)
+                samples = fill_history[:, -self.history_length:]
+                width = samples.shape[1]
+                self._history[rows, :width] = samples
+                self._history_head[rows] = width % self.history_length
+                self._history_count[rows] = width
+
+            for row, bin_id in zip(rows, ids):
+                self._row_of[str(bin_id)] = int(row)
+            self._n += count
+            self.version += 1
+            for observer in self._observers:
+                observer.bins_added(rows)
+            return rows
+
+    def update_fill(self, rows, fill_level):
+        """Set the current fill level (and derived status) of the given rows
+
+        ``rows`` must not contain duplicates.
+        """
+        fill_level = np.broadcast_to(np.asarray(fill_level, dtype=np.float32), np.shape(rows))
+        with self.lock:
+            old = self._columns["fill_level"][rows]
+            self._columns["fill_level"][rows] = fill_level
+            self._columns["status"][rows] = status_codes(fill_level)
+            self.version += 1
+            for observer in self._observers:
+                observer.values_changed("fill_level", rows, old, fill_level)
+
+    def update_column(self, name, rows, values):
+        """Set a numeric column for the given rows"""
+        if name in ("id", "address", "location", "fill_level", "status"):
+            raise ValueError(f"Column '{name}' cannot be updated directly")
+        with self.lock:
+            column = self._columns[name]
+            old = column[rows] if self._observers else None
+            column[rows] = values
+            self.version += 1
+            if self._observers:
+                new = column[rows]
+                for observer in self._observers:
+                    observer.values_changed(name, rows, old, new)
+
+    def append_history(self, rows, values, ts=None):
+        """Append one fill sample per row to the ring buffer, in place
+
+        ``ts`` is when the samples were taken (epoch seconds), if known.
+        ``rows`` must not contain duplicates.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        with self.lock:
+            head = self._history_head[rows]
+            self._history[rows, head] = values
+            self._history_head[rows] = (head + 1) % self.history_length
+            self._history_count[rows] = np.minimum(self._history_count[rows] + 1,
+                                                   self.history_length)
+            self._history_ts[rows] = np.nan if ts is None else ts
+            self.version += 1
+
+    def update_latest_history(self, rows, values):
+        """Overwrite the newest history sample of each row, e.g. with a running mean"""
+        rows = np.asarray(rows, dtype=np.intp)
+        with self.lock:
+            self._history[rows, (self._history_head[rows] - 1) % self.history_length] = values
+            self.version += 1
+
+    def column(self, name):
+        """Read-only view of a column's live rows"""
+        view = self._columns[name][:self._n]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def ids(self):
+        return self.column("id")
+
+    @property
+    def latitude(self):
+        return self.column("latitude")
+
+    @property
+    def longitude(self):
+        return self.column("longitude")
+
+    @property
+    def fill_level(self):
+        return self.column("fill_level")
+
+    @property
+    def status(self):
+        return self.column("status")
+
+    @property
+    def location(self):
+        return self.column("location")
+
+    @property
+    def capacity(self):
+        return self.column("capacity")
+
+    def index_of(self, bin_ids):
+        """Row numbers for bin ids (-1 for unknown ids)"""
+        return np.array([self._row_of.get(str(bin_id), -1) for bin_id in bin_ids], dtype=np.intp)
+
+    def status_counts(self, rows=None):
+        """Number of bins per status code, as [green, yellow, red]"""
+        status = self.status if rows is None else self.status[rows]
+        return np.bincount(status, minlength=len(STATUS_LABELS))
+
+    def history(self, rows=None):
+        """Fill history of the given rows (bins x samples), newest sample last
+
+        Rows are right-aligned; slots not yet recorded are NaN.
+        """
+        rows = np.arange(self._n) if rows is None else np.asarray(rows, dtype=np.intp)
+        head = self._history_head[rows]
+        count = self._history_count[rows]
+        # The newest sample sits just before head, so read from head onwards
+        slots = np.arange(self.history_length)
+        order = (head[:, None] + slots) % self.history_length
+        history = np.take_along_axis(self._history[rows], order, axis=1)
+        history[slots < self.history_length - count[:, None]] = np.nan
+        return history
+
+    def history_counts(self, rows=None):
+        """Number of recorded history samples per row"""
+        return self._history_count[:self._n] if rows is None else self._history_count[rows]
+
+    def history_times(self, rows=None):
+        """When each row's newest history sample was taken (epoch seconds), NaN if unknown"""
+        return self._history_ts[:self._n] if rows is None else self._history_ts[rows]
+
+    def fill_history(self, row):
+        """Recorded fill samples of one bin, oldest first"""
+        count = self._history_count[row]
+        return self.history([row])[0, self.history_length - count:]
+
+    def to_frame(self, rows=None, columns=None):
+        """Materialize rows (and optionally a subset of columns) as a DataFrame"""
+        rows = np.arange(self._n) if rows is None else np.asarray(rows, dtype=np.intp)
+        data = self._columns
+        status_labels = np.array(STATUS_LABELS, dtype=object)
+        location_labels = np.array(self._location_labels, dtype=object)
+        builders = {
+            "id": lambda: data["id"][rows].astype(object),
+            "latitude": lambda: data["latitude"][rows],
+            "longitude": lambda: data["longitude"][rows],
+            "location_name": lambda: location_labels[data["location"][rows]],
+            "fill_level": lambda: data["fill_level"][rows],
+            "status": lambda: status_labels[data["status"][rows]],
+            "last_collected": lambda: pd.to_datetime(data["last_collected"][rows]),
+            "address": lambda: data["address"][rows].astype(object),
+            "capacity": lambda: data["capacity"][rows],
+            "temperature": lambda: data["temperature"][rows],
+            "humidity": lambda: data["humidity"][rows],
+            "collection_count": lambda: data["collection_count"][rows],
+        }
+        columns = builders if columns is None else columns
+        return pd.DataFrame({name: builders[name]() for name in columns}, index=rows)
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from spatial import haversine_km
+
+# Rows of new distances computed at a time, bounding the float64 temporaries
+# to ROW_CHUNK x points (41 MB per temporary at 20,000 points)
+ROW_CHUNK = 256
+
+
+class DistanceCache:
+    """Persistent pairwise distance matrix keyed by point id (bins, depots)
+
+    Distances are kept in a square float32 matrix with one slot per point.
+    With a ``path`` the matrix, coordinates and id table live on disk and
+    are memory-mapped when the cache is opened; without one they are kept
+    in memory. Adding or moving k points computes only their k rows and
+    columns against the points already cached, and removed points free
+    their slot for reuse, so the full O(n²) matrix is computed at most
+    once. The matrix grows by doubling, into new files that replace the
+    old ones only once they are complete.
+    """
+
+    def __init__(self, path=None, capacity=1024):
+        self.path = path
+        self._lock = threading.RLock()
+        self._slot_of = {}
+        self._ids = []
+        self._synced = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            meta_path = os.path.join(path, "ids.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                self._ids = meta["ids"]
+                self._open(self._recover_grow(meta["capacity"]))
+                self._slot_of = {key: slot for slot, key in enumerate(self._ids) if key is not None}
+                return
+        self._open(capacity, create=True)
+        self._save_ids()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self, capacity, create=False, suffix=""):
+        """Map (or allocate) the matrix and coordinate arrays for ``capacity`` slots"""
+        self.capacity = capacity
+        if self.path is None:
+            self._matrix = np.zeros((capacity, capacity), dtype=np.float32)
+            self._coords = np.full((capacity, 2), np.nan)
+            return
+        mode = "w+" if create else "r+"
+        self._matrix = np.memmap(self._file("matrix.f32" + suffix), dtype=np.float32, mode=mode,
+                                 shape=(capacity, capacity))
+        self._coords = np.memmap(self._file("coords.f64" + suffix), dtype=np.float64, mode=mode,
+                                 shape=(capacity, 2))
+        if create:
+            self._coords[:] = np.nan
+
+    def _recover_grow(self, capacity):
+        """Finish or discard a ``_grow`` that was interrupted; returns the capacity
+
+        The grown matrix replaces the old one before the coordinates do, so
+        a leftover matrix ``.tmp`` means nothing was swapped yet, and a
+        leftover coordinates ``.tmp`` alone means only it is still pending.
+        """
+        if os.path.exists(self._file("matrix.f32.tmp")):
+            for name in ("matrix.f32", "coords.f64"):
+                if os.path.exists(self._file(name + ".tmp")):
+                    os.remove(self._file(name + ".tmp"))
+        elif os.path.exists(self._file("coords.f64.tmp")):
+            os.replace(self._file("coords.f64.tmp"), self._file("coords.f64"))
+        size = os.path.getsize(self._file("matrix.f32")) // np.dtype(np.float32).itemsize
+        return max(capacity, int(round(size ** 0.5)))
+
+    def _save_ids(self):
+        if self.path is None:
+            return
+        tmp = self._file("ids.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"capacity": self.capacity, "ids": self._ids}, f)
+        os.replace(tmp, self._file("ids.json"))
+
+    def _grow(self, capacity):
+        old_matrix, old_coords, old_capacity = self._matrix, self._coords, self.capacity
+        # Build the larger files next to the old ones, then swap them in
+        self._open(capacity, create=True, suffix=".tmp")
+        self._matrix[:old_capacity, :old_capacity] = old_matrix
+        self._coords[:old_capacity] = old_coords
+        del old_matrix, old_coords
+        if self.path is not None:
+            self._matrix.flush()
+            self._coords.flush()
+            del self._matrix, self._coords
+            for name in ("matrix.f32", "coords.f64"):
+                os.replace(self._file(name + ".tmp"), self._file(name))
+            self._open(capacity)
+        self._save_ids()
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def slots(self, keys):
+        """Matrix slots for point ids; raises KeyError for unknown ids"""
+        slot_of = self._slot_of
+        return np.array([slot_of[key] for key in keys], dtype=np.intp)
+
+    def add(self, keys, latitude, longitude):
+        """Add points, or update them if their coordinates changed
+
+        Only the rows and columns of new or moved points are computed.
+        Returns the number of points (re)computed.
+        """
+        keys = [str(key) for key in keys]
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        with self._lock:
+            slots = np.array([self._slot_of.get(key, -1) for key in keys], dtype=np.intp)
+            known = slots >= 0
+            moved = np.zeros(len(keys), dtype=bool)
+            moved[known] = ((self._coords[slots[known], 0] != latitude[known])
+                            | (self._coords[slots[known], 1] != longitude[known]))
+            new = np.flatnonzero(~known)
+            if len(new):
+                free = [slot for slot, key in enumerate(self._ids) if key is None]
+                needed = len(self._ids) + max(len(new) - len(free), 0)
+                if needed > self.capacity:
+                    self._grow(max(needed, 2 * self.capacity))
+                for i in new:
+                    slot = free.pop(0) if free else len(self._ids)
+                    if slot == len(self._ids):
+                        self._ids.append(None)
+                    self._ids[slot] = keys[i]
+                    self._slot_of[keys[i]] = slot
+                    slots[i] = slot
+                self._save_ids()
+
+            changed = np.flatnonzero(~known | moved)
+            if not len(changed):
+                return 0
+            rows = slots[changed]
+            self._coords[rows, 0] = latitude[changed]
+            self._coords[rows, 1] = longitude[changed]
+            # New rows against every occupied slot; unused slots hold NaN coordinates
+            used = len(self._ids)
+            lat_used, lon_used = self._coords[None, :used, 0], self._coords[None, :used, 1]
+            for start in range(0, len(changed), ROW_CHUNK):
+                chunk = changed[start:start + ROW_CHUNK]
+                distances = haversine_km(latitude[chunk, None], longitude[chunk, None],
+                                         lat_used, lon_used)
+                distances = np.nan_to_num(distances).astype(np.float32)
+                self._matrix[rows[start:start + ROW_CHUNK], :used] = distances
+                self._matrix[:used, rows[start:start + ROW_CHUNK]] = distances.T
+            if self.path is not None:
+                self._matrix.flush()
+                self._coords.flush()
+            return len(changed)
+
+    def remove(self, keys):
+        """Forget points; their slots are reused by later additions"""
+        with self._lock:
+            removed = False
+            for key in keys:
+                slot = self._slot_of.pop(str(key), None)
+                if slot is not None:
+                    self._ids[slot] = None
+                    self._coords[slot] = np.nan
+                    removed = True
+            if removed:
+                self._save_ids()
+
+    def sync(self, store, extra=None):
+        """Cache every bin of a BinStore plus ``extra`` {id: (lat, lon)} points
+
+        Points no longer in either are removed. A no-op while the store is
+        unchanged since the last sync.
+        """
+        extra = extra or {}
+        marker = (id(store), store.version, tuple(sorted(extra.items())))
+        with self._lock:
+            if self._synced == marker:
+                return
+            ids = store.ids.tolist()
+            current = set(ids) | set(extra)
+            self.remove([key for key in self._slot_of if key not in current])
+            self.add(ids, store.latitude, store.longitude)
+            if extra:
+                keys = list(extra)
+                self.add(keys, [extra[k][0] for k in keys], [extra[k][1] for k in keys])
+            self._synced = marker
+
+    def submatrix(self, keys):
+        """(k x k) distance matrix in km between the given points, in that order
+
+        Only the k² requested entries are gathered; the full rows are never
+        copied out of the (possibly memory-mapped) matrix.
+        """
+        slots = self.slots(keys)
+        with self._lock:
+            return np.asarray(self._matrix[np.ix_(slots, slots)], dtype=np.float64)
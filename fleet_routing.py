@@ -0,0 +1,244 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from routing import Route, plan_route, solve_route
+from spatial import haversine_km
+
+# Below this many stops in total, trips are solved in-process
+PARALLEL_MIN_STOPS = 500
+
+
+class Fleet:
+    """Trucks available for a day's collection
+
+    ``depots`` is a list of (lat, lon); trucks are spread round-robin over
+    them. ``payload_kg`` is a single limit or one per truck. A truck can
+    make several trips in its shift, unloading at its depot in between.
+    """
+
+    def __init__(self, depots, trucks, payload_kg, shift_hours,
+                 speed_kmh=20.0, service_minutes=2.0):
+        self.depots = [tuple(depot) for depot in depots]
+        self.truck_depot = np.arange(trucks) % len(self.depots)
+        self.payload_kg = np.broadcast_to(np.asarray(payload_kg, dtype=np.float64), (trucks,))
+        self.shift_minutes = shift_hours * 60.0
+        self.speed_kmh = speed_kmh
+        self.service_minutes = service_minutes
+
+    @property
+    def trucks(self):
+        return len(self.truck_depot)
+
+    def trip_minutes(self, route):
+        return route.total_km / self.speed_kmh * 60 + len(route.stops) * self.service_minutes
+
+
+class Trip(Route):
+    """One depot-to-depot trip of a truck
+
+    ``stops`` index the stops given to ``plan_fleet``; ``load_kg`` is the
+    truck's cumulative load after each stop.
+    """
+
+    def __init__(self, stops, leg_km, depot, load_kg, minutes, truck=-1):
+        super().__init__(stops, leg_km)
+        self.depot = depot
+        self.load_kg = load_kg
+        self.minutes = minutes
+        self.truck = truck
+
+
+class FleetPlan:
+    """Trips of every truck, plus stops that could not be served"""
+
+    def __init__(self, trips, unserved):
+        self.trips = trips
+        self.unserved = unserved
+
+    @property
+    def total_km(self):
+        return float(sum(trip.total_km for trip in self.trips if trip.truck >= 0))
+
+    def truck_trips(self, truck):
+        return [trip for trip in self.trips if trip.truck == truck]
+
+    def summary(self):
+        """One row per truck: trips, stops, load, distance and shift time"""
+        served = [trip for trip in self.trips if trip.truck >= 0]
+        frame = pd.DataFrame({
+            "truck": [trip.truck for trip in served],
+            "depot": [trip.depot for trip in served],
+            "stops": [len(trip.stops) for trip in served],
+            "load_kg": [trip.load_kg[-1] if len(trip.load_kg) else 0.0 for trip in served],
+            "km": [trip.total_km for trip in served],
+            "minutes": [trip.minutes for trip in served],
+        })
+        frame["trips"] = 1
+        return frame.groupby(["truck", "depot"], as_index=False).sum()
+
+
+def nearest_depot(depots, latitude, longitude):
+    """Index of the closest depot for every stop"""
+    depots = np.asarray(depots, dtype=np.float64).reshape(-1, 2)
+    dist = haversine_km(np.asarray(latitude)[:, None], np.asarray(longitude)[:, None],
+                        depots[None, :, 0], depots[None, :, 1])
+    return dist.argmin(axis=1)
+
+
+def sweep_clusters(depot, latitude, longitude, load_kg, payload_kg):
+    """Split stops into trips by sweeping around the depot
+
+    Stops are ordered by bearing from the depot and cut into consecutive
+    groups whose load stays within ``payload_kg``. Returns a list of index
+    arrays. A stop heavier than the payload gets a trip of its own.
+    """
+    angle = np.arctan2(np.asarray(latitude) - depot[0], np.asarray(longitude) - depot[1])
+    order = np.argsort(angle, kind="stable")
+    # Start the sweep at the widest angular gap, so no trip straddles it
+    if len(order) > 1:
+        gaps = np.diff(np.append(angle[order], angle[order[0]] + 2 * np.pi))
+        order = np.roll(order, -(int(gaps.argmax()) + 1))
+    cumulative = np.cumsum(np.asarray(load_kg, dtype=np.float64)[order])
+    clusters = []
+    start, base = 0, 0.0
+    while start < len(order):
+        stop = int(np.searchsorted(cumulative, base + payload_kg, side="right"))
+        stop = max(stop, start + 1)
+        clusters.append(order[start:stop])
+        base = cumulative[stop - 1]
+        start = stop
+    return clusters
+
+
+def _solve_trip(args):
+    depot, latitude, longitude, dist, time_budget = args
+    if dist is None:
+        route = plan_route(depot, latitude, longitude, time_budget)
+    else:
+        route = solve_route(dist, time_budget)
+    return route.stops, route.leg_km
+
+
+def trip_pool(workers=None):
+    """Process pool for solving trips, to share across plans
+
+    Workers are spawned rather than forked, so the pool can be started from
+    any thread of a multi-threaded server without copying held locks.
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def _solve_trips(jobs, pool, progress=None):
+    solved = []
+    if pool is None or sum(len(job[1]) for job in jobs) < PARALLEL_MIN_STOPS:
+        for job in jobs:
+            solved.append(_solve_trip(job))
+            if progress is not None:
+                progress(solved)
+        return solved
+    futures = [pool.submit(_solve_trip, job) for job in jobs]
+    try:
+        for future in futures:
+            solved.append(future.result())
+            if progress is not None:
+                progress(solved)
+        return solved
+    finally:
+        # If progress raised (e.g. a cancelled job) drop the trips not yet started
+        for future in futures:
+            future.cancel()
+
+
+def plan_fleet(fleet, latitude, longitude, load_kg, time_budget=1.0, workers=None,
+               distances=None, progress=None, pool=None):
+    """Plan capacitated trips for a fleet over the given stops
+
+    Stops go to their nearest depot with trucks and are swept into trips
+    that fit the smallest payload among that depot's trucks; each trip is
+    then solved as its own round trip, in parallel on ``pool`` (see
+    ``trip_pool()``), or on a pool of ``workers`` processes started for
+    this plan when no pool is given; ``workers=1`` solves in-process.
+    Trips too long for a shift are split and re-solved. Finally trips are
+    handed to trucks, longest first, to the truck of their depot with the
+    most shift time left; trips that fit no truck leave their stops
+    unserved.
+
+    ``distances(depot, stops)``, if given, returns the distance matrix of a
+    depot index followed by the given stops, e.g. from a DistanceCache;
+    otherwise great-circle distances are computed per trip.
+
+    ``progress(trips_solved, trips_total, km)`` is called as trips are
+    solved, with the distance of the trips solved so far; it may raise to
+    abandon the plan.
+    """
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    load_kg = np.asarray(load_kg, dtype=np.float64)
+    owned = None
+    if pool is None and (workers or os.cpu_count() or 1) > 1:
+        pool = owned = trip_pool(workers)
+    try:
+        return _plan_fleet(fleet, latitude, longitude, load_kg, time_budget, distances,
+                           progress, pool)
+    finally:
+        if owned is not None:
+            owned.shutdown(cancel_futures=True)
+
+
+def _plan_fleet(fleet, latitude, longitude, load_kg, time_budget, distances, progress, pool):
+    # Depots without trucks take no stops
+    staffed = np.unique(fleet.truck_depot)
+    depot_of_stop = staffed[nearest_depot([fleet.depots[d] for d in staffed], latitude, longitude)]
+
+    pending = []
+    for d, depot in enumerate(fleet.depots):
+        stops = np.flatnonzero(depot_of_stop == d)
+        payloads = fleet.payload_kg[fleet.truck_depot == d]
+        if not len(stops) or not len(payloads):
+            continue
+        for cluster in sweep_clusters(depot, latitude[stops], longitude[stops],
+                                      load_kg[stops], payloads.min()):
+            pending.append((d, stops[cluster]))
+
+    trips = []
+    while pending:
+        jobs = [(fleet.depots[d], latitude[stops], longitude[stops],
+                 None if distances is None else distances(d, stops), time_budget)
+                for d, stops in pending]
+        solved_km = sum(trip.total_km for trip in trips)
+        report = None
+        if progress is not None:
+            def report(solved):
+                progress(len(trips) + len(solved), len(trips) + len(jobs),
+                         solved_km + sum(float(leg_km.sum()) for _, leg_km in solved))
+        solved = _solve_trips(jobs, pool, report)
+        retry = []
+        for (d, stops), (order, leg_km) in zip(pending, solved):
+            stops = stops[order]
+            route = Route(stops, leg_km)
+            minutes = fleet.trip_minutes(route)
+            if minutes > fleet.shift_minutes and len(stops) > 1:
+                half = len(stops) // 2
+                retry += [(d, stops[:half]), (d, stops[half:])]
+                continue
+            trips.append(Trip(stops, leg_km, d, np.cumsum(load_kg[stops]), minutes))
+        pending = retry
+
+    remaining = np.full(fleet.trucks, fleet.shift_minutes)
+    for trip in sorted(trips, key=lambda trip: -trip.minutes):
+        fits = (fleet.truck_depot == trip.depot) & (remaining >= trip.minutes) \
+            & (fleet.payload_kg >= (trip.load_kg[-1] if len(trip.load_kg) else 0))
+        if fits.any():
+            truck = int(np.flatnonzero(fits)[remaining[fits].argmax()])
+            trip.truck = truck
+            remaining[truck] -= trip.minutes
+
+    unserved = [trip.stops for trip in trips if trip.truck < 0]
+    unserved = np.sort(np.concatenate(unserved)) if unserved else np.zeros(0, dtype=np.intp)
+    trips.sort(key=lambda trip: (trip.truck < 0, trip.truck))
+    return FleetPlan(trips, unserved)
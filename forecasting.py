@@ -0,0 +1,136 @@
+import threading
+from datetime import date
+
+import numpy as np
+
+
+class FillForecast:
+    """Fill predictions for every bin of a store, from one forecaster run
+
+    ``predicted`` is (bins x horizon) fill % for days 1..horizon,
+    ``days_to_full`` the first day a bin reaches 100% (0 if already full,
+    inf if not within the horizon), ``daily_rate`` the fitted base fill rate
+    (%/day) and ``weekday_effect`` the per-bin offset by weekday (Mon=0).
+    ``weather_effect`` is the (bins x horizon) extra fill %/day expected
+    from the forecast weather, or None.
+    """
+
+    def __init__(self, version, start, predicted, days_to_full, daily_rate, weekday_effect,
+                 weather_effect=None):
+        self.version = version
+        self.start = start
+        self.predicted = predicted
+        self.days_to_full = days_to_full
+        self.daily_rate = daily_rate
+        self.weekday_effect = weekday_effect
+        self.weather_effect = weather_effect
+
+    @property
+    def next_day_rate(self):
+        """Base fill rate (%/day) adjusted for tomorrow's forecast weather"""
+        if self.weather_effect is None:
+            return self.daily_rate
+        return np.maximum(self.daily_rate + self.weather_effect[:, 0], 0)
+
+    @property
+    def horizon(self):
+        return self.predicted.shape[1]
+
+    def full_within(self, days, rows=None):
+        """Rows that reach capacity within ``days`` days"""
+        days_to_full = self.days_to_full if rows is None else self.days_to_full[rows]
+        hits = np.flatnonzero(days_to_full <= days)
+        return hits if rows is None else np.asarray(rows)[hits]
+
+
+def fit_fill_rates(history, weekdays, shrinkage=3.0):
+    """Fit base daily fill rate plus weekday effect for every bin at once
+
+    ``history`` is (bins x samples) of daily fill %, newest last, NaN where
+    missing; ``weekdays`` the weekday of each sample. The model works on
+    day-over-day increments, ignoring drops (collections). Each bin's rate
+    and weekday effects are shrunk towards the fleet-wide estimates by
+    ``shrinkage`` pseudo-observations, so bins with little history borrow
+    strength from the rest of the fleet.
+    """
+    increments = np.diff(history, axis=1)
+    valid = ~np.isnan(increments)
+    valid[valid] = increments[valid] >= 0
+    increments = np.where(valid, increments, 0.0)
+    # Each increment is attributed to the weekday it ends on
+    weekday_onehot = np.eye(7)[np.asarray(weekdays)[1:]]
+
+    n = valid.sum(axis=1)
+    fleet_rate = increments.sum() / max(n.sum(), 1)
+    daily_rate = (increments.sum(axis=1) + shrinkage * fleet_rate) / (n + shrinkage)
+
+    residual = np.where(valid, increments - daily_rate[:, None], 0.0)
+    per_weekday_sum = residual @ weekday_onehot
+    per_weekday_n = valid @ weekday_onehot
+    fleet_effect = per_weekday_sum.sum(axis=0) / np.maximum(per_weekday_n.sum(axis=0), 1)
+    fleet_effect -= fleet_effect.mean()
+    weekday_effect = (per_weekday_sum + shrinkage * fleet_effect) / (per_weekday_n + shrinkage)
+    return daily_rate, weekday_effect
+
+
+def project_fill(current, daily_rate, weekday_effect, start_weekday, horizon, weather_effect=None):
+    """Project fill % forward ``horizon`` days; returns (predicted, days_to_full)"""
+    future_weekdays = (start_weekday + np.arange(1, horizon + 1)) % 7
+    growth = daily_rate[:, None] + weekday_effect[:, future_weekdays]
+    if weather_effect is not None:
+        growth = growth + weather_effect
+    growth = np.clip(growth, 0, None)
+    level = current[:, None] + np.cumsum(growth, axis=1)
+    reached = level >= 100
+    days_to_full = np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, np.inf)
+    days_to_full[current >= 100] = 0
+    return np.clip(level, 0, 100), days_to_full
+
+
+class FillForecaster:
+    """Batched per-bin fill forecasting over a BinStore
+
+    Fits every bin's daily fill history in one vectorized pass and projects
+    the current fill level forward. The result is cached until the store's
+    version changes, i.e. until new readings arrive, or a different
+    weather effect is passed in.
+    """
+
+    def __init__(self, store, horizon_days=14, shrinkage=3.0):
+        self.store = store
+        self.horizon_days = horizon_days
+        self.shrinkage = shrinkage
+        self._lock = threading.Lock()
+        self._cached = None
+        self._weather_key = None
+
+    def forecast(self, today=None, weather_effect=None):
+        """Forecast for every bin, assuming the newest history sample is today
+
+        ``weather_effect`` is an optional (bins x horizon) extra fill %/day,
+        e.g. from ``WeatherImpact.forecast_effect``.
+        """
+        today = today or date.today()
+        with self._lock:
+            cached = self._cached
+            if cached is not None and cached.version == self.store.version and cached.start == today \
+                    and self._weather_key is weather_effect:
+                return cached
+            self._weather_key = weather_effect
+
+            store = self.store
+            with store.lock:
+                version = store.version
+                history = store.history()
+                current = store.fill_level.astype(np.float64)
+            samples = history.shape[1]
+            weekdays = (today.weekday() - np.arange(samples - 1, -1, -1)) % 7
+
+            daily_rate, weekday_effect = fit_fill_rates(history, weekdays, self.shrinkage)
+            if weather_effect is not None and len(weather_effect) != len(current):
+                weather_effect = None  # Fitted for a different set of bins
+            predicted, days_to_full = project_fill(current, daily_rate, weekday_effect,
+                                                   today.weekday(), self.horizon_days, weather_effect)
+            self._cached = FillForecast(version, today, predicted, days_to_full,
+                                        daily_rate, weekday_effect, weather_effect)
+            return self._cached
@@ -0,0 +1,412 @@
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fill drop (percentage points) between readings that counts as a collection
+COLLECTION_DROP = 30
+
+
+def decode_reading(payload):
+    """Parse one sensor reading from a dict, JSON string or JSON bytes"""
+    if isinstance(payload, dict):
+        return payload
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8")
+    payload = payload.strip()
+    if not payload:
+        return None
+    return json.loads(payload)
+
+
+class NDJSONFileSource:
+    """Tail a newline-delimited JSON file, one reading per line"""
+
+    def __init__(self, path, from_start=False, poll_interval=0.5):
+        self.path = path
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, emit):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(emit,), daemon=True,
+                                        name=f"ndjson-tail:{self.path}")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, emit):
+        while not self._stop.is_set() and not os.path.exists(self.path):
+            self._stop.wait(self.poll_interval)
+        if self._stop.is_set():
+            return
+        with open(self.path, "rb") as f:
+            if not self.from_start:
+                f.seek(0, os.SEEK_END)
+            partial = b""
+            while not self._stop.is_set():
+                chunk = f.readline()
+                if not chunk:
+                    # Start over if the file was truncated or rotated
+                    if os.path.exists(self.path) and os.path.getsize(self.path) < f.tell():
+                        f.seek(0)
+                    self._stop.wait(self.poll_interval)
+                    continue
+                partial += chunk
+                if not partial.endswith(b"\n"):
+                    continue
+                line, partial = partial, b""
+                emit(line)
+
+
+class SocketSource:
+    """Accept NDJSON readings over local TCP connections"""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """Bound (host, port), useful when port 0 picked a free port"""
+        return self._server.server_address if self._server else (self.host, self.port)
+
+    def start(self, emit):
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # emit() blocks when the pipeline is full, which stops us reading
+                # and lets TCP flow control push back on the sender
+                for line in self.rfile:
+                    emit(line)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                        name=f"iot-socket:{self.address[1]}")
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=5)
+
+
+class StandInBroker:
+    """Minimal in-process MQTT-like broker with '+' and '#' topic wildcards"""
+
+    def __init__(self, max_queued=10000):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscriptions = []
+
+    @staticmethod
+    def matches(topic_filter, topic):
+        filter_parts = topic_filter.split("/")
+        topic_parts = topic.split("/")
+        for i, part in enumerate(filter_parts):
+            if part == "#":
+                return True
+            if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+                return False
+        return len(filter_parts) == len(topic_parts)
+
+    def subscribe(self, topic_filter):
+        """Return a queue receiving (topic, payload) for matching publishes"""
+        subscription = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscriptions.append((topic_filter, subscription))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s[1] is not subscription]
+
+    def publish(self, topic, payload, timeout=None):
+        """Deliver to every matching subscriber; returns the number of deliveries"""
+        with self._lock:
+            targets = [q for f, q in self._subscriptions if self.matches(f, topic)]
+        delivered = 0
+        for target in targets:
+            try:
+                target.put((topic, payload), timeout=timeout)
+                delivered += 1
+            except queue.Full:
+                pass
+        return delivered
+
+
+class BrokerSource:
+    """Consume readings published to a StandInBroker topic"""
+
+    def __init__(self, broker, topic_filter="bins/+/telemetry"):
+        self.broker = broker
+        self.topic_filter = topic_filter
+        self._subscription = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, emit):
+        self._stop.clear()
+        self._subscription = self.broker.subscribe(self.topic_filter)
+        self._thread = threading.Thread(target=self._run, args=(emit,), daemon=True,
+                                        name=f"broker:{self.topic_filter}")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._subscription is not None:
+            self.broker.unsubscribe(self._subscription)
+
+    def _run(self, emit):
+        while not self._stop.is_set():
+            try:
+                topic, payload = self._subscription.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                reading = decode_reading(payload)
+            except ValueError:
+                continue
+            if isinstance(reading, dict) and "bin_id" not in reading:
+                # Fall back to the bin id embedded in bins/<id>/telemetry
+                reading["bin_id"] = topic.split("/")[1]
+            emit(reading)
+
+
+class IngestionPipeline:
+    """Apply micro-batched sensor readings to a BinStore
+
+    Sources push raw readings into a bounded queue; a worker drains it in
+    batches of up to ``batch_size`` (or every ``flush_interval`` seconds) and
+    applies each batch to the store with vectorized column writes. When the
+    queue is full, sources block for up to ``submit_timeout`` seconds before
+    the reading is dropped, so a slow consumer throttles producers instead of
+    growing memory. Readings that are not newer than the last one applied for
+    a bin (duplicates and late arrivals) are discarded. The store's fill
+    history gets one sample per bin per ``history_interval``, the mean of
+    the readings in it, continuing from the store's newest sample.
+
+    A reading is ``{"bin_id", "ts", "fill_level", "temperature", "humidity"}``
+    with ``ts`` in epoch seconds; sensor fields may be omitted. Readings that
+    cannot be parsed are counted as invalid and skipped; a batch that fails
+    to apply is counted in ``failed_batches`` and the worker carries on.
+    """
+
+    def __init__(self, store, batch_size=5000, flush_interval=1.0, max_pending=100000,
+                 submit_timeout=5.0, history_interval=86400):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.submit_timeout = submit_timeout
+        self.history_interval = history_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._sources = []
+        self._listeners = []
+        self._stop = threading.Event()
+        self._worker = None
+        self._last_ts = np.full(0, -np.inf)
+        self._last_history_bucket = np.full(0, -1, dtype=np.int64)
+        self._bucket_sum = np.zeros(0)
+        self._bucket_count = np.zeros(0, dtype=np.int64)
+        self._stats_lock = threading.Lock()
+        self.last_error = None
+        self.stats = {
+            "received": 0, "applied": 0, "stale": 0, "unknown": 0,
+            "invalid": 0, "dropped": 0, "batches": 0, "failed_batches": 0,
+            "last_batch_ms": 0.0,
+        }
+
+    def add_source(self, source):
+        self._sources.append(source)
+        if self._worker is not None:
+            source.start(self.submit)
+
+    def add_listener(self, callback):
+        """Call ``callback(rows, batch)`` after each applied batch"""
+        self._listeners.append(callback)
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def submit(self, payload):
+        """Queue a raw reading, blocking while the pipeline is full"""
+        try:
+            self._queue.put(payload, timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            self._count("dropped")
+            return False
+
+    def start(self):
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, daemon=True, name="iot-ingestion")
+        self._worker.start()
+        for source in self._sources:
+            source.start(self.submit)
+
+    def stop(self):
+        for source in self._sources:
+            source.stop()
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if self._stop.is_set() and self._queue.empty():
+                    break
+            if batch:
+                try:
+                    self.apply_batch(batch)
+                except Exception as e:
+                    self.last_error = e
+                    self._count("failed_batches")
+                    logger.exception("Failed to apply a batch of %d readings", len(batch))
+
+    def _ensure_capacity(self, n):
+        known = len(self._last_ts)
+        if known < n:
+            grown = np.full(n, -np.inf)
+            grown[:known] = self._last_ts
+            self._last_ts = grown
+            # New bins continue from the interval of their newest stored sample
+            history_ts = self.store.history_times(np.arange(known, n))
+            buckets = np.full(n, -1, dtype=np.int64)
+            buckets[:known] = self._last_history_bucket
+            seeded = np.isfinite(history_ts)
+            buckets[known:][seeded] = history_ts[seeded] // self.history_interval
+            self._last_history_bucket = buckets
+            self._bucket_sum = np.r_[self._bucket_sum, np.zeros(n - known)]
+            self._bucket_count = np.r_[self._bucket_count, np.zeros(n - known, dtype=np.int64)]
+
+    def _columns(self, payloads):
+        """Decode a list of payloads into column arrays"""
+        ids, ts, fill, temperature, humidity = [], [], [], [], []
+        nan = float("nan")
+        for payload in payloads:
+            # Parse every field before appending any, so the columns stay aligned
+            try:
+                reading = decode_reading(payload)
+                if reading is None:
+                    continue
+                bin_id = str(reading["bin_id"])
+                reading_ts = float(reading["ts"])
+                values = [nan if reading.get(field) is None else float(reading[field])
+                          for field in ("fill_level", "temperature", "humidity")]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self._count("invalid")
+                continue
+            if not np.isfinite(reading_ts):
+                self._count("invalid")
+                continue
+            ids.append(bin_id)
+            ts.append(reading_ts)
+            for column, value in zip((fill, temperature, humidity), values):
+                column.append(value)
+        return (ids, np.array(ts, dtype=np.float64), np.array(fill, dtype=np.float64),
+                np.array(temperature, dtype=np.float64), np.array(humidity, dtype=np.float64))
+
+    def apply_batch(self, payloads):
+        """Apply a batch of readings to the store; returns the number applied"""
+        started = time.perf_counter()
+        self._count("received", len(payloads))
+        ids, ts, fill, temperature, humidity = self._columns(payloads)
+        store = self.store
+
+        rows = store.index_of(ids)
+        known = rows >= 0
+        self._count("unknown", int((~known).sum()))
+        rows, ts, fill, temperature, humidity = (
+            rows[known], ts[known], fill[known], temperature[known], humidity[known])
+
+        with store.lock:
+            self._ensure_capacity(len(store))
+
+            # Keep only the newest reading per bin, and only if it is newer
+            # than what has already been applied
+            order = np.lexsort((ts, rows))
+            rows, ts, fill, temperature, humidity = (
+                rows[order], ts[order], fill[order], temperature[order], humidity[order])
+            latest = np.ones(len(rows), dtype=bool)
+            latest[:-1] = rows[1:] != rows[:-1]
+            fresh = latest & (ts > self._last_ts[rows])
+            self._count("stale", int(len(rows) - fresh.sum()))
+            rows, ts, fill, temperature, humidity = (
+                rows[fresh], ts[fresh], fill[fresh], temperature[fresh], humidity[fresh])
+            self._last_ts[rows] = ts
+
+            has_fill = ~np.isnan(fill)
+            fill_rows, fill = rows[has_fill], np.clip(fill[has_fill], 0, 100)
+            previous = store.fill_level[fill_rows]
+            store.update_fill(fill_rows, fill)
+
+            # A sharp drop in fill means the bin was emptied
+            collected = previous - fill >= COLLECTION_DROP
+            if collected.any():
+                collected_rows = fill_rows[collected]
+                store.update_column("last_collected", collected_rows,
+                                    ts[has_fill][collected].astype("datetime64[s]"))
+                store.update_column("collection_count", collected_rows,
+                                    store.column("collection_count")[collected_rows] + 1)
+
+            # Keep one history sample per bin per history interval: the running
+            # mean of the interval's readings, appended when the interval opens
+            fill_ts = ts[has_fill]
+            bucket = (fill_ts // self.history_interval).astype(np.int64)
+            last = self._last_history_bucket[fill_rows]
+            opened = bucket > last
+            current = opened | (bucket == last)
+            self._bucket_sum[fill_rows[opened]] = 0
+            self._bucket_count[fill_rows[opened]] = 0
+            current_rows, opened = fill_rows[current], opened[current]
+            self._bucket_sum[current_rows] += fill[current]
+            self._bucket_count[current_rows] += 1
+            mean = self._bucket_sum[current_rows] / self._bucket_count[current_rows]
+            store.append_history(current_rows[opened], mean[opened], fill_ts[current][opened])
+            store.update_latest_history(current_rows[~opened], mean[~opened])
+            self._last_history_bucket[current_rows[opened]] = bucket[current][opened]
+
+            for name, values in (("temperature", temperature), ("humidity", humidity)):
+                present = ~np.isnan(values)
+                store.update_column(name, rows[present], values[present])
+
+        batch = {"ts": ts, "fill_level": fill, "fill_rows": fill_rows,
+                 "fill_ts": ts[has_fill], "temperature": temperature, "humidity": humidity}
+        for listener in self._listeners:
+            listener(rows, batch)
+
+        self._count("applied", len(rows))
+        self._count("batches")
+        with self._stats_lock:
+            self.stats["last_batch_ms"] = (time.perf_counter() - started) * 1000
+        return len(rows)
@@ -0,0 +1,119 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop"""
+
+
+class Job:
+    """One background computation: its state, latest progress and result
+
+    The job function receives the job and calls ``report()`` with whatever
+    progress it has (e.g. best cost so far, iterations); ``report()`` is
+    also where a cancelled job stops, by raising ``JobCancelled``.
+    """
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.state = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, CANCELLED, FAILED)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report"""
+        self._cancel.set()
+
+    def report(self, **progress):
+        """Record progress from inside the job; raises JobCancelled if cancelled"""
+        with self._lock:
+            self.progress = {**self.progress, **progress}
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def snapshot(self):
+        """Copy of the latest progress, safe to read while the job runs"""
+        with self._lock:
+            return dict(self.progress)
+
+
+class JobRunner:
+    """Runs jobs on a small thread pool, shared by every session
+
+    Sessions keep only job ids; results stay here until taken with
+    ``pop()`` on a later rerun. Finished jobs nobody collects are dropped
+    after ``retain_seconds``.
+    """
+
+    def __init__(self, workers=2, retain_seconds=3600):
+        self.retain_seconds = retain_seconds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        """Start ``fn(job, *args, **kwargs)`` in the background; returns the Job"""
+        self._expire()
+        job = Job(f"{name}-{next(self._ids)}", name)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, fn, args, kwargs):
+        if job.cancelled:
+            state = CANCELLED
+        else:
+            job.state = RUNNING
+            try:
+                job.result = fn(job, *args, **kwargs)
+                state = DONE
+            except JobCancelled:
+                state = CANCELLED
+            except Exception as e:
+                job.error = e
+                state = FAILED
+        # finished_at first, so a job that reads as finished always has it
+        job.finished_at = time.time()
+        job.state = state
+
+    def get(self, job_id):
+        """The job with this id, or None if it is unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        """Remove and return a job, e.g. once its result is in the session"""
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def _expire(self):
+        cutoff = time.time() - self.retain_seconds
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished_at is not None and job.finished_at < cutoff]:
+                del self._jobs[job_id]
@@ -0,0 +1,146 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from route_objectives import FUEL_L_PER_KM, FUEL_L_PER_MINUTE
+
+# Extra litres per km for every tonne carried, on top of the empty truck's FUEL_L_PER_KM
+FUEL_L_PER_TONNE_KM = 0.02
+CO2_KG_PER_L = 2.68  # Diesel
+FUEL_PRICE_PER_L = 1.10  # USD
+SERVICE_MINUTES = 2.0  # Per stop, emptying the bin
+
+# Ledger columns and their dtypes; "day" counts days since 1970-01-01 (UTC)
+LEDGER_COLUMNS = {
+    "day": np.int32,
+    "depot": np.int16,
+    "truck": np.int32,
+    "trip": np.int32,
+    "leg": np.int32,
+    "km": np.float32,
+    "minutes": np.float32,
+    "load_kg": np.float32,
+    "fuel_l": np.float32,
+    "co2_kg": np.float32,
+}
+
+REPORT_METRICS = ("km", "minutes", "fuel_l", "co2_kg")
+
+
+def leg_costs(leg_km, leg_minutes, load_kg):
+    """Fuel (L) and CO2 (kg) of each leg, driven with ``load_kg`` on board"""
+    leg_km = np.asarray(leg_km, dtype=np.float64)
+    fuel_l = leg_km * (FUEL_L_PER_KM + FUEL_L_PER_TONNE_KM * np.asarray(load_kg) / 1000) \
+        + FUEL_L_PER_MINUTE * np.asarray(leg_minutes, dtype=np.float64)
+    return fuel_l, fuel_l * CO2_KG_PER_L
+
+
+def route_legs(leg_km, leg_minutes, stop_load_kg):
+    """Per-leg accounting of one depot-to-depot trip, as a DataFrame
+
+    ``leg_km``/``leg_minutes`` run from the depot to the first stop through
+    the return leg; ``stop_load_kg`` is what each stop adds to the truck,
+    so every leg is costed with the load on board while it is driven.
+    Service time at the stop a leg ends at is included in its minutes.
+    """
+    leg_km = np.asarray(leg_km, dtype=np.float64)
+    on_board = np.concatenate([[0.0], np.cumsum(stop_load_kg)])
+    fuel_l, co2_kg = leg_costs(leg_km, leg_minutes, on_board)
+    service = np.full(len(leg_km), SERVICE_MINUTES)
+    service[-1] = 0.0
+    return pd.DataFrame({
+        "leg": np.arange(len(leg_km)),
+        "km": leg_km,
+        "minutes": np.asarray(leg_minutes, dtype=np.float64) + service,
+        "load_kg": on_board,
+        "fuel_l": fuel_l,
+        "co2_kg": co2_kg,
+    })
+
+
+class LegLedger:
+    """Columnar ledger of every driven leg: distance, time, load, fuel, CO2
+
+    Legs are appended a trip at a time into preallocated NumPy columns that
+    grow by doubling, so the ledger holds millions of legs compactly and
+    reports are vectorized group-bys over whole columns.
+    """
+
+    def __init__(self, capacity=4096):
+        self._lock = threading.Lock()
+        self._n = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype)
+                         for name, dtype in LEDGER_COLUMNS.items()}
+
+    def __len__(self):
+        return self._n
+
+    def _reserve(self, extra):
+        needed = self._n + extra
+        capacity = len(self._columns["day"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._n] = column[:self._n]
+            self._columns[name] = grown
+
+    def append(self, day, depot, truck, trip, legs):
+        """Record one trip's legs (a ``route_legs`` frame) driven on ``day``
+
+        ``day`` is a date-like value or a day number since the epoch.
+        """
+        if not isinstance(day, (int, np.integer)):
+            day = int(np.datetime64(pd.Timestamp(day).date(), "D").astype(np.int64))
+        n = len(legs)
+        values = {"day": day, "depot": depot, "truck": truck, "trip": trip,
+                  **{name: legs[name].to_numpy() for name in
+                     ("leg", "km", "minutes", "load_kg", "fuel_l", "co2_kg")}}
+        with self._lock:
+            self._reserve(n)
+            for name, column in self._columns.items():
+                column[self._n:self._n + n] = values[name]
+            self._n += n
+
+    def frame(self):
+        with self._lock:
+            frame = pd.DataFrame({name: column[:self._n].copy()
+                                  for name, column in self._columns.items()})
+        frame.insert(0, "date", pd.to_datetime(frame["day"].astype("int64"), unit="D"))
+        return frame
+
+    def report(self, freq="W", by=("truck",), start=None, end=None):
+        """Totals of km, minutes, fuel and CO2 per period and ``by`` columns
+
+        ``freq`` is "D", "W" (weeks starting Monday) or "M" (calendar
+        months); ``start``/``end`` bound the days, end exclusive. Periods
+        are derived from the day numbers with array arithmetic, and the
+        totals come from one group-by over the matching legs.
+        """
+        with self._lock:
+            day = self._columns["day"][:self._n]
+            keep = np.ones(self._n, dtype=bool)
+            if start is not None:
+                keep &= day >= np.datetime64(pd.Timestamp(start).date(), "D").astype(np.int64)
+            if end is not None:
+                keep &= day < np.datetime64(pd.Timestamp(end).date(), "D").astype(np.int64)
+            columns = {name: self._columns[name][:self._n][keep]
+                       for name in tuple(by) + REPORT_METRICS}
+            columns["legs"] = np.ones(int(keep.sum()), dtype=np.int64)
+            day = day[keep].astype("datetime64[D]")
+
+        if freq == "D":
+            period = day
+        elif freq == "W":
+            # 1970-01-01 was a Thursday; shift so weeks start on Monday
+            period = (day - ((day.astype(np.int64) + 3) % 7)).astype("datetime64[D]")
+        elif freq == "M":
+            period = day.astype("datetime64[M]").astype("datetime64[D]")
+        else:
+            raise ValueError(f"Unknown report frequency '{freq}'")
+        frame = pd.DataFrame({"period": period, **columns})
+        frame = frame.groupby(["period", *by], as_index=False, sort=True)[
+            [*REPORT_METRICS, "legs"]].sum()
+        return frame
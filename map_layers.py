@@ -0,0 +1,143 @@
+import math
+
+import folium
+import numpy as np
+from folium.plugins import MarkerCluster
+
+from bin_store import RED, STATUS_LABELS, STATUS_THRESHOLDS
+
+# Marker colors per status code (green, yellow, red)
+STATUS_COLORS = ("#4CAF50", "#FFC107", "#F44336")
+
+# Above this many bins the map draws aggregated cluster circles instead
+CLUSTER_THRESHOLD = 2000
+
+
+def bin_features(store, rows):
+    """GeoJSON FeatureCollection with one point per bin"""
+    rows = np.asarray(rows, dtype=np.intp)
+    locations = store.location_labels
+    status = store.status[rows].tolist()
+    last_collected = np.datetime_as_string(store.column("last_collected")[rows], unit="D").tolist()
+    columns = zip(
+        store.ids[rows].tolist(),
+        store.latitude[rows].tolist(),
+        store.longitude[rows].tolist(),
+        store.location[rows].tolist(),
+        np.round(store.fill_level[rows]).astype(int).tolist(),
+        status,
+        last_collected,
+        store.column("temperature")[rows].round(1).tolist(),
+        store.column("humidity")[rows].round(1).tolist(),
+    )
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "id": bin_id,
+                    "location": locations[location],
+                    "fill": fill,
+                    "status": STATUS_LABELS[code].upper(),
+                    "last_collected": collected,
+                    "temperature": temperature,
+                    "humidity": humidity,
+                    "color": STATUS_COLORS[code],
+                },
+            }
+            for bin_id, lat, lon, location, fill, code, collected, temperature, humidity in columns
+        ],
+    }
+
+
+def cluster_features(store, rows, cells_across=40):
+    """GeoJSON FeatureCollection aggregating bins into grid cells
+
+    The grid spans the extent of the given bins with ``cells_across`` cells
+    along its longer side. Each feature carries the bin count, average fill
+    and number of full bins of its cell, placed at the cells' mean position.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    if not len(rows):
+        return {"type": "FeatureCollection", "features": []}
+    lat, lon = store.latitude[rows], store.longitude[rows]
+    fill = store.fill_level[rows].astype(np.float64)
+    full = store.status[rows] == RED
+
+    cell_size = max(lat.max() - lat.min(), lon.max() - lon.min(), 1e-6) / cells_across
+    cell_lat = ((lat - lat.min()) // cell_size).astype(np.int64)
+    cell_lon = ((lon - lon.min()) // cell_size).astype(np.int64)
+    _, cell, count = np.unique(cell_lat * (cells_across + 1) + cell_lon,
+                               return_inverse=True, return_counts=True)
+    cell = cell.ravel()
+
+    mean_lat = np.bincount(cell, weights=lat) / count
+    mean_lon = np.bincount(cell, weights=lon) / count
+    mean_fill = np.bincount(cell, weights=fill) / count
+    full_count = np.bincount(cell, weights=full).astype(int)
+    # Color cells by their average fill, using the bin status thresholds
+    color = np.take(STATUS_COLORS, np.digitize(mean_fill, STATUS_THRESHOLDS))
+
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [x, y]},
+                "properties": {
+                    "bins": n,
+                    "avg_fill": round(f, 1),
+                    "full_bins": r,
+                    "color": c,
+                    "radius": 6 + 4 * math.log2(n),
+                },
+            }
+            for y, x, n, f, r, c in zip(mean_lat.tolist(), mean_lon.tolist(), count.tolist(),
+                                        mean_fill.tolist(), full_count.tolist(), color.tolist())
+        ],
+    }
+
+
+def add_bin_layer(m, store, rows, cluster_threshold=CLUSTER_THRESHOLD):
+    """Draw bins on a folium map as a single GeoJSON layer
+
+    Up to ``cluster_threshold`` bins are drawn individually inside a
+    client-side marker cluster, with popups built in the browser from the
+    feature properties when clicked. Larger selections are aggregated into
+    cluster circles before they are sent. Returns "bins" or "clusters".
+    """
+    if len(rows) <= cluster_threshold:
+        layer = folium.GeoJson(
+            bin_features(store, rows),
+            name="Bins",
+            marker=folium.CircleMarker(radius=8, weight=2, fill=True, fill_opacity=0.85),
+            style_function=lambda feature: {
+                "color": "white",
+                "fillColor": feature["properties"]["color"],
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["id", "fill"], aliases=["Bin", "Fill %"]),
+            popup=folium.GeoJsonPopup(
+                fields=["id", "location", "fill", "status", "last_collected",
+                        "temperature", "humidity"],
+                aliases=["Bin", "Location", "Fill Level (%)", "Status", "Last Collected",
+                         "Temperature (°C)", "Humidity (%)"],
+            ),
+        )
+        layer.add_to(MarkerCluster(name="Bin clusters", disable_clustering_at_zoom=16).add_to(m))
+        return "bins"
+
+    folium.GeoJson(
+        cluster_features(store, rows),
+        name="Bin clusters",
+        marker=folium.CircleMarker(weight=1, fill=True, fill_opacity=0.6),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+            "radius": feature["properties"]["radius"],
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["bins", "avg_fill", "full_bins"],
+                                      aliases=["Bins", "Avg Fill %", "Full Bins"]),
+    ).add_to(m)
+    return "clusters"
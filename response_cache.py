@@ -0,0 +1,246 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Words dropped before matching prompts; they carry little of a question's meaning
+STOP_WORDS = frozenset("""
+a an and are as at be by can could do does for from how i in is it me my of on or
+please some that the this to what whats when where which will with would you your
+""".split())
+
+# Words that flip a question's meaning; prompts only match if they agree on them
+NEGATIONS = frozenset("not no never without nor none cannot".split())
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_prompt(prompt):
+    """Lowercase words of a prompt, without punctuation or extra whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", re.sub(r"n't\b", " not", prompt.lower())))
+
+
+def anchors(normalized):
+    """The numbers and negations of a prompt, which a paraphrase must share exactly
+
+    "When will bin 7 be full?" and "When will bin 5 be full?", or "Should I
+    compost meat?" and "Should I not compost meat?", are similar as sets of
+    shingles but need different answers.
+    """
+    words = normalized.split()
+    return (tuple(sorted({word for word in words if word.isdigit()})),
+            tuple(sorted({word for word in words if word in NEGATIONS})))
+
+
+def shingles(normalized, size=3):
+    """Character ``size``-grams of each content word, plus the words themselves
+
+    Working within words makes matches robust to reordering and small
+    rewordings ("recycle"/"recycling") without matching across topics.
+    """
+    words = [word for word in normalized.split() if word not in STOP_WORDS] or normalized.split()
+    found = set(words)
+    for word in words:
+        padded = f"^{word}$"
+        found.update(padded[i:i + size] for i in range(max(len(padded) - size + 1, 1)))
+    return found
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets, and banding keys for near-duplicate lookup
+
+    The fraction of equal signature entries estimates the Jaccard
+    similarity of two sets. Each permutation is a universal hash
+    ``(a*x + b) mod p`` over the full 61-bit range of the Mersenne prime
+    ``p``, computed exactly with Python integers; a prompt has only tens of
+    shingles, so this costs well under a millisecond.
+    """
+
+    def __init__(self, num_perm=128, bands=32, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        # Object arrays of Python ints, so a*x + b is exact before the modulo
+        self._a = np.array([int(a) for a in rng.integers(1, _MERSENNE_PRIME, num_perm)], dtype=object)
+        self._b = np.array([int(b) for b in rng.integers(0, _MERSENNE_PRIME, num_perm)], dtype=object)
+
+    def signature(self, shingle_set):
+        hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(),
+                                          "little") % _MERSENNE_PRIME
+                           for s in shingle_set], dtype=object)
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint64)
+
+    def band_keys(self, signature):
+        return [hash(band.tobytes()) for band in signature.reshape(self.bands, -1)]
+
+    @staticmethod
+    def similarity(first, second):
+        return float(np.mean(first == second))
+
+
+class _Cached:
+    __slots__ = ("response", "signature", "bands", "created", "size")
+
+    def __init__(self, response, signature, bands, size):
+        self.response = response
+        self.signature = signature
+        self.bands = bands  # Keys of the entry in ResponseCache._bands
+        self.created = time.monotonic()
+        self.size = size
+
+
+class ResponseCache:
+    """LRU/TTL cache of assistant responses, matched on prompt and context
+
+    Entries are keyed on the normalized prompt plus a coarse fingerprint of
+    the context it was answered in, so an answer is only reused while the
+    situation it describes still holds. A prompt that is not an exact
+    match can still hit a cached paraphrase in the same context with the
+    same numbers and negations: MinHash signatures of word shingles are
+    indexed by LSH bands, and a candidate whose estimated Jaccard
+    similarity reaches ``similarity`` is returned.
+
+    Entries expire after ``ttl`` seconds, and the least recently used are
+    evicted to keep the estimated size within ``max_bytes``. Misses on the
+    same prompt are single-flight: concurrent callers wait for the one
+    request in progress instead of repeating it.
+    """
+
+    ENTRY_OVERHEAD = 512  # Bytes per entry for keys, index and bookkeeping
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=6 * 3600, similarity=0.7, hasher=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hasher = hasher or MinHasher()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (fingerprint, normalized prompt) -> _Cached
+        self._bands = {}  # (fingerprint, anchors, band, band key) -> set of entry keys
+        self._inflight = {}
+        self.bytes = 0
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["near_hits"]) / lookups if lookups else 0.0
+
+    @staticmethod
+    def _index_prefix(key):
+        """Near duplicates are only looked for in the same context with the same anchors"""
+        return key[0], anchors(key[1])
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        prefix = self._index_prefix(key)
+        for band, band_key in enumerate(entry.bands):
+            members = self._bands.get((*prefix, band, band_key))
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._bands[(*prefix, band, band_key)]
+        self.bytes -= entry.size
+
+    def _expired(self, entry):
+        return time.monotonic() - entry.created >= self.ttl
+
+    def _lookup(self, key, signature, bands):
+        """Cached response for an exact or near-duplicate prompt; call with the lock held"""
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry.response
+
+        candidates = set()
+        prefix = self._index_prefix(key)
+        for band, band_key in enumerate(bands):
+            candidates |= self._bands.get((*prefix, band, band_key), set())
+        best, best_similarity = None, self.similarity
+        for candidate in candidates:
+            other = self._entries[candidate]
+            if self._expired(other):
+                self._drop(candidate)
+                continue
+            similarity = self.hasher.similarity(signature, other.signature)
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self._entries.move_to_end(best)
+            self.stats["near_hits"] += 1
+            return self._entries[best].response
+        return None
+
+    def _signature(self, normalized):
+        signature = self.hasher.signature(shingles(normalized))
+        return signature, self.hasher.band_keys(signature)
+
+    def get(self, prompt, fingerprint=""):
+        """Cached response for the prompt in this context, or None"""
+        normalized = normalize_prompt(prompt)
+        signature, bands = self._signature(normalized)
+        with self._lock:
+            response = self._lookup((fingerprint, normalized), signature, bands)
+            if response is None:
+                self.stats["misses"] += 1
+            return response
+
+    def put(self, prompt, response, fingerprint=""):
+        normalized = normalize_prompt(prompt)
+        signature, bands = self._signature(normalized)
+        key = (fingerprint, normalized)
+        size = len(response.encode()) + len(normalized) + signature.nbytes + self.ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Cached(response, signature, bands, size)
+            prefix = self._index_prefix(key)
+            for band, band_key in enumerate(bands):
+                self._bands.setdefault((*prefix, band, band_key), set()).add(key)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def get_or_create(self, prompt, create, fingerprint=""):
+        """Cached response for the prompt, else ``create()``'s, which is then cached
+
+        Exceptions from ``create`` propagate and nothing is cached.
+        """
+        normalized = normalize_prompt(prompt)
+        signature, bands = self._signature(normalized)
+        key = (fingerprint, normalized)
+        with self._lock:
+            response = self._lookup(key, signature, bands)
+            if response is not None:
+                return response
+            self.stats["misses"] += 1
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = self._inflight[key] = threading.Lock()
+        with inflight:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not self._expired(entry):
+                    self._entries.move_to_end(key)
+                    return entry.response
+            try:
+                response = create()
+                self.put(prompt, response, fingerprint)
+                return response
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is inflight:
+                        del self._inflight[key]
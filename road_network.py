@@ -0,0 +1,485 @@
+import heapq
+import math
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from spatial import GridIndex, haversine_km
+
+try:
+    import osmium
+except ImportError:  # only needed for .osm.pbf extracts
+    osmium = None
+
+# Assumed speeds (km/h) by OSM highway type when a road has no maxspeed
+HIGHWAY_SPEED_KMH = {
+    "motorway": 80, "motorway_link": 50, "trunk": 60, "trunk_link": 40,
+    "primary": 40, "primary_link": 30, "secondary": 35, "secondary_link": 30,
+    "tertiary": 30, "tertiary_link": 25, "unclassified": 25, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25,
+}
+DEFAULT_SPEED_KMH = 25
+
+# Speed for the stretch between a bin and its nearest road node
+ACCESS_SPEED_KMH = 15
+
+# Pairs the road graph cannot connect fall back to straight line times this
+DETOUR_FACTOR = 1.5
+
+
+def _parse_speed(value):
+    """km/h from an OSM maxspeed value such as "25 mph", "50" or "['25 mph', '30 mph']" """
+    if value is None:
+        return None
+    for part in str(value).strip("[]").replace("'", "").split(","):
+        part = part.strip()
+        mph = part.endswith("mph")
+        try:
+            speed = float(part.replace("mph", "").strip())
+        except ValueError:
+            continue
+        return speed * 1.609344 if mph else speed
+    return None
+
+
+def _road_speed(highway, maxspeed):
+    speed = _parse_speed(maxspeed)
+    if speed:
+        return speed
+    highway = str(highway or "").strip("[]").replace("'", "").split(",")[0].strip()
+    return HIGHWAY_SPEED_KMH.get(highway, DEFAULT_SPEED_KMH)
+
+
+class RoadGraph:
+    """Directed road network in compressed sparse row (CSR) form
+
+    Nodes carry coordinates; ``indptr[u]:indptr[u + 1]`` spans the edges
+    leaving ``u``, with their head node, length (m) and travel time (s).
+    """
+
+    def __init__(self, latitude, longitude, tail, head, length_m, time_s):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        order = np.argsort(tail, kind="stable")
+        self.indices = np.asarray(head, dtype=np.int32)[order]
+        self.length_m = np.asarray(length_m, dtype=np.float32)[order]
+        self.time_s = np.asarray(time_s, dtype=np.float32)[order]
+        counts = np.bincount(np.asarray(tail)[order], minlength=len(self.latitude))
+        self.indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._index = None
+
+    @property
+    def nodes(self):
+        return len(self.latitude)
+
+    @property
+    def edges(self):
+        return len(self.indices)
+
+    def edge_list(self):
+        """(tail, head, length_m, time_s) arrays"""
+        tail = np.repeat(np.arange(self.nodes), np.diff(self.indptr))
+        return tail, self.indices, self.length_m, self.time_s
+
+    def save(self, path):
+        np.savez(path, latitude=self.latitude, longitude=self.longitude,
+                 indptr=self.indptr, indices=self.indices,
+                 length_m=self.length_m, time_s=self.time_s)
+
+    @classmethod
+    def load(cls, path):
+        """Load a road network from .graphml, .osm (XML), .osm.pbf or a saved .npz"""
+        if path.endswith(".npz"):
+            data = np.load(path)
+            tail = np.repeat(np.arange(len(data["latitude"])), np.diff(data["indptr"]))
+            return cls(data["latitude"], data["longitude"], tail, data["indices"],
+                       data["length_m"], data["time_s"])
+        if path.endswith(".graphml"):
+            return cls.from_graphml(path)
+        if path.endswith(".pbf"):
+            return cls.from_osm_pbf(path)
+        return cls.from_osm_xml(path)
+
+    @classmethod
+    def from_graphml(cls, path):
+        """Read a GraphML road graph, e.g. as saved by OSMnx
+
+        Node coordinates come from the "y"/"x" attributes; edges use
+        "length" (m) and "travel_time" (s) if present, otherwise speed is
+        taken from "speed_kph", "maxspeed" or the "highway" type.
+        """
+        keys = {}
+        node_ids, latitude, longitude = {}, [], []
+        edges = []
+        directed = True
+        for _, element in ET.iterparse(path, events=("end",)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "key":
+                keys[element.get("id")] = element.get("attr.name")
+            elif tag == "graph":
+                directed = element.get("edgedefault", "directed") == "directed"
+            elif tag in ("node", "edge"):
+                data = {keys.get(d.get("key"), d.get("key")): d.text
+                        for d in element if d.tag.rsplit("}", 1)[-1] == "data"}
+                if tag == "node":
+                    node_ids[element.get("id")] = len(latitude)
+                    latitude.append(float(data["y"]))
+                    longitude.append(float(data["x"]))
+                else:
+                    edges.append((element.get("source"), element.get("target"), data))
+                element.clear()
+
+        tail, head, length_m, time_s = [], [], [], []
+        for source, target, data in edges:
+            u, v = node_ids[source], node_ids[target]
+            if "length" in data:
+                length = float(data["length"])
+            else:
+                length = float(haversine_km(latitude[u], longitude[u],
+                                            latitude[v], longitude[v])) * 1000
+            if data.get("travel_time"):
+                seconds = float(data["travel_time"])
+            else:
+                speed = _parse_speed(data.get("speed_kph")) \
+                    or _road_speed(data.get("highway"), data.get("maxspeed"))
+                seconds = length / 1000 / speed * 3600
+            pairs = [(u, v)] if directed else [(u, v), (v, u)]
+            for a, b in pairs:
+                tail.append(a)
+                head.append(b)
+                length_m.append(length)
+                time_s.append(seconds)
+        return cls(latitude, longitude, tail, head, length_m, time_s)
+
+    @classmethod
+    def from_osm_xml(cls, path):
+        """Read drivable roads from an OSM XML extract (.osm)"""
+        coords, ways = {}, []
+        for _, element in ET.iterparse(path, events=("end",)):
+            if element.tag == "node":
+                coords[int(element.get("id"))] = (float(element.get("lat")),
+                                                  float(element.get("lon")))
+                element.clear()
+            elif element.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in element.findall("tag")}
+                if tags.get("highway") in HIGHWAY_SPEED_KMH:
+                    ways.append(([int(nd.get("ref")) for nd in element.findall("nd")], tags))
+                element.clear()
+        return cls._from_ways(coords, ways)
+
+    @classmethod
+    def from_osm_pbf(cls, path):
+        """Read drivable roads from an OSM PBF extract; requires the osmium package"""
+        if osmium is None:
+            raise ImportError("Reading .osm.pbf files requires the 'osmium' package "
+                              "(pip install osmium); GraphML and .osm XML need nothing extra")
+        coords, ways = {}, []
+
+        class Handler(osmium.SimpleHandler):
+            def way(self, way):
+                tags = {tag.k: tag.v for tag in way.tags}
+                if tags.get("highway") not in HIGHWAY_SPEED_KMH:
+                    return
+                refs = []
+                for node in way.nodes:
+                    if node.location.valid():
+                        coords[node.ref] = (node.location.lat, node.location.lon)
+                        refs.append(node.ref)
+                ways.append((refs, tags))
+
+        Handler().apply_file(path, locations=True)
+        return cls._from_ways(coords, ways)
+
+    @classmethod
+    def _from_ways(cls, coords, ways):
+        """Build the graph from OSM ways, keeping only nodes used by roads"""
+        node_of = {}
+        tail, head, speed = [], [], []
+        for refs, tags in ways:
+            refs = [ref for ref in refs if ref in coords]
+            oneway = tags.get("oneway", "no")
+            kmh = _road_speed(tags.get("highway"), tags.get("maxspeed"))
+            for a, b in zip(refs[:-1], refs[1:]):
+                u = node_of.setdefault(a, len(node_of))
+                v = node_of.setdefault(b, len(node_of))
+                if oneway in ("yes", "true", "1"):
+                    pairs = [(u, v)]
+                elif oneway == "-1":
+                    pairs = [(v, u)]
+                else:
+                    pairs = [(u, v), (v, u)]
+                for x, y in pairs:
+                    tail.append(x)
+                    head.append(y)
+                    speed.append(kmh)
+        latitude = np.empty(len(node_of))
+        longitude = np.empty(len(node_of))
+        for ref, node in node_of.items():
+            latitude[node], longitude[node] = coords[ref]
+        tail, head = np.array(tail, dtype=np.int64), np.array(head, dtype=np.int64)
+        length_m = haversine_km(latitude[tail], longitude[tail],
+                                latitude[head], longitude[head]) * 1000
+        time_s = length_m / 1000 / np.array(speed) * 3600
+        return cls(latitude, longitude, tail, head, length_m, time_s)
+
+    def nearest_nodes(self, latitude, longitude):
+        """Closest graph node and its distance (km) for every point"""
+        if self._index is None:
+            self._index = GridIndex(cell_size=0.005)
+            self._index.insert(np.arange(self.nodes), self.latitude, self.longitude)
+        nodes = np.empty(len(latitude), dtype=np.int64)
+        km = np.empty(len(latitude))
+        for i, (lat, lon) in enumerate(zip(np.asarray(latitude).tolist(),
+                                           np.asarray(longitude).tolist())):
+            rows, dist = self._index.nearest(lat, lon)
+            nodes[i], km[i] = rows[0], dist[0]
+        return nodes, km
+
+
+def _csr(n, tail, head, time_s, length_m):
+    order = np.argsort(tail, kind="stable")
+    counts = np.bincount(np.asarray(tail, dtype=np.int64)[order], minlength=n)
+    return (np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            np.asarray(head, dtype=np.int32)[order],
+            np.asarray(time_s, dtype=np.float64)[order],
+            np.asarray(length_m, dtype=np.float64)[order])
+
+
+class ContractionHierarchy:
+    """Contraction hierarchy over a RoadGraph for fast travel-time queries
+
+    Nodes are contracted one by one in order of importance, adding
+    shortcut edges wherever a shortest path ran through the removed node.
+    Queries then only search upwards in that order from both ends, which
+    touches a few hundred nodes instead of the whole city. Each edge also
+    carries the length of the fastest path it stands for, so queries
+    return travel time and distance together.
+    """
+
+    def __init__(self, up_out, up_in):
+        # CSR (indptr, indices, time_s, length_m) of edges towards more
+        # important nodes: forward from each node, and reversed into it
+        self.up_out = tuple(a.tolist() for a in up_out)
+        self.up_in = tuple(a.tolist() for a in up_in)
+        self._arrays = (up_out, up_in)
+
+    @classmethod
+    def build(cls, graph, witness_settle=60):
+        n = graph.nodes
+        out_adj = [dict() for _ in range(n)]
+        in_adj = [dict() for _ in range(n)]
+        for u, v, length, seconds in zip(*(a.tolist() for a in graph.edge_list())):
+            if u != v and (v not in out_adj[u] or seconds < out_adj[u][v][0]):
+                out_adj[u][v] = in_adj[v][u] = (seconds, length)
+
+        def witness(source, skip, limit):
+            """Travel times from ``source`` avoiding ``skip``, bounded by ``limit``"""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < witness_settle:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                for y, (t, _) in out_adj[x].items():
+                    if y != skip and d + t < dist.get(y, math.inf):
+                        dist[y] = d + t
+                        heapq.heappush(heap, (d + t, y))
+            return dist
+
+        def shortcuts(v):
+            found = []
+            outs = out_adj[v]
+            if not outs or not in_adj[v]:
+                return found
+            max_out = max(t for t, _ in outs.values())
+            for u, (tu, lu) in in_adj[v].items():
+                dist = witness(u, v, tu + max_out)
+                for w, (tw, lw) in outs.items():
+                    if w != u and dist.get(w, math.inf) > tu + tw:
+                        found.append((u, w, tu + tw, lu + lw))
+            return found
+
+        removed_neighbours = [0] * n
+
+        def priority(v):
+            return (len(shortcuts(v)) - len(in_adj[v]) - len(out_adj[v])
+                    + removed_neighbours[v])
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        up_out = ([], [], [], [])
+        up_in = ([], [], [], [])
+        while heap:
+            _, v = heapq.heappop(heap)
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+            for u, w, seconds, length in shortcuts(v):
+                if seconds < out_adj[u].get(w, (math.inf,))[0]:
+                    out_adj[u][w] = in_adj[w][u] = (seconds, length)
+            # Every remaining neighbour is contracted later, i.e. ranks higher
+            for w, (seconds, length) in out_adj[v].items():
+                for column, value in zip(up_out, (v, w, seconds, length)):
+                    column.append(value)
+                del in_adj[w][v]
+                removed_neighbours[w] += 1
+            for u, (seconds, length) in in_adj[v].items():
+                for column, value in zip(up_in, (v, u, seconds, length)):
+                    column.append(value)
+                del out_adj[u][v]
+                removed_neighbours[u] += 1
+            out_adj[v], in_adj[v] = {}, {}
+        return cls(_csr(n, *up_out), _csr(n, *up_in))
+
+    def save(self, path):
+        (oi, on, ot, ol), (ii, inn, it, il) = self._arrays
+        np.savez(path, out_indptr=oi, out_indices=on, out_time=ot, out_length=ol,
+                 in_indptr=ii, in_indices=inn, in_time=it, in_length=il)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(tuple(data[f"out_{k}"] for k in ("indptr", "indices", "time", "length")),
+                   tuple(data[f"in_{k}"] for k in ("indptr", "indices", "time", "length")))
+
+    @staticmethod
+    def _upward(graph, source):
+        """Dijkstra restricted to upward edges; returns {node: (time, length)}"""
+        indptr, indices, times, lengths = graph
+        best = {source: (0.0, 0.0)}
+        heap = [(0.0, source)]
+        settled = {}
+        while heap:
+            d, x = heapq.heappop(heap)
+            if x in settled:
+                continue
+            settled[x] = best[x]
+            length = best[x][1]
+            for k in range(indptr[x], indptr[x + 1]):
+                y = indices[k]
+                t = d + times[k]
+                if t < best.get(y, (math.inf,))[0]:
+                    best[y] = (t, length + lengths[k])
+                    heapq.heappush(heap, (t, y))
+        return settled
+
+    def many_to_many(self, sources, targets):
+        """Travel time (s) and distance (m) matrices from sources to targets
+
+        Backward searches from the targets leave (target, time, length)
+        entries in per-node buckets; each forward search from a source is
+        then joined against the buckets of the nodes it reached, as one
+        vectorized minimum per source. Unreachable pairs are inf.
+        """
+        unique_targets = list(dict.fromkeys(targets))
+        columns = {target: j for j, target in enumerate(unique_targets)}
+        entries = []
+        for j, target in enumerate(unique_targets):
+            for node, (t, length) in self._upward(self.up_in, target).items():
+                entries.append((node, j, t, length))
+        bucket_node, bucket_target, bucket_time, bucket_length = (
+            np.array(column) for column in zip(*entries))
+        order = np.argsort(bucket_node, kind="stable")
+        bucket_node, bucket_target, bucket_time, bucket_length = (
+            bucket_node[order], bucket_target[order].astype(np.intp),
+            bucket_time[order], bucket_length[order])
+
+        time_s = np.full((len(sources), len(unique_targets)), np.inf)
+        length_m = np.full((len(sources), len(unique_targets)), np.inf)
+        searched = {}
+        for i, source in enumerate(sources):
+            if source in searched:
+                time_s[i], length_m[i] = time_s[searched[source]], length_m[searched[source]]
+                continue
+            searched[source] = i
+            space = self._upward(self.up_out, source)
+            nodes = np.fromiter(space, dtype=bucket_node.dtype, count=len(space))
+            forward = np.array(list(space.values()))
+            lo = np.searchsorted(bucket_node, nodes, side="left")
+            counts = np.searchsorted(bucket_node, nodes, side="right") - lo
+            if not counts.sum():
+                continue
+            # Bucket entry indices of every reached node, with the forward part repeated
+            which = np.repeat(np.arange(len(nodes)), counts)
+            entry = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) \
+                + np.repeat(lo, counts)
+            target = bucket_target[entry]
+            total_time = forward[which, 0] + bucket_time[entry]
+            np.minimum.at(time_s[i], target, total_time)
+            # Length of the fastest meeting point (any one, on ties)
+            best = total_time == time_s[i, target]
+            length_m[i, target[best]] = forward[which[best], 1] + bucket_length[entry[best]]
+
+        expand = np.array([columns[target] for target in targets], dtype=np.intp)
+        return time_s[:, expand], length_m[:, expand]
+
+
+class RoadNetwork:
+    """Road graph plus contraction hierarchy, answering routing matrices for coordinates
+
+    ``open()`` builds the hierarchy on first use and stores it next to the
+    road file, so later starts only load arrays; ``cached()`` loads those
+    arrays without ever building.
+    """
+
+    def __init__(self, graph, hierarchy):
+        self.graph = graph
+        self.hierarchy = hierarchy
+        self._last = (None, None)
+
+    @classmethod
+    def cached(cls, path):
+        """The network saved next to ``path`` by ``open()``, or None if missing or stale"""
+        graph_cache = path + ".graph.npz"
+        hierarchy_cache = path + ".ch.npz"
+        fresh = os.path.exists(hierarchy_cache) and os.path.exists(graph_cache) \
+            and os.path.getmtime(hierarchy_cache) >= os.path.getmtime(path)
+        if not fresh:
+            return None
+        return cls(RoadGraph.load(graph_cache), ContractionHierarchy.load(hierarchy_cache))
+
+    @classmethod
+    def open(cls, path):
+        network = cls.cached(path)
+        if network is not None:
+            return network
+        graph = RoadGraph.load(path)
+        hierarchy = ContractionHierarchy.build(graph)
+        graph.save(path + ".graph.npz")
+        hierarchy.save(path + ".ch.npz")
+        return cls(graph, hierarchy)
+
+    def matrices(self, latitude, longitude):
+        """(km, minutes) matrices between points, by road
+
+        Points are snapped to their nearest road node, with the gap covered
+        at ``ACCESS_SPEED_KMH``. Pairs the network cannot connect fall back
+        to the straight-line distance times ``DETOUR_FACTOR``.
+        """
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        # Page reruns ask for the same points again; answer those from the last call
+        key = latitude.tobytes() + longitude.tobytes()
+        if self._last[0] == key:
+            return self._last[1]
+        nodes, access_km = self.graph.nearest_nodes(latitude, longitude)
+        time_s, length_m = self.hierarchy.many_to_many(nodes.tolist(), nodes.tolist())
+        km = length_m / 1000 + access_km[:, None] + access_km[None, :]
+        minutes = time_s / 60 + (access_km[:, None] + access_km[None, :]) / ACCESS_SPEED_KMH * 60
+
+        unreachable = ~np.isfinite(km)
+        if unreachable.any():
+            straight = haversine_km(latitude[:, None], longitude[:, None],
+                                    latitude[None, :], longitude[None, :]) * DETOUR_FACTOR
+            km[unreachable] = straight[unreachable]
+            minutes[unreachable] = straight[unreachable] / DEFAULT_SPEED_KMH * 60
+        np.fill_diagonal(km, 0)
+        np.fill_diagonal(minutes, 0)
+        self._last = (key, (km, minutes))
+        return km, minutes
@@ -0,0 +1,252 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# (name, bucket width in seconds, buckets retained)
+DEFAULT_RESOLUTIONS = (
+    ("5min", 300, 288),     # 24 hours
+    ("hourly", 3600, 168),  # 7 days
+    ("daily", 86400, 90),   # ~3 months
+)
+
+# Resolutions also kept per bin; finer per-bin history is read from the archive
+BIN_RESOLUTIONS = ("daily",)
+
+# Upper bound on the points handed to a chart
+CHART_POINTS = 150
+
+
+def lttb(x, y, threshold):
+    """Indices of ``threshold`` points that preserve the shape of (x, y)
+
+    Largest-Triangle-Three-Buckets downsampling: the first and last points
+    are kept and every bucket in between contributes the point forming the
+    largest triangle with the previously chosen point and the next bucket's
+    mean. Series already within the threshold are returned whole.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Buckets for the interior points; the last one holds the final point only
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    edges = np.append(edges, n)
+    chosen = np.empty(threshold, dtype=np.intp)
+    chosen[0] = 0
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], edges[i + 2]
+        mean_x = x[next_start:next_stop].mean()
+        mean_y = y[next_start:next_stop].mean()
+        area = np.abs((x[previous] - mean_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (mean_y - y[previous]))
+        previous = start + int(area.argmax())
+        chosen[i + 1] = previous
+    chosen[-1] = n - 1
+    return chosen
+
+
+class _Rollup:
+    """Ring of time buckets holding min/max/sum/count for a set of series
+
+    Arrays are laid out slots x series, so recycling a bucket resets one
+    contiguous row. Every cell is 16 bytes (float32 min/max/sum, int32
+    count); fill levels are 0-100, so a float32 sum stays exact to well
+    under 0.01% for any realistic number of readings per bucket.
+    """
+
+    def __init__(self, width, slots, series):
+        self.width = width
+        self.slots = slots
+        self.bucket = np.full(slots, -1, dtype=np.int64)
+        self.min = np.full((slots, series), np.inf, dtype=np.float32)
+        self.max = np.full((slots, series), -np.inf, dtype=np.float32)
+        self.sum = np.zeros((slots, series), dtype=np.float32)
+        self.count = np.zeros((slots, series), dtype=np.int32)
+
+    @property
+    def series_count(self):
+        return self.count.shape[1]
+
+    def grow(self, series):
+        extra = series - self.series_count
+        if extra > 0:
+            extra = max(extra, self.series_count)
+            for name, fill in (("min", np.inf), ("max", -np.inf), ("sum", 0), ("count", 0)):
+                old = getattr(self, name)
+                setattr(self, name, np.hstack([old, np.full((self.slots, extra), fill, old.dtype)]))
+
+    def add(self, series, bucket, values):
+        """Fold values into their buckets, recycling slots of expired buckets"""
+        newest = max(int(bucket.max()), int(self.bucket.max()))
+        keep = bucket > newest - self.slots
+        series, bucket, values = series[keep], bucket[keep], values[keep]
+        if not len(bucket):
+            return
+        slot = bucket % self.slots
+        new_buckets, first = np.unique(bucket, return_index=True)
+        new_slots = slot[first]
+        recycle = self.bucket[new_slots] < new_buckets
+        if recycle.any():
+            reset = new_slots[recycle]
+            self.bucket[reset] = new_buckets[recycle]
+            self.min[reset] = np.inf
+            self.max[reset] = -np.inf
+            self.sum[reset] = 0
+            self.count[reset] = 0
+        # Readings older than what a slot now holds belong to an expired bucket
+        live = self.bucket[slot] == bucket
+        key = slot[live] * self.series_count + series[live]
+        values = values[live]
+
+        # Reduce the batch per cell first, then merge each cell once
+        order = np.argsort(key, kind="stable")
+        key, values = key[order], values[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        cells = key[starts]
+        minimum, maximum = self.min.reshape(-1), self.max.reshape(-1)
+        minimum[cells] = np.minimum(minimum[cells], np.minimum.reduceat(values, starts))
+        maximum[cells] = np.maximum(maximum[cells], np.maximum.reduceat(values, starts))
+        self.sum.reshape(-1)[cells] += np.add.reduceat(values, starts)
+        self.count.reshape(-1)[cells] += np.diff(np.r_[starts, len(key)]).astype(np.int32)
+
+    def frame(self, series, start=None, end=None):
+        """Non-empty buckets of one series in time order, as a DataFrame"""
+        order = np.argsort(self.bucket, kind="stable")
+        seconds = self.bucket[order] * self.width
+        keep = (self.bucket[order] >= 0) & (self.count[order, series] > 0)
+        if start is not None:
+            keep &= seconds >= start
+        if end is not None:
+            keep &= seconds < end
+        order, seconds = order[keep], seconds[keep]
+        count = self.count[order, series]
+        return pd.DataFrame({
+            "time": pd.to_datetime(seconds, unit="s"),
+            "min": self.min[order, series],
+            "max": self.max[order, series],
+            "mean": self.sum[order, series] / count,
+            "count": count,
+        })
+
+
+class RollupEngine:
+    """Pre-aggregated fill level time series per bin, per location and city-wide
+
+    Every reading is folded into min/max/mean/count buckets at each
+    resolution (5 minutes, hourly and daily by default) for the city and
+    each location, and at ``bin_resolutions`` for each bin, kept in fixed
+    rings so memory stays at series x buckets no matter how long the feed
+    runs. A bucket costs 16 bytes per series, so with the defaults a bin
+    takes 90 x 16 B = 1.4 KB (144 MB for 100,000 bins), where keeping every
+    resolution per bin would take 546 x 16 B = 8.7 KB. Charts read a
+    bounded series instead of raw samples; pair with ``lttb()`` to cap the
+    number of points drawn. ``add_batch`` matches the ingestion pipeline's
+    listener signature.
+
+    History from before the engine was created is loaded lazily: the first
+    query of a resolution for a window it has not seen calls
+    ``backfill(start, end)``, which yields ``(rows, ts, values)`` chunks,
+    and folds them into that resolution only. A 24-hour 5-minute chart thus
+    replays a day of readings, not the full daily ring.
+    """
+
+    def __init__(self, store, resolutions=DEFAULT_RESOLUTIONS, backfill=None,
+                 bin_resolutions=BIN_RESOLUTIONS):
+        self.store = store
+        self._lock = threading.Lock()
+        self._backfill = backfill
+        self._backfill_lock = threading.Lock()
+        # Readings before this come from backfill, later ones through add()
+        self._backfill_end = time.time()
+        self._filled_from = {}
+        self._bins = {}
+        self._locations = {}
+        self._city = {}
+        for name, width, slots in resolutions:
+            if name in bin_resolutions:
+                self._bins[name] = _Rollup(width, slots, max(len(store), 1))
+            self._locations[name] = _Rollup(width, slots, max(len(store.location_labels), 1))
+            self._city[name] = _Rollup(width, slots, 1)
+            self._filled_from[name] = self._backfill_end
+
+    @property
+    def resolutions(self):
+        return list(self._city)
+
+    def add(self, rows, ts, values, resolutions=None):
+        """Fold readings (row numbers, epoch seconds, fill %) into every rollup
+
+        ``resolutions`` limits the update to the named resolutions.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        ts = np.asarray(ts, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        rows, ts, values = rows[valid], ts[valid], values[valid]
+        if not len(rows):
+            return
+        location = self.store.location[rows]
+        city = np.zeros(len(rows), dtype=np.intp)
+        with self._lock:
+            for name in resolutions or self._city:
+                bucket = (ts // self._city[name].width).astype(np.int64)
+                if name in self._bins:
+                    self._bins[name].grow(len(self.store))
+                    self._bins[name].add(rows, bucket, values)
+                self._locations[name].grow(len(self.store.location_labels))
+                self._locations[name].add(location, bucket, values)
+                self._city[name].add(city, bucket, values)
+
+    def add_batch(self, rows, batch):
+        """Ingestion listener: fold the fill readings of an applied batch"""
+        self.add(batch["fill_rows"], batch["fill_ts"], batch["fill_level"])
+
+    def _ensure_backfilled(self, resolution, start):
+        """Replay history for ``resolution`` from ``start`` if it has not been yet"""
+        if self._backfill is None:
+            return
+        rollup = self._city[resolution]
+        first_bucket = int(self._backfill_end // rollup.width) - rollup.slots + 1
+        if start is not None:
+            first_bucket = max(first_bucket, int(start // rollup.width))
+        start = first_bucket * rollup.width
+        with self._backfill_lock:
+            end = self._filled_from[resolution]
+            if start >= end:
+                return
+            for rows, ts, values in self._backfill(start, end):
+                self.add(rows, ts, values, resolutions=(resolution,))
+            self._filled_from[resolution] = start
+
+    def series(self, resolution, row=None, location=None, start=None, end=None):
+        """Rolled-up series for a bin row, a location code, or the whole city
+
+        ``start`` and ``end`` are epoch seconds. Returns a DataFrame of
+        time, min, max, mean and count, one row per non-empty bucket.
+        """
+        if row is not None and resolution not in self._bins:
+            raise ValueError(f"{resolution!r} rollups are not kept per bin")
+        self._ensure_backfilled(resolution, start)
+        if row is not None:
+            rollup, key = self._bins[resolution], row
+        elif location is not None:
+            rollup, key = self._locations[resolution], location
+        else:
+            rollup, key = self._city[resolution], 0
+        with self._lock:
+            if key >= rollup.series_count:
+                return rollup.frame(0, start, end).iloc[:0]
+            return rollup.frame(key, start, end)
+
+    def chart_series(self, resolution, row=None, location=None, start=None, end=None,
+                     points=CHART_POINTS):
+        """Like ``series()``, downsampled on the mean to at most ``points`` rows"""
+        frame = self.series(resolution, row, location, start, end)
+        keep = lttb(frame["time"].to_numpy().astype(np.int64), frame["mean"].to_numpy(), points)
+        return frame.iloc[keep].reset_index(drop=True)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from routing import improve_tour, nearest_neighbour_tour, repair_tour, tour_length
+
+OBJECTIVES = ("Shortest Time", "Minimum Fuel", "Priority Bins First")
+
+# Fuel model: litres per km driven, plus litres per minute on the road for
+# stop-and-go and idling, so slow streets cost fuel as well as time
+FUEL_L_PER_KM = 0.2
+FUEL_L_PER_MINUTE = 0.05
+
+# Penalty (minutes) per step of priority between consecutive stops; large
+# enough that a tour only crosses between priority classes where it must
+PRIORITY_MINUTES = 1000.0
+
+# Bounds on a bin's time to full (hours) and fill rate (%/day)
+MIN_HOURS_TO_FULL = 0.25
+MIN_DAILY_RATE = 1.0
+
+
+class RouteCosts:
+    """Cost matrices shared by every objective, for a depot (node 0) and its stops
+
+    ``km`` and ``minutes`` may be asymmetric (one-way streets); tours are
+    searched on symmetrized costs and scored on the directed ones. Each
+    stop's hours to full come from its fill level and daily fill rate;
+    ``priority`` (e.g. bin status) ranks stops for "Priority Bins First",
+    which visits each class in turn, highest first.
+    """
+
+    def __init__(self, km, minutes, fill_level, daily_rate, priority):
+        self.km = km
+        self.minutes = minutes
+        self.fuel = FUEL_L_PER_KM * km + FUEL_L_PER_MINUTE * minutes
+        rate = np.maximum(np.asarray(daily_rate, dtype=np.float64), MIN_DAILY_RATE) / 24
+        headroom = 100 - np.asarray(fill_level, dtype=np.float64)
+        self.hours_to_full = np.maximum(headroom / rate, MIN_HOURS_TO_FULL)
+
+        # Legs between priority classes are penalized, so each class is one run;
+        # depot legs are free and orient() puts the highest class first
+        priority = np.asarray(priority, dtype=np.float64)
+        self.priority = priority
+        penalty = np.zeros_like(km)
+        penalty[1:, 1:] = PRIORITY_MINUTES * np.abs(priority[:, None] - priority[None, :])
+        self._search = {
+            "Shortest Time": (minutes + minutes.T) / 2,
+            "Minimum Fuel": (self.fuel + self.fuel.T) / 2,
+            "Priority Bins First": (minutes + minutes.T) / 2 + penalty,
+        }
+
+    def matrix(self, objective):
+        """Symmetric matrix the objective's tour is searched on"""
+        return self._search[objective]
+
+    def evaluate(self, tour):
+        """Travel minutes, km, fuel (L) and overflow risk of a closed tour
+
+        Overflow risk sums, over the stops, the share of each bin's time to
+        full that passes before the truck arrives.
+        """
+        tour = np.asarray(tour)
+        legs = (tour, np.roll(tour, -1))
+        arrival_hours = np.cumsum(self.minutes[legs])[:-1] / 60
+        return {
+            "minutes": float(self.minutes[legs].sum()),
+            "km": float(self.km[legs].sum()),
+            "fuel_l": float(self.fuel[legs].sum()),
+            "overflow_risk": float((arrival_hours / self.hours_to_full[tour[1:] - 1]).sum()),
+        }
+
+    def score(self, objective, tour):
+        metric = {"Shortest Time": "minutes", "Minimum Fuel": "fuel_l",
+                  "Priority Bins First": "overflow_risk"}[objective]
+        return self.evaluate(tour)[metric]
+
+    def orient(self, objective, tour):
+        """The tour or its reverse, whichever scores better for the objective
+
+        For "Priority Bins First" the direction starting with the higher class wins.
+        """
+        reverse = np.concatenate([tour[:1], tour[1:][::-1]])
+        if objective == "Priority Bins First" and len(tour) > 1:
+            return min((tour, reverse), key=lambda t: (-self.priority[t[1] - 1], self.score(objective, t)))
+        return min((tour, reverse), key=lambda t: self.score(objective, t))
+
+    def summary(self, tours):
+        """One row per objective's tour, flagging the Pareto-optimal ones"""
+        frame = pd.DataFrame([self.evaluate(tour) for tour in tours.values()],
+                             index=pd.Index(list(tours), name="objective"))
+        values = frame[["minutes", "fuel_l", "overflow_risk"]].to_numpy()
+        # A plan is dominated if another is no worse on every metric and better on one
+        no_worse = (values[None, :, :] <= values[:, None, :] + 1e-9).all(axis=2)
+        better = (values[None, :, :] < values[:, None, :] - 1e-9).any(axis=2)
+        frame["pareto"] = ~(no_worse & better).any(axis=1)
+        return frame
+
+
+def plan_objectives(costs, time_budget=1.0, previous=None, inserted=(), full=False):
+    """Best closed tour under every objective, from one set of shared matrices
+
+    Without ``previous`` tours a single nearest-neighbour seed is built and
+    each objective is improved from the best tour found so far under its
+    own cost, so objectives after the first start close to converged
+    instead of from scratch. ``previous`` ({objective: tour with -1 for
+    dropped stops}) warm-starts every objective with ``repair_tour``,
+    inserting the ``inserted`` nodes; ``full`` re-improves whole tours
+    rather than only around the changes. The time budget is shared.
+    Returns {objective: tour}.
+    """
+    share = time_budget / len(OBJECTIVES)
+    tours = {}
+    for objective in OBJECTIVES:
+        cost = costs.matrix(objective)
+        if previous and objective in previous:
+            focus = np.ones(len(cost), dtype=bool) if full else None
+            tour = repair_tour(previous[objective], cost, inserted, share, focus=focus)
+        else:
+            pool = list(tours.values()) or [nearest_neighbour_tour(cost)]
+            tour = min(pool, key=lambda t: tour_length(t, cost))
+            tour = improve_tour(tour, cost, share)
+        tours[objective] = costs.orient(objective, tour)
+    return tours
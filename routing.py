@@ -0,0 +1,233 @@
+import time
+
+import numpy as np
+
+from spatial import haversine_km
+
+# Improvements smaller than this (km) are treated as ties
+_EPS = 1e-9
+
+
+def distance_matrix(latitude, longitude):
+    """Symmetric (n x n) great-circle distance matrix in km"""
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    return haversine_km(latitude[:, None], longitude[:, None], latitude[None, :], longitude[None, :])
+
+
+def tour_length(tour, dist):
+    """Length of a closed tour (returning to its first node)"""
+    tour = np.asarray(tour)
+    return float(dist[tour, np.roll(tour, -1)].sum())
+
+
+def nearest_neighbour_tour(dist, start=0):
+    """Greedy seed tour: always drive to the closest unvisited node"""
+    n = len(dist)
+    tour = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    tour[0] = current = start
+    visited[start] = True
+    for i in range(1, n):
+        row = np.where(visited, np.inf, dist[current])
+        current = tour[i] = int(row.argmin())
+        visited[current] = True
+    return tour
+
+
+def two_opt(tour, dist, deadline=None, focus=None):
+    """Improve a closed tour with 2-opt moves; the first node stays in place
+
+    For each edge all candidate second edges are evaluated at once and the
+    best reversal is applied. With a boolean ``focus`` mask over nodes only
+    edges touching a focused node are tried as the first edge, and the
+    endpoints of every applied move join the focus. Returns (tour, improved).
+    """
+    tour = tour.copy()
+    m = len(tour)
+    improved = False
+    if m < 4:
+        return tour, improved
+    for i in range(m - 2):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        a, b = tour[i], tour[i + 1]
+        if focus is not None and not (focus[a] or focus[b]):
+            continue
+        j = np.arange(i + 2, m if i else m - 1)
+        c, d = tour[j], tour[(j + 1) % m]
+        delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+        best = int(delta.argmin())
+        if delta[best] < -_EPS:
+            k = j[best]
+            if focus is not None:
+                focus[[a, b, c[best], d[best]]] = True
+            tour[i + 1:k + 1] = tour[i + 1:k + 1][::-1]
+            improved = True
+    return tour, improved
+
+
+def or_opt(tour, dist, deadline=None, max_segment=3, focus=None):
+    """Improve a closed tour by moving runs of 1..``max_segment`` stops
+
+    Each run may be reinserted, in either direction, between any other
+    pair of consecutive nodes; the first node stays in place. ``focus``
+    works as in ``two_opt``: only runs next to a focused node are moved.
+    Returns (tour, improved).
+    """
+    tour = tour.copy()
+    m = len(tour)
+    improved = False
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length <= m and m - length >= 3:
+            if deadline is not None and time.perf_counter() > deadline:
+                return tour, improved
+            first, last = tour[i], tour[i + length - 1]
+            prev, nxt = tour[i - 1], tour[(i + length) % m]
+            if focus is not None and not focus[[prev, first, last, nxt]].any():
+                i += 1
+                continue
+            removal_gain = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+            rest = np.concatenate([tour[:i], tour[i + length:]])
+            p, q = rest, np.roll(rest, -1)
+            forward = dist[p, first] + dist[last, q] - dist[p, q]
+            backward = dist[p, last] + dist[first, q] - dist[p, q]
+            # Reinserting where the run came from is not a move
+            forward[i - 1] = backward[i - 1] = np.inf
+            j_f, j_b = int(forward.argmin()), int(backward.argmin())
+            if min(forward[j_f], backward[j_b]) < removal_gain - _EPS:
+                segment = tour[i:i + length]
+                if backward[j_b] < forward[j_f]:
+                    j, segment = j_b, segment[::-1]
+                else:
+                    j = j_f
+                if focus is not None:
+                    focus[[prev, nxt, first, last, p[j], q[j]]] = True
+                tour = np.concatenate([rest[:j + 1], segment, rest[j + 1:]])
+                improved = True
+            else:
+                i += 1
+    return tour, improved
+
+
+def solve_tsp(dist, time_budget=1.0, start=0, progress=None):
+    """Closed tour over every node of ``dist`` starting at ``start``
+
+    Builds a nearest-neighbour seed, then alternates 2-opt and Or-opt
+    passes until neither improves the tour or ``time_budget`` seconds
+    have passed.
+    """
+    return improve_tour(nearest_neighbour_tour(dist, start), dist, time_budget, progress)
+
+
+def improve_tour(tour, dist, time_budget=1.0, progress=None):
+    """Alternate 2-opt and Or-opt passes over a tour until neither helps
+
+    ``progress(iteration, length)`` is called after every pass.
+    """
+    deadline = time.perf_counter() + time_budget
+    iteration = 0
+    while time.perf_counter() < deadline:
+        tour, improved_2opt = two_opt(tour, dist, deadline)
+        tour, improved_or = or_opt(tour, dist, deadline)
+        iteration += 1
+        if progress is not None:
+            progress(iteration, tour_length(tour, dist))
+        if not (improved_2opt or improved_or):
+            break
+    return tour
+
+
+def cheapest_insertion(tour, dist, nodes):
+    """Insert ``nodes`` one by one where each adds the least to the closed tour
+
+    Returns (tour, positions) with the final position of every inserted node.
+    """
+    tour = np.asarray(tour, dtype=np.intp)
+    for node in nodes:
+        nxt = np.roll(tour, -1)
+        added = dist[tour, node] + dist[node, nxt] - dist[tour, nxt]
+        at = int(added.argmin()) + 1
+        tour = np.insert(tour, at, node)
+    return tour, np.flatnonzero(np.isin(tour, nodes))
+
+
+def repair_tour(tour, dist, inserted=(), time_budget=0.1, window=2, focus=None):
+    """Warm-start a closed tour after its set of stops changed
+
+    ``tour`` is the previous visiting order as indices into ``dist``, the
+    depot (0) first, with -1 for stops that no longer need a visit.
+    Dropped stops are cut out, ``inserted`` nodes go to their cheapest
+    insertion point, and 2-opt and Or-opt then only start from nodes within
+    ``window`` positions of a change, widening as moves are applied. A
+    handful of changes therefore costs milliseconds however long the
+    route is. Pass a ``focus`` mask to search around other nodes as well,
+    e.g. all of them after the cost matrix changed.
+    """
+    deadline = time.perf_counter() + time_budget
+    tour = np.asarray(tour, dtype=np.intp)
+    inserted = np.asarray(inserted, dtype=np.intp)
+    if focus is None:
+        focus = np.zeros(len(dist), dtype=bool)
+
+    def mark(tour, positions):
+        for position in positions:
+            near = np.arange(position - window, position + window + 1) % len(tour)
+            focus[tour[near]] = True
+
+    # Stops that get new neighbours: around each dropped run and each insertion
+    dropped = tour < 0
+    kept = np.cumsum(~dropped) - 1
+    tour = tour[~dropped]
+    mark(tour, np.unique(kept[dropped]))
+    tour, positions = cheapest_insertion(tour, dist, inserted)
+    mark(tour, positions)
+
+    while focus.any() and time.perf_counter() < deadline:
+        tour, improved_2opt = two_opt(tour, dist, deadline, focus)
+        tour, improved_or = or_opt(tour, dist, deadline, focus=focus)
+        if not (improved_2opt or improved_or):
+            break
+    return tour
+
+
+class Route:
+    """A planned collection route starting and ending at a depot
+
+    ``stops`` indexes the stop coordinates the route was planned for, in
+    visiting order; ``leg_km`` holds the distance of each leg, from the
+    depot to the first stop through the return to the depot.
+    """
+
+    def __init__(self, stops, leg_km):
+        self.stops = stops
+        self.leg_km = leg_km
+
+    @property
+    def total_km(self):
+        return float(self.leg_km.sum())
+
+
+def leg_distances(depot, latitude, longitude, order):
+    """Leg distances (km) of a round trip from ``depot`` visiting stops in ``order``"""
+    latitude = np.asarray(latitude, dtype=np.float64)[order]
+    longitude = np.asarray(longitude, dtype=np.float64)[order]
+    path_lat = np.concatenate([[depot[0]], latitude, [depot[0]]])
+    path_lon = np.concatenate([[depot[1]], longitude, [depot[1]]])
+    return haversine_km(path_lat[:-1], path_lon[:-1], path_lat[1:], path_lon[1:])
+
+
+def solve_route(dist, time_budget=1.0, progress=None):
+    """Round trip over a distance matrix whose first node is the depot"""
+    tour = solve_tsp(dist, time_budget, progress=progress)
+    leg_km = dist[tour, np.roll(tour, -1)]
+    return Route(tour[1:] - 1, leg_km)
+
+
+def plan_route(depot, latitude, longitude, time_budget=1.0):
+    """Plan the shortest round trip from ``depot`` (lat, lon) through every stop"""
+    latitude = np.concatenate([[depot[0]], np.asarray(latitude, dtype=np.float64)])
+    longitude = np.concatenate([[depot[1]], np.asarray(longitude, dtype=np.float64)])
+    return solve_route(distance_matrix(latitude, longitude), time_budget)
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+from fleet_routing import nearest_depot, sweep_clusters
+from route_objectives import FUEL_L_PER_KM
+from routing import plan_route
+from spatial import KM_PER_DEGREE, haversine_km
+
+# Route length of n stops spread over an area A is about BHH_CONSTANT·sqrt(n·A)
+# (Beardwood–Halton–Hammersley), plus the drive out to the area and back
+BHH_CONSTANT = 0.7124
+
+
+class FixedSchedule:
+    """Collect every bin every ``interval_days``, spread evenly over the days"""
+
+    def __init__(self, interval_days=3):
+        self.interval_days = interval_days
+        self.name = f"Fixed every {interval_days} days"
+
+    def select(self, day, fill, days_since, rate_estimate):
+        offset = np.arange(len(fill)) % self.interval_days
+        return (day + offset) % self.interval_days == 0
+
+
+class ThresholdPolicy:
+    """Collect bins at or above ``threshold`` % full (the red status by default)"""
+
+    def __init__(self, threshold=80.0):
+        self.threshold = threshold
+        self.name = f"Threshold {threshold:.0f}%"
+
+    def select(self, day, fill, days_since, rate_estimate):
+        return fill >= self.threshold
+
+
+class ForecastPolicy:
+    """Collect bins forecast to overflow before the next dispatch
+
+    A bin is collected when its fill plus ``horizon_days`` of its estimated
+    daily rate, inflated by ``safety``, would reach 100%.
+    """
+
+    def __init__(self, horizon_days=1.0, safety=1.25):
+        self.horizon_days = horizon_days
+        self.safety = safety
+        self.name = f"Forecast {horizon_days:g} day"
+
+    def select(self, day, fill, days_since, rate_estimate):
+        return fill + rate_estimate * self.horizon_days * self.safety >= 100
+
+
+class FleetSimulator:
+    """Simulate bin filling, daily collection and overflows for a whole city
+
+    Every bin is advanced a day at a time with array operations: it
+    fills at its daily rate (per weekday, if given) times gamma noise with
+    coefficient of variation ``rate_noise``, evenly over the day, so the
+    hour it reaches 100% and overflows is exact. At ``dispatch_hour`` the
+    policy picks bins to collect, within what ``trucks`` of ``payload_kg``
+    can carry in ``trips_per_truck`` trips; the fullest go first and the
+    rest wait for the next day. Picked bins are emptied.
+
+    Daily route distance comes from the planner (``plan_routes=True``:
+    payload-sized sweep trips, each solved as a round trip) or, by default,
+    from the BHH estimate per depot, so a year of a city's operation runs
+    in about a second. Noise is drawn from ``seed`` afresh on every run, so
+    policies are compared on identical fill patterns.
+    """
+
+    def __init__(self, latitude, longitude, capacity, fill_level, daily_rate, depots,
+                 trucks=3, payload_kg=500.0, trips_per_truck=3, weekday_effect=None,
+                 last_collected_days=None, dispatch_hour=6, rate_noise=0.3,
+                 plan_routes=False, seed=0):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.capacity = np.asarray(capacity, dtype=np.float64)
+        self.fill_level = np.asarray(fill_level, dtype=np.float64)
+        self.daily_rate = np.maximum(np.asarray(daily_rate, dtype=np.float64), 0)
+        self.weekday_effect = (np.zeros((len(self.daily_rate), 7)) if weekday_effect is None
+                               else np.asarray(weekday_effect, dtype=np.float64))
+        self.last_collected_days = (np.zeros(len(self.fill_level)) if last_collected_days is None
+                                    else np.asarray(last_collected_days, dtype=np.float64))
+        self.depots = [tuple(depot) for depot in depots]
+        self.depot_of_bin = nearest_depot(self.depots, self.latitude, self.longitude)
+        self.depot_km = haversine_km(self.latitude, self.longitude,
+                                     np.asarray(self.depots)[self.depot_of_bin, 0],
+                                     np.asarray(self.depots)[self.depot_of_bin, 1])
+        self.daily_capacity_kg = trucks * payload_kg * trips_per_truck
+        self.payload_kg = payload_kg
+        self.dispatch_hour = dispatch_hour
+        self.rate_noise = rate_noise
+        self.plan_routes = plan_routes
+        self.seed = seed
+
+    @classmethod
+    def from_store(cls, store, forecast, depots, **kwargs):
+        """Start from the store's current bins, with fill rates from a FillForecast"""
+        with store.lock:
+            last = store.column("last_collected")
+            now = np.datetime64("now", "s")
+            return cls(store.latitude.copy(), store.longitude.copy(), store.capacity.copy(),
+                       store.fill_level.copy(), forecast.daily_rate, depots,
+                       weekday_effect=forecast.weekday_effect,
+                       last_collected_days=(now - last) / np.timedelta64(1, "D"), **kwargs)
+
+    def route_km(self, rows, load_kg):
+        """Distance (km) to collect the given bins, from their depots"""
+        total = 0.0
+        for d, depot in enumerate(self.depots):
+            stops = rows[self.depot_of_bin[rows] == d]
+            if not len(stops):
+                continue
+            if self.plan_routes:
+                for trip in sweep_clusters(depot, self.latitude[stops], self.longitude[stops],
+                                           load_kg[stops], self.payload_kg):
+                    trip = stops[trip]
+                    total += plan_route(depot, self.latitude[trip], self.longitude[trip],
+                                        0.05).total_km
+                continue
+            trips = max(np.ceil(load_kg[stops].sum() / self.payload_kg), 1)
+            lat, lon = self.latitude[stops], self.longitude[stops]
+            height = np.ptp(lat) * KM_PER_DEGREE
+            width = np.ptp(lon) * KM_PER_DEGREE * np.cos(np.radians(lat.mean()))
+            total += 2 * trips * self.depot_km[stops].mean() \
+                + BHH_CONSTANT * np.sqrt(len(stops) * height * width)
+        return float(total)
+
+    def run(self, policy, days=365, start_weekday=0):
+        """Simulate ``days`` of operation under ``policy``; one row per day
+
+        Columns: collections, overflows (bins reaching 100%), overflow_hours
+        (bin-hours spent full), km and fuel_l.
+        """
+        rng = np.random.default_rng(self.seed)
+        n = len(self.fill_level)
+        shape = 1 / self.rate_noise ** 2 if self.rate_noise > 0 else None
+
+        fill = self.fill_level.copy()
+        days_since = self.last_collected_days.copy()
+        # The policy sees fill rates as measured, not the true ones
+        rate_estimate = self.daily_rate.copy()
+        fill_at_dispatch = fill.copy()
+        columns = {name: np.zeros(days) for name in
+                   ("collections", "overflows", "overflow_hours", "km", "fuel_l")}
+        hours = (self.dispatch_hour, 24 - self.dispatch_hour)
+
+        for day in range(days):
+            weekday = (start_weekday + day) % 7
+            rate = np.maximum(self.daily_rate + self.weekday_effect[:, weekday], 0)
+            if shape is not None:
+                rate = rate * rng.gamma(shape, 1 / shape, size=n)
+            per_hour = rate / 24
+
+            for part in range(2):
+                # Fill grows linearly over the part of the day; find when it hits 100%
+                level = fill + per_hour * hours[part]
+                full = level >= 100
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    to_full = np.where(fill >= 100, 0, (100 - fill) / per_hour)
+                columns["overflows"][day] += (full & (fill < 100)).sum()
+                columns["overflow_hours"][day] += (hours[part] - to_full[full]).sum()
+                fill = np.minimum(level, 100)
+                if part:
+                    continue
+                picked = self._dispatch(policy, day, fill, days_since, rate_estimate)
+                if len(picked):
+                    km = self.route_km(picked, self.capacity * fill / 100)
+                    columns["collections"][day] = len(picked)
+                    columns["km"][day] = km
+                    columns["fuel_l"][day] = km * FUEL_L_PER_KM
+                # Measured fill over the day since the last dispatch, smoothed per bin
+                if day > 0:
+                    rate_estimate = 0.8 * rate_estimate + 0.2 * (fill - fill_at_dispatch)
+                fill[picked] = 0
+                days_since[picked] = 0
+                fill_at_dispatch = fill.copy()
+            days_since += 1
+
+        frame = pd.DataFrame(columns)
+        frame.insert(0, "day", np.arange(days))
+        return frame
+
+    def _dispatch(self, policy, day, fill, days_since, rate_estimate):
+        """Bins the policy picks today, fullest first, within the fleet's capacity"""
+        picked = np.flatnonzero(policy.select(day, fill, days_since, rate_estimate))
+        picked = picked[np.argsort(-fill[picked], kind="stable")]
+        load_kg = np.cumsum(self.capacity[picked] * fill[picked] / 100)
+        return picked[load_kg <= self.daily_capacity_kg]
+
+    def compare(self, policies, days=365):
+        """Totals per policy over ``days``: one row per policy"""
+        rows = []
+        for policy in policies:
+            totals = self.run(policy, days).drop(columns="day").sum()
+            rows.append({"policy": policy.name, **totals.to_dict()})
+        return pd.DataFrame(rows)
@@ -0,0 +1,197 @@
+import math
+import threading
+from itertools import chain
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments broadcast like NumPy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64))
+                              for a in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Uniform latitude/longitude grid over points identified by row number
+
+    Points live in square cells of ``cell_size`` degrees. Queries gather the
+    candidate rows of the overlapping cells and finish with a vectorized
+    haversine filter, so their cost depends on the local density rather than
+    the total number of points. Inserting an existing row moves it.
+    """
+
+    def __init__(self, cell_size=0.002):
+        self.cell_size = cell_size
+        self.lock = threading.RLock()
+        self._cells = {}
+        self._lat = np.full(0, np.nan)
+        self._lon = np.full(0, np.nan)
+        self._cell_of = {}
+        # (cells x 2) array of occupied cell keys, rebuilt when cells change
+        self._keys = None
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size)))
+
+    def _ensure_capacity(self, n):
+        if len(self._lat) < n:
+            size = max(n, 2 * len(self._lat))
+            for attr in ("_lat", "_lon"):
+                grown = np.full(size, np.nan)
+                old = getattr(self, attr)
+                grown[:len(old)] = old
+                setattr(self, attr, grown)
+
+    def insert(self, rows, latitude, longitude):
+        """Add points, or move them if the rows are already indexed"""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.intp))
+        latitude = np.broadcast_to(np.asarray(latitude, dtype=np.float64), rows.shape)
+        longitude = np.broadcast_to(np.asarray(longitude, dtype=np.float64), rows.shape)
+        if not len(rows):
+            return
+        cell_lat = np.floor(latitude / self.cell_size).astype(np.int64)
+        cell_lon = np.floor(longitude / self.cell_size).astype(np.int64)
+        with self.lock:
+            self._ensure_capacity(int(rows.max()) + 1)
+            self._lat[rows] = latitude
+            self._lon[rows] = longitude
+            for row, key in zip(rows.tolist(), zip(cell_lat.tolist(), cell_lon.tolist())):
+                old = self._cell_of.get(row)
+                if old == key:
+                    continue
+                if old is not None:
+                    self._discard(row, old)
+                cell = self._cells.get(key)
+                if cell is None:
+                    cell = self._cells[key] = set()
+                    self._keys = None
+                cell.add(row)
+                self._cell_of[row] = key
+
+    def _discard(self, row, key):
+        cell = self._cells[key]
+        cell.discard(row)
+        if not cell:
+            del self._cells[key]
+            self._keys = None
+
+    def remove(self, rows):
+        with self.lock:
+            for row in np.atleast_1d(rows).tolist():
+                key = self._cell_of.pop(row, None)
+                if key is not None:
+                    self._discard(row, key)
+                    self._lat[row] = np.nan
+                    self._lon[row] = np.nan
+
+    def sync(self, store):
+        """Index new bins and re-index moved bins of a BinStore"""
+        n = len(store)
+        latitude, longitude = store.latitude, store.longitude
+        with self.lock:
+            self._ensure_capacity(n)
+            changed = ((self._lat[:n] != latitude) | (self._lon[:n] != longitude))
+            rows = np.flatnonzero(changed)
+            if len(rows):
+                self.insert(rows, latitude[rows], longitude[rows])
+
+    @classmethod
+    def from_store(cls, store, cell_size=0.002):
+        index = cls(cell_size)
+        index.sync(store)
+        return index
+
+    def _gather(self, keys):
+        cells = self._cells
+        found = [cells[key] for key in keys if key in cells]
+        return np.fromiter(chain.from_iterable(found), dtype=np.intp,
+                           count=sum(len(c) for c in found))
+
+    def _cell_range(self, south, west, north, east):
+        s, w = self._cell(south, west)
+        n, e = self._cell(north, east)
+        if (n - s + 1) * (e - w + 1) > len(self._cells):
+            # Box covers more cells than are occupied; scan occupied cells instead
+            return [k for k in self._cells if s <= k[0] <= n and w <= k[1] <= e]
+        return [(i, j) for i in range(s, n + 1) for j in range(w, e + 1)]
+
+    def bbox(self, south, west, north, east):
+        """Rows inside a latitude/longitude bounding box (e.g. the map viewport)"""
+        with self.lock:
+            rows = self._gather(self._cell_range(south, west, north, east))
+            lat, lon = self._lat[rows], self._lon[rows]
+        inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(rows[inside])
+
+    def radius(self, latitude, longitude, radius_km):
+        """Rows within ``radius_km`` of a point, nearest first, with distances"""
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(latitude)), 1e-6)
+        with self.lock:
+            rows = self._gather(self._cell_range(latitude - dlat, longitude - dlon,
+                                                 latitude + dlat, longitude + dlon))
+            dist = haversine_km(latitude, longitude, self._lat[rows], self._lon[rows])
+        inside = dist <= radius_km
+        rows, dist = rows[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")
+        return rows[order], dist[order]
+
+    def _rings(self, ci, cj):
+        """Yield (ring, cell keys) around a cell by increasing Chebyshev distance
+
+        Small rings are enumerated cell by cell; once a ring would have more
+        cells than are occupied, the remaining rings are built from the
+        occupied cells so that empty space is never walked.
+        """
+        ring = 0
+        while (2 * ring + 1) ** 2 <= len(self._cells):
+            if ring == 0:
+                yield 0, [(ci, cj)]
+            else:
+                yield ring, [(ci + di, cj + dj)
+                             for di in range(-ring, ring + 1)
+                             for dj in (range(-ring, ring + 1) if abs(di) == ring else (-ring, ring))]
+            ring += 1
+        if self._keys is None:
+            self._keys = np.array(list(self._cells), dtype=np.int64).reshape(-1, 2)
+        keys = self._keys
+        distance = np.maximum(np.abs(keys[:, 0] - ci), np.abs(keys[:, 1] - cj))
+        remaining = np.flatnonzero(distance >= ring)
+        remaining = remaining[np.argsort(distance[remaining], kind="stable")]
+        bounds = np.flatnonzero(np.diff(distance[remaining])) + 1
+        for group in np.split(remaining, bounds):
+            if len(group):
+                yield int(distance[group[0]]), list(map(tuple, keys[group].tolist()))
+
+    def nearest(self, latitude, longitude, k=1, exclude=None):
+        """The ``k`` nearest rows to a point, nearest first, with distances"""
+        with self.lock:
+            ci, cj = self._cell(latitude, longitude)
+            rows = np.zeros(0, dtype=np.intp)
+            dist = np.zeros(0)
+            for ring, ring_keys in self._rings(ci, cj):
+                found = self._gather(ring_keys)
+                if exclude is not None:
+                    found = found[~np.isin(found, exclude)]
+                if len(found):
+                    rows = np.concatenate([rows, found])
+                    dist = np.concatenate([dist, haversine_km(latitude, longitude,
+                                                              self._lat[found], self._lon[found])])
+                # Anything in an unvisited ring is more than `ring` cells away;
+                # use the narrowest (poleward) longitude span those cells can have
+                cell_km = self.cell_size * KM_PER_DEGREE * max(
+                    math.cos(math.radians(min(abs(latitude) + (ring + 1) * self.cell_size, 90))), 1e-6)
+                if len(rows) >= k and np.partition(dist, k - 1)[k - 1] <= ring * cell_km:
+                    break
+
+        order = np.argsort(dist, kind="stable")[:k]
+        return rows[order], dist[order]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+
+def _close(value):
+    """Release a dropped item's resources (e.g. worker threads) if it has a close()"""
+    close = getattr(value, "close", None)
+    if callable(close):
+        close()
+
+
+class _Entry:
+    """A single cached item with its loader and time-to-live"""
+
+    def __init__(self, loader, ttl, depends_on=()):
+        self.loader = loader
+        self.ttl = ttl
+        self.depends_on = tuple(depends_on)
+        self.value = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        if self.loaded_at is None:
+            return True
+        if self.ttl is None:
+            return False
+        return time.monotonic() - self.loaded_at >= self.ttl
+
+
+class SharedState:
+    """Thread-safe store for data shared by every session of the app
+
+    Each item is produced by a registered loader and kept until its TTL
+    expires or it is explicitly invalidated. Loads are single-flight: when
+    several sessions ask for a stale item at once, only one of them runs
+    the loader and the rest wait for its result. Items built from other
+    items declare them with ``depends_on`` and are invalidated with them.
+    Values with a ``close()`` method are closed when they are dropped or
+    replaced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def register(self, key, loader, ttl=None, depends_on=()):
+        """Register (or replace) the loader for an item, keeping any cached value"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(loader, ttl, depends_on)
+            else:
+                entry.loader = loader
+                entry.ttl = ttl
+                entry.depends_on = tuple(depends_on)
+
+    def _entry(self, key):
+        with self._lock:
+            try:
+                return self._entries[key]
+            except KeyError:
+                raise KeyError(f"No loader registered for '{key}'") from None
+
+    def get(self, key):
+        """Return the cached item, loading it first if missing or expired"""
+        entry = self._entry(key)
+        with entry.lock:
+            if entry.is_stale():
+                old, entry.value = entry.value, entry.loader()
+                entry.loaded_at = time.monotonic()
+                if old is not entry.value:
+                    _close(old)
+            return entry.value
+
+    def set(self, key, value):
+        """Replace the cached value of a registered item"""
+        entry = self._entry(key)
+        with entry.lock:
+            old, entry.value = entry.value, value
+            entry.loaded_at = time.monotonic()
+        if old is not value:
+            _close(old)
+
+    def _dependents(self, keys):
+        """The given keys plus every item that depends on them, transitively"""
+        found = set(keys)
+        pending = list(keys)
+        while pending:
+            key = pending.pop()
+            for other, entry in self._entries.items():
+                if key in entry.depends_on and other not in found:
+                    found.add(other)
+                    pending.append(other)
+        return found
+
+    def invalidate(self, *keys):
+        """Drop cached values so the next get() reloads them; no keys drops all
+
+        Items registered with ``depends_on`` one of the keys are dropped too.
+        """
+        with self._lock:
+            entries = [self._entries[k] for k in self._dependents(keys) if k in self._entries] \
+                if keys else list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                old, entry.value = entry.value, None
+                entry.loaded_at = None
+            _close(old)
+
+    def age(self, key):
+        """Seconds since the item was loaded, or None if it is not cached"""
+        entry = self._entry(key)
+        with entry.lock:
+            if entry.loaded_at is None:
+                return None
+            return time.monotonic() - entry.loaded_at
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bin_store import BinStore  # noqa: E402
+
+
+@pytest.fixture
+def make_store():
+    """Factory for a BinStore of ``n`` bins "BIN_0000"...; keyword arguments override columns"""
+    def make(n=3, **columns):
+        bins = {
+            "ids": [f"BIN_{i:04d}" for i in range(n)],
+            "latitude": np.zeros(n),
+            "longitude": np.zeros(n),
+            "location_name": ["A"] * n,
+            "fill_level": np.full(n, 10.0),
+            "capacity": np.full(n, 100),
+            "last_collected": np.zeros(n, dtype="datetime64[s]"),
+        }
+        bins.update(columns)
+        store = BinStore()
+        store.add_bins(**bins)
+        return store
+    return make
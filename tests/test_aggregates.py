@@ -0,0 +1,47 @@
+import numpy as np
+
+from aggregates import BinAggregates
+
+
+def assert_matches_a_rescan(kpis, store):
+    fresh = BinAggregates(store)
+    assert kpis.count == fresh.count == len(store)
+    np.testing.assert_array_equal(kpis.status_counts, store.status_counts())
+    np.testing.assert_allclose(kpis.fill_mean, store.fill_level.mean(), rtol=1e-6)
+    np.testing.assert_allclose(kpis.fill_variance, store.fill_level.astype(np.float64).var(),
+                               rtol=1e-6)
+    assert kpis.total_capacity == store.capacity.sum()
+    np.testing.assert_allclose(kpis.location_summary().to_numpy(dtype=object)[:, 1:].astype(float),
+                               fresh.location_summary().to_numpy(dtype=object)[:, 1:].astype(float))
+
+
+def test_writes_are_applied_as_deltas(make_store):
+    rng = np.random.default_rng(0)
+    store = make_store(n=50, fill_level=rng.uniform(0, 100, 50),
+                       location_name=rng.choice(["A", "B"], 50))
+    kpis = BinAggregates(store)
+    for _ in range(20):
+        rows = rng.choice(len(store), 10, replace=False)
+        store.update_fill(rows, rng.uniform(0, 100, 10))
+    store.update_column("capacity", np.array([0, 1]), [240, 660])
+    store.add_bins(["NEW_0", "NEW_1"], [0.0, 0.0], [0.0, 0.0], ["C", "A"], [95.0, 5.0], [120, 120],
+                   np.zeros(2, dtype="datetime64[s]"))
+    assert_matches_a_rescan(kpis, store)
+    assert list(kpis.location_summary()["location_name"]) == ["A", "B", "C"]
+
+
+def test_store_observers_see_old_and_new_values(make_store):
+    store = make_store(n=2)
+    seen = []
+
+    class Observer:
+        def bins_added(self, rows):
+            seen.append(("added", list(rows)))
+
+        def values_changed(self, name, rows, old, new):
+            seen.append((name, list(old), list(new)))
+
+    store.subscribe(Observer())
+    store.update_fill(np.array([1]), [40.0])
+    store.add_bins(["X"], [0.0], [0.0], ["A"], [1.0], [100], np.zeros(1, dtype="datetime64[s]"))
+    assert seen == [("fill_level", [10.0], [40.0]), ("added", [2])]
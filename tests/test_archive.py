@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+from archive import ReadingArchive
+
+
+def fill_active(path):
+    archive = ReadingArchive(path)
+    archive.append(["BIN_0001", "BIN_0002"], np.array([100.0, 200.0]), np.array([10.0, 20.0]))
+    return archive
+
+
+def test_seal_interrupted_after_rename_does_not_duplicate_rows(tmp_path, monkeypatch):
+    archive = fill_active(str(tmp_path))
+    replace = os.replace
+
+    def replace_then_stop(*args):
+        # Stop right after the segment is moved into place
+        replace(*args)
+        raise SystemExit
+
+    monkeypatch.setattr("os.replace", replace_then_stop)
+    try:
+        archive.seal()
+    except SystemExit:
+        pass
+    monkeypatch.undo()
+    assert os.path.exists(tmp_path / "active" / "fill_level.bin")
+
+    reopened = ReadingArchive(str(tmp_path))
+    assert len(reopened) == 2
+    assert len(reopened.read_bin("BIN_0001")) == 1
+
+
+def test_seal_interrupted_before_rename_keeps_active_rows(tmp_path, monkeypatch):
+    archive = fill_active(str(tmp_path))
+    monkeypatch.setattr("os.replace", lambda *a: (_ for _ in ()).throw(SystemExit))
+    try:
+        archive.seal()
+    except SystemExit:
+        pass
+    monkeypatch.undo()
+
+    reopened = ReadingArchive(str(tmp_path))
+    assert len(reopened) == 2
+    assert not os.path.exists(tmp_path / "active" / "sealed_as")
+    reopened.seal()
+    assert len(ReadingArchive(str(tmp_path))) == 2
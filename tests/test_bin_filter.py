@@ -0,0 +1,36 @@
+import itertools
+
+import numpy as np
+
+from bin_filter import BinFilterIndex
+from bin_store import GREEN, RED, YELLOW
+
+
+def test_select_matches_a_boolean_mask(make_store):
+    rng = np.random.default_rng(0)
+    n = 203  # not a multiple of 8, so the packed bitmaps have padding bits
+    store = make_store(n=n, fill_level=rng.uniform(0, 100, n).round(),
+                       location_name=rng.choice(["A", "B", "C"], n))
+    index = BinFilterIndex(store)
+    status, location, fill = store.status, store.location, store.fill_level
+    for statuses, code, min_fill in itertools.product(
+            [None, [RED], [GREEN, YELLOW]], [None, store.location_code("B")], [None, 0, 50.0]):
+        mask = np.ones(n, dtype=bool)
+        if statuses is not None:
+            mask &= np.isin(status, statuses)
+        if code is not None:
+            mask &= location == code
+        if min_fill is not None:
+            mask &= fill >= min_fill
+        np.testing.assert_array_equal(index.select(statuses, code, min_fill), np.flatnonzero(mask))
+
+
+def test_selections_are_memoized_until_the_store_changes(make_store):
+    store = make_store(n=4, fill_level=np.array([10.0, 50.0, 90.0, 95.0]))
+    index = BinFilterIndex(store)
+    rows = index.select(statuses=[RED])
+    assert index.select(statuses=[RED]) is rows and not rows.flags.writeable
+    np.testing.assert_array_equal(rows, [2, 3])
+
+    store.update_fill(np.array([0]), [99.0])
+    np.testing.assert_array_equal(index.select(statuses=[RED]), [0, 2, 3])
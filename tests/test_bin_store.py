@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from bin_store import GREEN, RED, YELLOW
+
+
+def test_add_bins_grows_and_keeps_rows(make_store):
+    store = make_store(n=3)
+    capacity = store._capacity
+    rows = store.add_bins([f"NEW_{i}" for i in range(capacity)], np.ones(capacity), np.ones(capacity),
+                          ["B"] * capacity, np.full(capacity, 90.0), np.full(capacity, 50),
+                          np.zeros(capacity, dtype="datetime64[s]"))
+    assert len(store) == capacity + 3 and rows[0] == 3
+    assert list(store.ids[:3]) == ["BIN_0000", "BIN_0001", "BIN_0002"]
+    assert store.location_labels == ["A", "B"]
+    assert (store.location[rows] == store.location_code("B")).all()
+    np.testing.assert_array_equal(store.index_of(["NEW_0", "BIN_0002", "missing"]), [3, 2, -1])
+
+
+def test_duplicate_ids_are_rejected(make_store):
+    store = make_store(n=2)
+    with pytest.raises(ValueError):
+        store.add_bins(["BIN_0001"], [0.0], [0.0], ["A"], [1.0], [100],
+                       np.zeros(1, dtype="datetime64[s]"))
+    assert len(store) == 2
+
+
+def test_fill_updates_status(make_store):
+    store = make_store(n=3)
+    store.update_fill(np.array([0, 2]), [50.0, 95.0])
+    np.testing.assert_array_equal(store.status, [YELLOW, GREEN, RED])
+    np.testing.assert_array_equal(store.status_counts(), [1, 1, 1])
+    with pytest.raises(ValueError):
+        store.update_column("fill_level", [0], [1.0])
+
+
+def test_history_ring_keeps_newest_samples_right_aligned(make_store):
+    store = make_store(n=2, fill_history=np.array([[1.0, 2.0], [3.0, 4.0]]))
+    for value in range(5, 12):
+        store.append_history(np.array([0]), [float(value)])
+    np.testing.assert_array_equal(store.fill_history(0), [5, 6, 7, 8, 9, 10, 11])
+    history = store.history()
+    assert np.isnan(history[1, :5]).all()
+    np.testing.assert_array_equal(history[1, 5:], [3, 4])
+
+
+def test_to_frame_decodes_labels(make_store):
+    store = make_store(n=2, fill_level=np.array([10.0, 85.0]))
+    frame = store.to_frame()[["id", "location_name", "status"]]
+    assert frame.to_dict("list") == {"id": ["BIN_0000", "BIN_0001"],
+                                     "location_name": ["A", "A"], "status": ["green", "red"]}
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+import distance_cache
+from distance_cache import DistanceCache
+from spatial import haversine_km
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"P{i}" for i in range(n)], rng.uniform(40.6, 40.8, n), rng.uniform(-74.1, -73.9, n)
+
+
+def test_chunked_rows_match_direct_distances(monkeypatch):
+    monkeypatch.setattr(distance_cache, "ROW_CHUNK", 7)
+    keys, lat, lon = random_points(50)
+    cache = DistanceCache(capacity=8)
+    cache.add(keys[:20], lat[:20], lon[:20])
+    assert cache.add(keys, lat, lon) == 30
+    expected = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    np.testing.assert_allclose(cache.submatrix(keys), expected, rtol=1e-5, atol=1e-4)
+
+
+def test_moved_point_updates_its_row_and_column():
+    keys, lat, lon = random_points(10)
+    cache = DistanceCache()
+    cache.add(keys, lat, lon)
+    lat[3] += 0.05
+    assert cache.add(keys, lat, lon) == 1
+    expected = haversine_km(lat[3], lon[3], lat, lon)
+    np.testing.assert_allclose(cache.submatrix(keys)[3], expected, rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose(cache.submatrix(keys)[:, 3], expected, rtol=1e-5, atol=1e-4)
+
+
+def test_reopens_after_interrupted_grow(tmp_path):
+    keys, lat, lon = random_points(40)
+    cache = DistanceCache(str(tmp_path), capacity=16)
+    cache.add(keys[:10], lat[:10], lon[:10])
+    before = cache.submatrix(keys[:10])
+    del cache
+    # A grow that stopped after writing a partial new matrix
+    with open(tmp_path / "matrix.f32.tmp", "wb") as f:
+        f.write(b"\0" * 1000)
+    reopened = DistanceCache(str(tmp_path))
+    assert not os.path.exists(tmp_path / "matrix.f32.tmp")
+    np.testing.assert_array_equal(reopened.submatrix(keys[:10]), before)
+
+    reopened.add(keys, lat, lon)
+    assert reopened.capacity >= 40
+    again = DistanceCache(str(tmp_path))
+    np.testing.assert_array_equal(again.submatrix(keys), reopened.submatrix(keys))
+
+
+def test_sync_frees_slots_of_departed_bins(make_store):
+    cache = DistanceCache()
+    cache.sync(make_store(5), {"DEPOT_1": (0.0, 0.0)})
+    assert len(cache) == 6
+    smaller = make_store(2)
+    cache.sync(smaller, {"DEPOT_1": (0.0, 0.0)})
+    assert len(cache) == 3 and "BIN_0004" not in cache
+    assert "DEPOT_1" in cache
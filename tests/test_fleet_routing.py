@@ -0,0 +1,63 @@
+import numpy as np
+
+import fleet_routing
+from fleet_routing import Fleet, plan_fleet, sweep_clusters, trip_pool
+
+DEPOTS = [(40.70, -74.00), (40.80, -73.90)]
+
+
+def city(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(40.65, 40.85, n), rng.uniform(-74.05, -73.85, n), rng.uniform(50, 400, n)
+
+
+def check_plan(fleet, plan, load_kg):
+    stops = np.concatenate([trip.stops for trip in plan.trips])
+    assert np.array_equal(np.sort(stops), np.arange(len(load_kg)))
+    for trip in plan.trips:
+        if len(trip.stops) > 1:
+            assert trip.load_kg[-1] <= fleet.payload_kg[max(trip.truck, 0)] + 1e-9
+        assert np.isclose(trip.load_kg[-1], load_kg[trip.stops].sum())
+    served = [trip for trip in plan.trips if trip.truck >= 0]
+    for truck in range(fleet.trucks):
+        minutes = sum(trip.minutes for trip in served if trip.truck == truck)
+        assert minutes <= fleet.shift_minutes + 1e-9
+        assert all(fleet.truck_depot[truck] == trip.depot for trip in served if trip.truck == truck)
+
+
+def test_sweep_clusters_respect_payload():
+    latitude, longitude, load_kg = city(200)
+    clusters = sweep_clusters(DEPOTS[0], latitude, longitude, load_kg, 1000.0)
+    assert np.array_equal(np.sort(np.concatenate(clusters)), np.arange(200))
+    assert all(load_kg[c].sum() <= 1000.0 for c in clusters if len(c) > 1)
+
+
+def test_plan_splits_trips_by_capacity_and_shift():
+    latitude, longitude, load_kg = city(120)
+    fleet = Fleet(DEPOTS, trucks=4, payload_kg=1500.0, shift_hours=3)
+    plan = plan_fleet(fleet, latitude, longitude, load_kg, time_budget=0.05, workers=1)
+    check_plan(fleet, plan, load_kg)
+    assert len(plan.trips) >= load_kg.sum() / 1500.0
+
+
+def test_unservable_stops_are_reported():
+    latitude, longitude, load_kg = city(60)
+    fleet = Fleet(DEPOTS, trucks=1, payload_kg=500.0, shift_hours=0.5)
+    plan = plan_fleet(fleet, latitude, longitude, load_kg, time_budget=0.05, workers=1)
+    check_plan(fleet, plan, load_kg)
+    assert len(plan.unserved) and set(plan.unserved) == {
+        stop for trip in plan.trips if trip.truck < 0 for stop in trip.stops}
+
+
+def test_shared_spawn_pool_solves_trips(monkeypatch):
+    monkeypatch.setattr(fleet_routing, "PARALLEL_MIN_STOPS", 0)
+    latitude, longitude, load_kg = city(80)
+    fleet = Fleet(DEPOTS, trucks=4, payload_kg=2000.0, shift_hours=8)
+    pool = trip_pool(2)
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+        for seed in (1, 2):
+            plan = plan_fleet(fleet, latitude, longitude, load_kg, time_budget=0.05, pool=pool)
+            check_plan(fleet, plan, load_kg)
+    finally:
+        pool.shutdown()
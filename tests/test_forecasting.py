@@ -0,0 +1,45 @@
+from datetime import date
+
+import numpy as np
+
+from forecasting import FillForecaster, fit_fill_rates, project_fill
+
+
+def test_fit_recovers_rate_and_ignores_collections():
+    # Bin 0 fills 10%/day; bin 1 fills 5%/day and is emptied halfway
+    history = np.array([[10, 20, 30, 40, 50, 60, 70],
+                        [20, 25, 30, 0, 5, 10, 15]], dtype=np.float64)
+    with np.errstate(invalid="ignore"):  # No shrinkage leaves unseen weekdays at 0/0
+        daily_rate, weekday_effect = fit_fill_rates(history, np.arange(7), shrinkage=0.0)
+    np.testing.assert_allclose(daily_rate, [10, 5])
+    # Increments end on weekdays 1-6 (bin 1 has no growth on day 3)
+    np.testing.assert_allclose(weekday_effect[0, 1:], 0, atol=1e-9)
+    np.testing.assert_allclose(weekday_effect[1, [1, 2, 4, 5, 6]], 0, atol=1e-9)
+
+
+def test_shrinkage_pulls_sparse_bins_towards_the_fleet():
+    history = np.array([[0, 10, 20, 30, 40, 50, 60],
+                        [np.nan] * 5 + [0, 30]])
+    daily_rate, _ = fit_fill_rates(history, np.arange(7), shrinkage=3.0)
+    assert 10 < daily_rate[1] < 30
+
+
+def test_project_fill_reports_the_day_a_bin_is_full():
+    predicted, days_to_full = project_fill(np.array([75.0, 100.0, 0.0]), np.array([10.0, 5.0, 1.0]),
+                                           np.zeros((3, 7)), start_weekday=0, horizon=5)
+    np.testing.assert_allclose(predicted[0], [85, 95, 100, 100, 100])
+    np.testing.assert_array_equal(days_to_full, [3, 0, np.inf])
+
+
+def test_forecast_is_cached_until_the_store_changes(make_store):
+    store = make_store(n=2, fill_level=np.array([50.0, 90.0]),
+                       fill_history=np.array([[20, 30, 40, 50], [60, 70, 80, 90]], dtype=np.float64))
+    forecaster = FillForecaster(store, horizon_days=7)
+    today = date(2024, 1, 1)
+    forecast = forecaster.forecast(today)
+    assert forecaster.forecast(today) is forecast
+    np.testing.assert_array_equal(forecast.full_within(1), [1])
+    np.testing.assert_array_equal(forecast.full_within(5), [0, 1])
+
+    store.update_fill(np.array([0]), [95.0])
+    assert forecaster.forecast(today) is not forecast
@@ -0,0 +1,80 @@
+import json
+import time
+
+import numpy as np
+
+from ingestion import IngestionPipeline
+
+
+def test_mixed_batch_applies_valid_readings_and_counts_the_rest(make_store):
+    store = make_store()
+    pipeline = IngestionPipeline(store)
+    now = time.time()
+    batch = [
+        {"bin_id": "BIN_0000", "ts": now, "fill_level": 55},
+        {"bin_id": "BIN_0001", "fill_level": 70},                       # no ts
+        {"bin_id": "BIN_0001", "ts": now, "fill_level": "full"},        # non-numeric fill
+        {"bin_id": "BIN_0001", "ts": "yesterday", "fill_level": 20},   # non-numeric ts
+        b"{not json",
+        json.dumps({"bin_id": "BIN_0002", "ts": now, "fill_level": "80.5"}),
+        ["BIN_0002", now, 90],
+    ]
+    assert pipeline.apply_batch(batch) == 2
+    assert pipeline.stats["invalid"] == 5
+    np.testing.assert_allclose(store.fill_level[:3], [55.0, 10.0, 80.5])
+
+
+def test_worker_survives_a_failing_batch(make_store):
+    store = make_store()
+    pipeline = IngestionPipeline(store, flush_interval=0.05)
+    applied = pipeline.apply_batch
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("store unavailable")
+        return applied(batch)
+
+    pipeline.apply_batch = flaky
+    pipeline.start()
+    try:
+        pipeline.submit({"bin_id": "BIN_0000", "ts": time.time(), "fill_level": 40})
+        deadline = time.monotonic() + 2
+        while pipeline.stats["failed_batches"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pipeline.submit({"bin_id": "BIN_0001", "ts": time.time(), "fill_level": 60})
+        while pipeline.stats["applied"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pipeline.stop()
+    assert pipeline.stats["failed_batches"] == 1
+    assert isinstance(pipeline.last_error, RuntimeError)
+    assert store.fill_level[1] == 60
+
+
+def test_daily_history_is_the_running_mean_of_the_day(make_store):
+    day = 20_000 * 86400.0
+    store = make_store(2, fill_history=np.full((2, 3), 30.0), history_ts=day + 3600)
+    pipeline = IngestionPipeline(store)
+
+    # Readings later the same day as the seeded sample update it in place
+    pipeline.apply_batch([{"bin_id": "BIN_0000", "ts": day + 7200, "fill_level": 40}])
+    pipeline.apply_batch([{"bin_id": "BIN_0000", "ts": day + 10800, "fill_level": 60}])
+    assert store.history_counts()[0] == 3
+    assert store.fill_history(0).tolist() == [30.0, 30.0, 50.0]
+
+    # The next day opens a new sample
+    pipeline.apply_batch([{"bin_id": "BIN_0000", "ts": day + 86400, "fill_level": 10},
+                          {"bin_id": "BIN_0001", "ts": day + 86400, "fill_level": 20}])
+    pipeline.apply_batch([{"bin_id": "BIN_0000", "ts": day + 90000, "fill_level": 20}])
+    assert store.fill_history(0).tolist() == [30.0, 30.0, 50.0, 15.0]
+    assert store.fill_history(1).tolist() == [30.0, 30.0, 30.0, 20.0]
+    assert store.history_times()[0] == day + 86400
+
+
+def test_unseeded_history_starts_with_the_first_reading(make_store):
+    store = make_store(1)
+    pipeline = IngestionPipeline(store)
+    pipeline.apply_batch([{"bin_id": "BIN_0000", "ts": 86400.0 * 5, "fill_level": 25}])
+    assert store.fill_history(0).tolist() == [25.0]
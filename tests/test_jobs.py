@@ -0,0 +1,55 @@
+import threading
+import time
+
+from jobs import CANCELLED, DONE, FAILED, JobRunner
+
+
+def wait_finished(job, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return job
+
+
+def test_result_progress_and_failure():
+    runner = JobRunner(workers=1)
+
+    def work(job, n):
+        for i in range(n):
+            job.report(done=i + 1)
+        return n * 2
+
+    job = wait_finished(runner.submit("work", work, 3))
+    assert job.state == DONE and job.result == 6 and job.snapshot() == {"done": 3}
+    assert job.finished_at is not None
+
+    failed = wait_finished(runner.submit("fail", lambda job: 1 / 0))
+    assert failed.state == FAILED and isinstance(failed.error, ZeroDivisionError)
+
+
+def test_cancel_stops_a_running_job_at_its_next_report():
+    runner = JobRunner(workers=1)
+    started = threading.Event()
+
+    def loop(job):
+        started.set()
+        while True:
+            job.report()
+            time.sleep(0.001)
+
+    job = runner.submit("loop", loop)
+    assert started.wait(2)
+    job.cancel()
+    assert wait_finished(job).state == CANCELLED
+
+
+def test_expire_drops_only_old_finished_jobs():
+    runner = JobRunner(workers=1, retain_seconds=60)
+    old = wait_finished(runner.submit("old", lambda job: None))
+    old.finished_at -= 120
+    running = runner.submit("running", lambda job: time.sleep(0.2))
+    # A finished state without finished_at must not break expiry
+    running.state = DONE
+    runner.submit("new", lambda job: None)
+    assert runner.get(old.id) is None
+    assert runner.get(running.id) is running
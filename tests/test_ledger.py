@@ -0,0 +1,38 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import CO2_KG_PER_L, SERVICE_MINUTES, LegLedger, leg_costs, route_legs
+
+
+def test_route_legs_cost_the_load_on_board():
+    legs = route_legs([1.0, 2.0, 3.0], [3.0, 6.0, 9.0], stop_load_kg=[100.0, 500.0])
+    np.testing.assert_array_equal(legs["load_kg"], [0, 100, 600])
+    np.testing.assert_array_equal(legs["minutes"], [3 + SERVICE_MINUTES, 6 + SERVICE_MINUTES, 9])
+    fuel_l, co2_kg = leg_costs([3.0], [9.0], [600.0])
+    assert np.isclose(legs["fuel_l"].iloc[-1], fuel_l[0])
+    np.testing.assert_allclose(legs["co2_kg"], legs["fuel_l"] * CO2_KG_PER_L)
+    # Carrying more costs more fuel over the same leg
+    assert leg_costs([1.0], [3.0], [1000.0])[0][0] > leg_costs([1.0], [3.0], [0.0])[0][0]
+
+
+def test_ledger_grows_and_reports_by_week_and_truck():
+    ledger = LegLedger(capacity=2)
+    legs = route_legs([1.0, 1.0], [2.0, 2.0], [50.0])
+    # 2024-01-01 was a Monday: the first three days share a week, the 8th starts the next
+    for day, truck in [(date(2024, 1, 1), 0), (date(2024, 1, 3), 0), (date(2024, 1, 3), 1),
+                       (date(2024, 1, 8), 0)]:
+        ledger.append(day, 0, truck, 0, legs)
+    assert len(ledger) == 8 and len(ledger.frame()) == 8
+
+    report = ledger.report("W")
+    assert list(report["period"]) == list(pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-08"]))
+    assert list(report["truck"]) == [0, 1, 0] and list(report["legs"]) == [4, 2, 2]
+    np.testing.assert_allclose(report["km"], [4, 2, 2])
+
+    monthly = ledger.report("M", by=(), start="2024-01-02", end="2024-01-08")
+    assert list(monthly["legs"]) == [4]
+    with pytest.raises(ValueError):
+        ledger.report("Y")
@@ -0,0 +1,49 @@
+import pytest
+
+from response_cache import MinHasher, ResponseCache, normalize_prompt, shingles
+
+
+def jaccard(first, second):
+    first, second = shingles(normalize_prompt(first)), shingles(normalize_prompt(second))
+    return len(first & second) / len(first | second)
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=512, bands=64)
+    pairs = [("How do I recycle plastic bottles?", "How do I recycle glass bottles?"),
+             ("Which bins are nearly full?", "Which bins are almost full?"),
+             ("How do I recycle plastic bottles?", "When is collection on Monday?")]
+    for first, second in pairs:
+        estimate = hasher.similarity(hasher.signature(shingles(normalize_prompt(first))),
+                                     hasher.signature(shingles(normalize_prompt(second))))
+        assert estimate == pytest.approx(jaccard(first, second), abs=0.08)
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("How do I recycle plastic bottles?", "How do I recycle glass bottles?"),
+    ("When will bin 7 be full?", "When will bin 5 be full?"),
+    ("Should I compost meat?", "Should I not compost meat?"),
+    ("Can I compost meat?", "Can't I compost meat?"),
+])
+def test_unrelated_prompts_and_negations_miss(cached, asked):
+    cache = ResponseCache()
+    cache.put(cached, "cached answer", fingerprint="ctx")
+    assert cache.get(asked, fingerprint="ctx") is None
+
+
+def test_paraphrase_hits_in_same_context_only():
+    cache = ResponseCache()
+    cache.put("How do I recycle plastic bottles?", "Rinse them", fingerprint="ctx")
+    assert cache.get("how do I recycle plastic bottles", fingerprint="ctx") == "Rinse them"
+    assert cache.get("How should I recycle the plastic bottles?", fingerprint="ctx") == "Rinse them"
+    assert cache.get("How do I recycle plastic bottles?", fingerprint="other") is None
+    assert cache.stats["hits"] == 1 and cache.stats["near_hits"] == 1
+
+
+def test_drop_removes_entry_from_index():
+    cache = ResponseCache(max_bytes=1)
+    cache.put("When will bin 7 be full?", "Tomorrow")
+    cache.put("Should I compost meat?", "No")
+    assert len(cache) == 1 and cache.stats["evictions"] == 1
+    assert cache.get("When will bin 7 be full soon?") is None
+    assert sum(len(members) for members in cache._bands.values()) == cache.hasher.bands
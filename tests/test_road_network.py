@@ -0,0 +1,71 @@
+import heapq
+import math
+
+import numpy as np
+
+from road_network import ContractionHierarchy, RoadGraph, RoadNetwork
+
+
+def grid_graph(side=6, seed=0):
+    """Two-way grid streets with random travel times, plus a few one-way shortcuts"""
+    rng = np.random.default_rng(seed)
+    node = np.arange(side * side).reshape(side, side)
+    pairs = np.concatenate([
+        np.stack([node[:, :-1].ravel(), node[:, 1:].ravel()], axis=1),
+        np.stack([node[:-1, :].ravel(), node[1:, :].ravel()], axis=1),
+    ])
+    tail = np.concatenate([pairs[:, 0], pairs[:, 1], rng.integers(0, side * side, 8)])
+    head = np.concatenate([pairs[:, 1], pairs[:, 0], rng.integers(0, side * side, 8)])
+    keep = tail != head
+    tail, head = tail[keep], head[keep]
+    time_s = rng.uniform(10, 100, len(tail))
+    rows, cols = np.divmod(np.arange(side * side), side)
+    return RoadGraph(rows * 0.001, cols * 0.001, tail, head, time_s * 10, time_s)
+
+
+def dijkstra(graph, source):
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, x = heapq.heappop(heap)
+        if d > best[x]:
+            continue
+        for k in range(graph.indptr[x], graph.indptr[x + 1]):
+            y, t = int(graph.indices[k]), d + float(graph.time_s[k])
+            if t < best.get(y, math.inf):
+                best[y] = t
+                heapq.heappush(heap, (t, y))
+    return np.array([best.get(v, math.inf) for v in range(graph.nodes)])
+
+
+def test_hierarchy_times_match_dijkstra():
+    graph = grid_graph()
+    hierarchy = ContractionHierarchy.build(graph)
+    nodes = list(range(graph.nodes))
+    time_s, length_m = hierarchy.many_to_many(nodes, nodes)
+    expected = np.stack([dijkstra(graph, source) for source in nodes])
+    np.testing.assert_allclose(time_s, expected, rtol=1e-4)
+    # Lengths belong to the fastest path; here every edge is 10 m per second
+    np.testing.assert_allclose(length_m, expected * 10, rtol=1e-3)
+
+
+def test_unreachable_pairs_are_inf():
+    # 0 -> 1 -> 2, and an isolated node 3
+    graph = RoadGraph(np.zeros(4), np.arange(4) * 0.001, [0, 1], [1, 2], [100, 100], [10, 10])
+    time_s, _ = ContractionHierarchy.build(graph).many_to_many([0, 2, 3], [2, 0, 3])
+    np.testing.assert_array_equal(time_s, [[20, 0, np.inf], [0, np.inf, np.inf],
+                                           [np.inf, np.inf, 0]])
+
+
+def test_open_saves_the_hierarchy_for_cached(tmp_path):
+    path = str(tmp_path / "city.npz")
+    graph = grid_graph(side=4)
+    graph.save(path)
+    assert RoadNetwork.cached(path) is None
+
+    built = RoadNetwork.open(path)
+    loaded = RoadNetwork.cached(path)
+    assert loaded is not None
+    nodes = list(range(graph.nodes))
+    np.testing.assert_array_equal(loaded.hierarchy.many_to_many(nodes, nodes)[0],
+                                  built.hierarchy.many_to_many(nodes, nodes)[0])
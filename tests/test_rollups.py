@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+import pytest
+
+from rollups import RollupEngine
+
+
+def test_backfill_replays_only_the_window_queried(make_store):
+    store = make_store()
+    now = time.time()
+    calls = []
+
+    def backfill(start, end):
+        calls.append((start, end))
+        ts = np.arange(start, end, 3600.0)
+        yield np.zeros(len(ts), dtype=np.intp), ts, np.full(len(ts), 50.0)
+
+    rollups = RollupEngine(store, backfill=backfill)
+    assert len(rollups.series("5min", start=now - 3 * 3600)) >= 3
+    assert len(calls) == 1 and calls[0][1] - calls[0][0] <= 3 * 3600 + 300
+
+    # Already replayed windows are not read again; wider ones only add the difference
+    rollups.series("5min", start=now - 3 * 3600)
+    rollups.series("5min", start=now - 6 * 3600)
+    assert len(calls) == 2 and calls[1][1] == calls[0][0]
+    assert rollups.series("daily").empty is False
+    assert calls[2][1] - calls[2][0] > 80 * 86400
+
+
+def test_live_readings_are_not_replayed(make_store):
+    store = make_store()
+    rollups = RollupEngine(store, backfill=lambda start, end: iter(()))
+    rollups.add([1], [time.time()], [70.0])
+    frame = rollups.series("daily", row=1)
+    assert frame["count"].sum() == 1 and frame["mean"].iloc[-1] == 70.0
+
+
+def test_bins_keep_only_bin_resolutions(make_store):
+    store = make_store()
+    rollups = RollupEngine(store)
+    rollups.add([0, 1], [time.time()] * 2, [40.0, 60.0])
+    assert rollups.resolutions == ["5min", "hourly", "daily"]
+    assert rollups.series("5min")["mean"].iloc[-1] == 50.0
+    assert rollups.series("daily", row=0)["mean"].iloc[-1] == 40.0
+    with pytest.raises(ValueError):
+        rollups.series("5min", row=0)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from route_objectives import FUEL_L_PER_KM, FUEL_L_PER_MINUTE, OBJECTIVES, RouteCosts, plan_objectives
+from routing import distance_matrix
+
+
+def make_costs(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    latitude = np.concatenate([[40.0], rng.uniform(39.98, 40.02, n)])
+    longitude = np.concatenate([[-74.0], rng.uniform(-74.02, -73.98, n)])
+    km = distance_matrix(latitude, longitude)
+    # One-way slowdowns make the minutes asymmetric
+    minutes = km * 3 * rng.uniform(1.0, 1.5, km.shape)
+    np.fill_diagonal(minutes, 0)
+    priority = np.arange(n) % 3
+    return RouteCosts(km, minutes, rng.uniform(0, 90, n), rng.uniform(5, 30, n), priority)
+
+
+def test_evaluate_scores_the_directed_legs():
+    km = np.array([[0, 1, 2], [1, 0, 1], [2, 1, 0]], dtype=np.float64)
+    minutes = np.array([[0, 10, 20], [30, 0, 10], [20, 10, 0]], dtype=np.float64)
+    costs = RouteCosts(km, minutes, fill_level=[50, 76], daily_rate=[24, 24], priority=[0, 0])
+    metrics = costs.evaluate([0, 1, 2])
+    assert metrics["minutes"] == 40 and metrics["km"] == 4
+    assert np.isclose(metrics["fuel_l"], FUEL_L_PER_KM * 4 + FUEL_L_PER_MINUTE * 40)
+    # Arrivals after 10 and 20 minutes; the bins fill in 50 and 24 hours
+    assert np.isclose(metrics["overflow_risk"], (10 / 60) / 50 + (20 / 60) / 24)
+    assert costs.evaluate([0, 2, 1])["minutes"] == 60
+
+
+def test_every_objective_visits_every_stop_from_the_depot():
+    tours = plan_objectives(make_costs(), time_budget=1.0)
+    assert set(tours) == set(OBJECTIVES)
+    for tour in tours.values():
+        assert tour[0] == 0 and sorted(tour) == list(range(13))
+
+
+def test_priority_tour_visits_the_highest_class_first():
+    costs = make_costs()
+    tour = plan_objectives(costs, time_budget=1.0)["Priority Bins First"]
+    classes = costs.priority[tour[1:] - 1]
+    np.testing.assert_array_equal(classes, np.sort(classes)[::-1])
+
+
+def test_summary_flags_dominated_plans():
+    # Depot and three stops on a line, 1 km and 1 minute apart
+    position = np.arange(4, dtype=np.float64)
+    km = np.abs(position[:, None] - position[None, :])
+    costs = RouteCosts(km, km.copy(), fill_level=[50, 50, 50], daily_rate=[10, 10, 10],
+                       priority=[0, 0, 0])
+    summary = costs.summary({"straight": np.array([0, 1, 2, 3]), "zigzag": np.array([0, 2, 1, 3])})
+    assert summary["pareto"].to_dict() == {"straight": True, "zigzag": False}
@@ -0,0 +1,52 @@
+import numpy as np
+
+from routing import distance_matrix, or_opt, plan_route, solve_tsp, tour_length, two_opt
+from spatial import haversine_km
+
+
+def circle(n, seed=0):
+    """Stops on a small circle, numbered in shuffled order
+
+    Returns (latitude, longitude, dist, tour) where ``tour`` visits the stops
+    around the circle, the optimal tour.
+    """
+    slot = np.random.default_rng(seed).permutation(n)
+    angle = slot * 2 * np.pi / n
+    latitude, longitude = 40.0 + 0.01 * np.sin(angle), -74.0 + 0.01 * np.cos(angle)
+    return latitude, longitude, distance_matrix(latitude, longitude), np.argsort(slot)
+
+
+def test_two_opt_uncrosses_a_tour():
+    _, _, dist, best = circle(10)
+    tour = best.copy()
+    tour[2:6] = tour[2:6][::-1]
+    improved = True
+    while improved:
+        tour, improved = two_opt(tour, dist)
+    assert tour[0] == best[0]
+    np.testing.assert_allclose(tour_length(tour, dist), tour_length(best, dist))
+
+
+def test_or_opt_moves_a_misplaced_stop():
+    _, _, dist, best = circle(10)
+    # One stop visited on the far side of the circle
+    tour = np.concatenate([best[:3], best[4:8], best[3:4], best[8:]])
+    moved, improved = or_opt(tour, dist)
+    assert improved and moved[0] == tour[0]
+    np.testing.assert_allclose(tour_length(moved, dist), tour_length(best, dist))
+
+
+def test_solve_tsp_finds_the_circle():
+    _, _, dist, best = circle(30)
+    tour = solve_tsp(dist, time_budget=2.0, start=5)
+    assert tour[0] == 5 and sorted(tour) == list(range(30))
+    np.testing.assert_allclose(tour_length(tour, dist), tour_length(best, dist))
+
+
+def test_plan_route_legs_start_and_end_at_the_depot():
+    latitude, longitude, _, _ = circle(6)
+    route = plan_route((40.0, -74.0), latitude, longitude)
+    assert sorted(route.stops) == list(range(6)) and len(route.leg_km) == 7
+    first, last = route.stops[0], route.stops[-1]
+    np.testing.assert_allclose(route.leg_km[[0, -1]],
+                               haversine_km(40.0, -74.0, latitude[[first, last]], longitude[[first, last]]))
@@ -0,0 +1,53 @@
+import numpy as np
+
+from simulation import FixedSchedule, FleetSimulator, ForecastPolicy, ThresholdPolicy
+
+
+def one_bin(daily_rate=48.0, **kwargs):
+    return FleetSimulator([40.01], [-74.0], [100.0], [0.0], [daily_rate], [(40.0, -74.0)],
+                          rate_noise=0, **kwargs)
+
+
+def test_overflow_hours_are_exact():
+    # 2%/hour from empty: 12% at the 6am dispatch, 96% by the end of day 1 and
+    # full 2 hours into day 2, 4 hours before the truck comes
+    frame = one_bin().run(ThresholdPolicy(80), days=3)
+    np.testing.assert_array_equal(frame["overflows"], [0, 0, 1])
+    np.testing.assert_array_equal(frame["overflow_hours"], [0, 0, 4])
+    np.testing.assert_array_equal(frame["collections"], [0, 0, 1])
+    assert frame["km"].iloc[2] > 0 and frame["km"].iloc[:2].sum() == 0
+
+
+def test_forecast_policy_collects_before_the_overflow():
+    frame = one_bin().run(ForecastPolicy(horizon_days=1.0), days=30)
+    assert frame["overflows"].sum() == 0 and frame["collections"].sum() > 0
+
+
+def test_fixed_schedule_spreads_bins_over_the_interval():
+    n = 9
+    simulator = FleetSimulator(np.full(n, 40.01), np.linspace(-74.01, -73.99, n), np.full(n, 100.0),
+                               np.zeros(n), np.full(n, 5.0), [(40.0, -74.0)], rate_noise=0)
+    frame = simulator.run(FixedSchedule(3), days=6)
+    np.testing.assert_array_equal(frame["collections"], [3] * 6)
+
+
+def test_dispatch_is_capped_by_fleet_capacity_fullest_first():
+    n = 4
+    simulator = FleetSimulator(np.full(n, 40.01), np.linspace(-74.01, -73.99, n), np.full(n, 100.0),
+                               [85.0, 95.0, 90.0, 99.0], np.zeros(n), [(40.0, -74.0)],
+                               trucks=1, payload_kg=100.0, trips_per_truck=2, rate_noise=0)
+    picked = simulator._dispatch(ThresholdPolicy(80), 0, simulator.fill_level, np.zeros(n), np.zeros(n))
+    np.testing.assert_array_equal(picked, [3, 1])
+
+
+def test_policies_see_the_same_noise():
+    rng = np.random.default_rng(1)
+    n = 200
+    simulator = FleetSimulator(rng.uniform(39.95, 40.05, n), rng.uniform(-74.05, -73.95, n),
+                               np.full(n, 240.0), rng.uniform(0, 80, n), rng.uniform(5, 40, n),
+                               [(40.0, -74.0)], trucks=2, seed=7)
+    first = simulator.run(ThresholdPolicy(80), days=20)
+    assert first.equals(simulator.run(ThresholdPolicy(80), days=20))
+    totals = simulator.compare([ThresholdPolicy(80), ForecastPolicy()], days=20)
+    assert list(totals["policy"]) == ["Threshold 80%", "Forecast 1 day"]
+    assert totals["overflows"].iloc[1] <= totals["overflows"].iloc[0]
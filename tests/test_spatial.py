@@ -0,0 +1,55 @@
+import numpy as np
+
+from spatial import GridIndex, haversine_km
+
+
+def points(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(40.70, 40.78, n), rng.uniform(-74.02, -73.94, n)
+
+
+def test_nearest_matches_brute_force():
+    lat, lon = points()
+    index = GridIndex()
+    index.insert(np.arange(len(lat)), lat, lon)
+    for qlat, qlon in [(40.74, -73.98), (40.70, -74.02), (40.90, -73.80)]:
+        rows, dist = index.nearest(qlat, qlon, k=5)
+        expected = np.argsort(haversine_km(qlat, qlon, lat, lon), kind="stable")[:5]
+        np.testing.assert_array_equal(rows, expected)
+        np.testing.assert_allclose(dist, haversine_km(qlat, qlon, lat[expected], lon[expected]))
+
+
+def test_nearest_skips_excluded_rows():
+    lat, lon = points()
+    index = GridIndex()
+    index.insert(np.arange(len(lat)), lat, lon)
+    first, _ = index.nearest(lat[7], lon[7], k=1)
+    assert first[0] == 7
+    rows, _ = index.nearest(lat[7], lon[7], k=3, exclude=[7])
+    assert 7 not in rows and len(rows) == 3
+
+
+def test_radius_and_bbox_match_brute_force():
+    lat, lon = points()
+    index = GridIndex()
+    index.insert(np.arange(len(lat)), lat, lon)
+    rows, dist = index.radius(40.74, -73.98, 1.5)
+    expected = np.flatnonzero(haversine_km(40.74, -73.98, lat, lon) <= 1.5)
+    np.testing.assert_array_equal(np.sort(rows), expected)
+    assert (np.diff(dist) >= 0).all()
+
+    inside = np.flatnonzero((lat >= 40.72) & (lat <= 40.75) & (lon >= -74.0) & (lon <= -73.96))
+    np.testing.assert_array_equal(index.bbox(40.72, -74.0, 40.75, -73.96), inside)
+
+
+def test_moved_and_removed_rows(make_store):
+    store = make_store(n=3, latitude=np.array([40.70, 40.71, 40.72]),
+                       longitude=np.array([-74.0, -74.0, -74.0]))
+    index = GridIndex.from_store(store)
+    assert len(index) == 3
+    index.insert([0], 40.80, -73.90)
+    rows, _ = index.nearest(40.80, -73.90)
+    assert rows[0] == 0
+    index.remove([0])
+    rows, _ = index.nearest(40.80, -73.90, k=3)
+    assert sorted(rows) == [1, 2]
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from state import SharedState
+
+
+class Closable:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_loads_once_and_reloads_after_ttl():
+    state = SharedState()
+    calls = []
+    state.register("item", lambda: calls.append(1) or len(calls), ttl=0.05)
+    assert state.get("item") == 1 and state.get("item") == 1
+    time.sleep(0.06)
+    assert state.get("item") == 2
+    assert state.age("item") < 0.05
+
+
+def test_concurrent_gets_are_single_flight():
+    state = SharedState()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    state.register("item", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(state.get("item"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len({id(r) for r in results}) == 1
+
+
+def test_invalidate_drops_dependents_transitively():
+    state = SharedState()
+    versions = {"base": 0, "index": 0, "view": 0, "other": 0}
+
+    def loader(key):
+        def load():
+            versions[key] += 1
+            return versions[key]
+        return load
+
+    state.register("base", loader("base"))
+    state.register("index", loader("index"), depends_on=("base",))
+    state.register("view", loader("view"), depends_on=("index",))
+    state.register("other", loader("other"))
+    for key in versions:
+        state.get(key)
+    state.invalidate("base")
+    assert state.age("view") is None and state.age("other") is not None
+    assert [state.get(key) for key in ("base", "index", "view", "other")] == [2, 2, 2, 1]
+
+
+def test_dropped_and_replaced_values_are_closed():
+    state = SharedState()
+    state.register("service", Closable, ttl=0.05)
+    first = state.get("service")
+    time.sleep(0.06)
+    second = state.get("service")
+    assert first.closed and not second.closed
+    state.invalidate("service")
+    assert second.closed
+    third = state.get("service")
+    state.set("service", Closable())
+    assert third.closed
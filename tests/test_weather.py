@@ -0,0 +1,109 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from weather import (CONDITIONS, FORECAST_FIELDS, Forecast, WeatherClient, WeatherGrid,
+                     WeatherService)
+from weather_stub import StubWeatherServer
+
+
+@pytest.fixture
+def stub():
+    with StubWeatherServer() as server:
+        yield server
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_service_serves_fallback_then_refreshes_in_background(stub):
+    service = WeatherService(WeatherClient("test", stub.url), 40.7, -74.0, ttl=60,
+                             fallback=lambda: {"mock": True})
+    try:
+        assert service.get() == {"mock": True}
+        assert wait_for(lambda: service.age is not None)
+        weather = service.get()
+        assert "temperature" in weather and len(weather["forecast"]) == 5
+        assert stub.requests == 2
+    finally:
+        service.close()
+
+
+def test_failed_refresh_keeps_last_value_and_backs_off():
+    service = WeatherService(WeatherClient("test", "http://127.0.0.1:9", timeout=(0.2, 0.2)),
+                             40.7, -74.0, ttl=0, fallback=lambda: "fallback", retry_seconds=60)
+    try:
+        service.refresh(wait=True)
+        assert service.last_error is not None and service.get() == "fallback"
+        assert not service._refreshing
+    finally:
+        service.close()
+
+
+def test_close_stops_worker_threads(stub):
+    before = threading.active_count()
+    service = WeatherService(WeatherClient("test", stub.url), 40.7, -74.0, ttl=0)
+    service.refresh(wait=True)
+    service.get()
+    service.close()
+    assert wait_for(lambda: not any(t.name.startswith("weather-") for t in threading.enumerate()))
+    assert threading.active_count() <= before
+    # Closed services keep serving what they have without starting refreshes
+    assert service.get() is not None
+    service.refresh()
+
+
+def test_grid_fetches_occupied_cells_and_interpolates(stub):
+    rng = np.random.default_rng(0)
+    latitude, longitude = rng.uniform(40.6, 40.8, 300), rng.uniform(-74.1, -73.9, 300)
+    grid = WeatherGrid(WeatherClient("test", stub.url), latitude, longitude, cell_km=5, max_cells=16)
+    received = []
+    grid.add_listener(lambda ts, lat, lon, values: received.append(len(lat)))
+    try:
+        assert 0 < len(grid) <= 16
+        assert np.isnan(grid.at(latitude, longitude)["temperature"]).all()
+        grid.refresh(wait=True)
+        assert grid.fetched == len(grid) and received == [len(grid)]
+
+        # At a cell centre the value is that cell's own
+        centre = grid.at(grid.latitude[:1], grid.longitude[:1])
+        frame = grid.frame()
+        assert centre["temperature"][0] == pytest.approx(frame["temperature"][0])
+        local = grid.at(latitude, longitude)
+        assert np.isfinite(local["temperature"]).all()
+        assert frame["temperature"].min() - 1e-9 <= local["temperature"].min()
+        assert local["temperature"].max() <= frame["temperature"].max() + 1e-9
+    finally:
+        grid.close()
+    grid.refresh()
+    assert grid.get() is grid
+
+
+def test_forecast_daily_aggregates_local_days():
+    day = 19_000 * 86400
+    steps = day + np.arange(12) * 10800 - 3600  # One step before local midnight, then 1.5 days
+    values = np.zeros((12, len(FORECAST_FIELDS)), dtype=np.float32)
+    field = {name: i for i, name in enumerate(FORECAST_FIELDS)}
+    values[:, field["temperature"]] = np.arange(12)
+    values[:, field["rain_mm"]] = 1.0
+    values[:, field["wind_speed"]] = 10.0
+    values[:, field["wind_gust"]] = np.nan
+    values[5, field["wind_gust"]] = 50.0
+    conditions = np.zeros(12, dtype=np.int8)
+    conditions[2] = CONDITIONS.index("Rain")
+    forecast = Forecast(steps, values, conditions, utc_offset=3600)
+
+    daily = forecast.daily()
+    assert len(daily) == 2
+    assert daily["temp_min"].tolist() == [0.0, 8.0]
+    assert daily["temp_max"].tolist() == [7.0, 11.0]
+    assert daily["precip_mm"].tolist() == [8.0, 4.0]
+    assert daily["gust_max"].tolist() == [50.0, 10.0]
+    assert daily["condition"].tolist() == ["Rain", "Clear"]
+    assert Forecast([], np.zeros((0, len(FORECAST_FIELDS))), []).daily().empty
@@ -0,0 +1,53 @@
+import numpy as np
+
+from weather_impact import (HEAT_BASE_C, fill_from_neighbours, fit_weather_impact, nearest_place,
+                            weather_features)
+
+
+def synthetic(days=200, seed=0):
+    """Two places' weather, and three bins: rain-sensitive, heat-sensitive and indifferent"""
+    rng = np.random.default_rng(seed)
+    temp_max = rng.uniform(10, 35, (2, days))
+    rain_mm = rng.exponential(3, (2, days))
+    wind_max = rng.uniform(0, 40, (2, days))
+    features = weather_features(temp_max, rain_mm, wind_max)
+    place_of_bin = np.array([0, 1, 0])
+    heat, rain = features[place_of_bin, :, 0], features[place_of_bin, :, 1]
+    increments = np.stack([8 + 2 * (rain[0] - rain[0].mean()),
+                           5 + 0.5 * (heat[1] - heat[1].mean()),
+                           np.full(days, 5.0)])
+    history = np.cumsum(increments, axis=1)
+    return history, np.arange(days) % 7, features, place_of_bin
+
+
+def test_fit_recovers_each_bins_sensitivity():
+    history, weekdays, features, place_of_bin = synthetic()
+    progress = []
+    impact = fit_weather_impact(history, weekdays, features, place_of_bin, ["rain", "heat", "none"],
+                                shrinkage=1.0, chunk=2, progress=lambda done, total: progress.append(done))
+    assert progress == [2, 3]
+    frame = impact.frame().set_index("bin_id")
+    np.testing.assert_allclose(frame.loc["rain", ["rate_heat", "rate_rain", "rate_wind"]], [0, 2, 0],
+                               atol=0.1)
+    np.testing.assert_allclose(frame.loc["heat", ["rate_heat", "rate_rain", "rate_wind"]], [0.5, 0, 0],
+                               atol=0.1)
+    np.testing.assert_allclose(frame.loc["none", ["rate_heat", "rate_rain", "rate_wind"]], 0, atol=0.1)
+    assert (impact.observations == 199).all()
+
+    # A rainy day raises the rain-sensitive bin's rate; bins added later use the fleet fit
+    rainy = impact.feature_mean + [0, 10, 0]
+    effect = impact.rate_effect(rainy, bins=4)
+    assert effect.shape == (4, 1) and effect[0, 0] > 15 and abs(effect[2, 0]) < 1
+    np.testing.assert_allclose(effect[3], impact.fleet_rate @ [0, 10, 0])
+
+
+def test_missing_weather_is_borrowed_from_the_nearest_place():
+    features = weather_features([[25.0, np.nan], [30.0, 18.0], [np.nan, 22.0]],
+                                np.ones((3, 2)), np.ones((3, 2)))
+    place_lat, place_lon = np.array([40.0, 40.1, 40.5]), np.array([-74.0, -74.0, -74.0])
+    filled = fill_from_neighbours(features, place_lat, place_lon)
+    np.testing.assert_array_equal(filled[:, :, 0], [[5, 0], [10, 0], [10, 2]])
+    assert filled[0, 0, 0] == 25.0 - HEAT_BASE_C
+
+    np.testing.assert_array_equal(nearest_place([40.45, 40.01], [-74.0, -74.0], place_lat, place_lon),
+                                  [2, 0])
@@ -0,0 +1,484 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from spatial import KM_PER_DEGREE, haversine_km
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5"
+
+# (connect, read) seconds; a slow weather service must never hold up a page
+WEATHER_TIMEOUT = (2.0, 4.0)
+
+DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+              'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+
+def degrees_to_direction(degrees):
+    """Convert wind degrees to cardinal direction"""
+    ix = round(degrees / (360. / len(DIRECTIONS)))
+    return DIRECTIONS[ix % len(DIRECTIONS)]
+
+
+class WeatherClient:
+    """OpenWeather API client on one pooled, keep-alive HTTP session
+
+    Every request has a strict (connect, read) timeout, and connection
+    errors are retried once.
+    """
+
+    def __init__(self, api_key, base_url=OPENWEATHER_URL, timeout=WEATHER_TIMEOUT, pool_size=8):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=Retry(total=1, connect=1, read=0, backoff_factor=0.2))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _get(self, endpoint, lat, lon):
+        response = self.session.get(
+            f"{self.base_url}/{endpoint}",
+            params={"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def current(self, lat, lon):
+        return self._get("weather", lat, lon)
+
+    def forecast(self, lat, lon):
+        return self._get("forecast", lat, lon)
+
+
+# OpenWeather condition groups, least to most severe; a day shows its most severe
+CONDITIONS = ("Clear", "Clouds", "Mist", "Smoke", "Haze", "Dust", "Fog", "Sand", "Ash",
+              "Drizzle", "Rain", "Snow", "Squall", "Thunderstorm", "Tornado")
+_CONDITION_CODES = {name: code for code, name in enumerate(CONDITIONS)}
+
+FORECAST_FIELDS = ("temperature", "humidity", "wind_speed", "wind_gust", "rain_mm", "snow_mm",
+                   "pop", "clouds")
+
+
+class Forecast:
+    """The full 5-day/3-hour forecast as arrays, one row per step
+
+    ``values`` is a float32 (steps x FORECAST_FIELDS) array; wind is in
+    km/h, rain and snow in mm over the step, ``pop`` the probability of
+    precipitation (0-1), and a missing gust is NaN. Daily figures come from
+    one ``reduceat`` pass over the steps of each local day.
+    """
+
+    STEP_HOURS = 3
+
+    def __init__(self, time, values, conditions, utc_offset=0):
+        self.time = np.asarray(time, dtype=np.int64)  # Unix seconds
+        self.values = np.asarray(values, dtype=np.float32)
+        self.conditions = np.asarray(conditions, dtype=np.int8)  # Codes into CONDITIONS
+        self.utc_offset = utc_offset  # Seconds, for local days
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def from_response(cls, forecast):
+        items = forecast['list']
+        values = np.full((len(items), len(FORECAST_FIELDS)), np.nan, dtype=np.float32)
+        for row, item in enumerate(items):
+            wind = item.get('wind', {})
+            values[row] = (item['main']['temp'], item['main']['humidity'],
+                           wind.get('speed', np.nan) * 3.6, wind.get('gust', np.nan) * 3.6,
+                           item.get('rain', {}).get('3h', 0.0), item.get('snow', {}).get('3h', 0.0),
+                           item.get('pop', np.nan), item.get('clouds', {}).get('all', np.nan))
+        conditions = [_CONDITION_CODES.get(item['weather'][0]['main'], 1) for item in items]
+        return cls([item['dt'] for item in items], values, conditions,
+                   forecast.get('city', {}).get('timezone', 0))
+
+    def field(self, name):
+        return self.values[:, FORECAST_FIELDS.index(name)]
+
+    def daily(self):
+        """One row per local day: temperature range, precipitation, peak wind and gust, worst condition"""
+        if not len(self):
+            return pd.DataFrame(columns=["date", "day", "temp_min", "temp_max", "precip_mm",
+                                         "wind_max", "gust_max", "pop_max", "condition"])
+        day = (self.time + self.utc_offset) // 86400
+        starts = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+        temperature = self.field("temperature")
+        wind = self.field("wind_speed")
+        date = day[starts].astype("datetime64[D]")
+        return pd.DataFrame({
+            "date": date,
+            "day": pd.DatetimeIndex(date).strftime("%a"),
+            "temp_min": np.minimum.reduceat(temperature, starts),
+            "temp_max": np.maximum.reduceat(temperature, starts),
+            "precip_mm": np.add.reduceat(self.field("rain_mm") + self.field("snow_mm"), starts),
+            "wind_max": np.fmax.reduceat(wind, starts),
+            "gust_max": np.fmax.reduceat(np.fmax(wind, self.field("wind_gust")), starts),
+            "pop_max": np.fmax.reduceat(self.field("pop"), starts),
+            "condition": np.asarray(CONDITIONS)[np.maximum.reduceat(self.conditions, starts)],
+        })
+
+    def hourly(self, fields=("temperature", "wind_speed", "rain_mm", "pop")):
+        """Hour-by-hour values over the forecast, interpolated between steps
+
+        Rain and snow are spread evenly over their step, so they are mm per hour.
+        """
+        hours = np.arange(self.time[0], self.time[-1] + 1, 3600) if len(self) else self.time
+        frame = pd.DataFrame({"time": pd.to_datetime(hours + self.utc_offset, unit="s")})
+        for name in fields:
+            if name in ("rain_mm", "snow_mm"):
+                # Amounts fall over the STEP_HOURS ending at each step
+                step = np.searchsorted(self.time, hours)
+                frame[name] = self.field(name)[np.minimum(step, len(self) - 1)] / self.STEP_HOURS
+            else:
+                frame[name] = np.interp(hours, self.time, self.field(name).astype(np.float64))
+        return frame
+
+    def window(self, hours=24, start=None):
+        """Totals and extremes over the next ``hours``: temperature range, precipitation, peak wind"""
+        start = time.time() if start is None else start
+        within = (self.time > start) & (self.time <= start + hours * 3600)
+        if not within.any():
+            return {"temp_min": np.nan, "temp_max": np.nan, "precip_mm": 0.0, "wind_max": np.nan}
+        temperature = self.field("temperature")[within]
+        return {
+            "temp_min": float(temperature.min()),
+            "temp_max": float(temperature.max()),
+            "precip_mm": float((self.field("rain_mm") + self.field("snow_mm"))[within].sum()),
+            "wind_max": float(np.nanmax(np.fmax(self.field("wind_speed"),
+                                                self.field("wind_gust"))[within])),
+        }
+
+
+def parse_weather(current, forecast):
+    """Current conditions plus a 5-day outlook in the app's weather format
+
+    ``forecast`` holds one summary per day; ``outlook`` is the full Forecast.
+    """
+    outlook = Forecast.from_response(forecast)
+    daily = outlook.daily().head(5)
+    forecast_data = [{
+        "day": row.day,
+        "temp": round(float(row.temp_max)),
+        "temp_min": round(float(row.temp_min)),
+        "precip_mm": round(float(row.precip_mm), 1),
+        "wind_max": round(float(row.gust_max)),
+        "condition": row.condition
+    } for row in daily.itertuples()]
+    return {
+        "temperature": round(current['main']['temp']),
+        "feels_like": round(current['main']['feels_like']),
+        "humidity": current['main']['humidity'],
+        "pressure": current['main']['pressure'],
+        "wind_speed": round(current['wind']['speed'] * 3.6, 1),  # Convert m/s to km/h
+        "wind_direction": degrees_to_direction(current['wind']['deg']),
+        "clouds": current['clouds']['all'],
+        "description": current['weather'][0]['description'],
+        "icon": current['weather'][0]['icon'],
+        "forecast": forecast_data,
+        "outlook": outlook
+    }
+
+
+class WeatherService:
+    """Weather for one location, served from cache and refreshed in the background
+
+    ``get()`` never waits on the network: it returns the cached weather,
+    even once it is older than ``ttl`` seconds, and starts a background
+    refresh if it is stale (stale-while-revalidate). Until a first fetch
+    succeeds it returns ``fallback()``. A refresh fetches current
+    conditions and the forecast concurrently; after a failure the next
+    attempt waits ``retry_seconds`` and ``last_error`` says what went wrong.
+    ``close()`` stops its worker threads.
+    """
+
+    def __init__(self, client, lat, lon, ttl=1800, fallback=None, retry_seconds=60):
+        self.client = client
+        self.lat = lat
+        self.lon = lon
+        self.ttl = ttl
+        self.fallback = fallback
+        self.retry_seconds = retry_seconds
+        self.last_error = None
+        self._value = None
+        self._fetched_at = None
+        self._next_attempt = 0.0
+        self._refreshing = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-refresh")
+        self._fetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-fetch")
+
+    @property
+    def age(self):
+        """Seconds since the cached weather was fetched, or None"""
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    @property
+    def is_stale(self):
+        return self._fetched_at is None or self.age >= self.ttl
+
+    def get(self):
+        """Cached weather (or the fallback), starting a refresh if it is stale"""
+        with self._lock:
+            value = self._value
+            if (self.is_stale and not self._refreshing and not self._closed
+                    and time.monotonic() >= self._next_attempt):
+                self._refreshing = True
+                self._pool.submit(self._refresh)
+        if value is None and self.fallback is not None:
+            return self.fallback()
+        return value
+
+    def refresh(self, wait=False):
+        """Refresh now, in the background unless ``wait``"""
+        with self._lock:
+            self._next_attempt = 0.0
+            if self._closed or (self._refreshing and not wait):
+                return
+            self._refreshing = True
+        if wait:
+            self._refresh()
+        else:
+            self._pool.submit(self._refresh)
+
+    def _refresh(self):
+        try:
+            current = self._fetch_pool.submit(self.client.current, self.lat, self.lon)
+            forecast = self._fetch_pool.submit(self.client.forecast, self.lat, self.lon)
+            value = parse_weather(current.result(), forecast.result())
+            with self._lock:
+                self._value = value
+                self._fetched_at = time.monotonic()
+                self.last_error = None
+        except Exception as e:
+            with self._lock:
+                self.last_error = e
+                self._next_attempt = time.monotonic() + self.retry_seconds
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def close(self):
+        """Stop the worker threads; the cached values stay readable"""
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Per-cell fields of a WeatherGrid, from current conditions
+GRID_FIELDS = ("temperature", "humidity", "wind_speed", "rain_mm")
+
+
+def grid_values(current):
+    """GRID_FIELDS of one current-conditions response; rain in mm over the last hour"""
+    rain = current.get('rain', {})
+    return (current['main']['temp'], current['main']['humidity'],
+            current['wind']['speed'] * 3.6,  # km/h
+            rain.get('1h', rain.get('3h', 0.0) / 3))
+
+
+class WeatherGrid:
+    """Current weather over a service area, on a lattice of about ``cell_km`` cells
+
+    Only cells holding at least one point (bin) are fetched, coarsening
+    the lattice until there are at most ``max_cells``. Cells are cached
+    individually and refreshed in the background once older than ``ttl``,
+    with at most ``max_concurrent`` requests in flight; if a whole wave of
+    requests fails (e.g. a bad API key) the rest of the refresh is
+    abandoned and retried after ``retry_seconds``.
+
+    ``at()`` interpolates bilinearly between the four cell centres around
+    each point, straight from lattice coordinates, so looking up every bin
+    costs a few array operations. Points whose surrounding cells have no
+    data take the nearest fetched cell; before any fetch succeeds every
+    value is NaN. ``close()`` stops its worker threads.
+    """
+
+    def __init__(self, client, latitude, longitude, cell_km=2.0, max_cells=64, ttl=1800,
+                 max_concurrent=4, retry_seconds=60):
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        self.client = client
+        self.ttl = ttl
+        self.max_concurrent = max_concurrent
+        self.retry_seconds = retry_seconds
+        self.last_error = None
+
+        self.south, self.west = latitude.min(), longitude.min()
+        while True:
+            self.dlat = cell_km / KM_PER_DEGREE
+            self.dlon = self.dlat / np.cos(np.radians(latitude.mean()))
+            i = ((latitude - self.south) // self.dlat).astype(np.int64)
+            j = ((longitude - self.west) // self.dlon).astype(np.int64)
+            self.shape = (int(i.max()) + 1, int(j.max()) + 1)
+            cells = np.unique(i * self.shape[1] + j)
+            if len(cells) <= max_cells:
+                break
+            cell_km *= np.sqrt(len(cells) / max_cells)
+        self.cell_km = cell_km
+        self.cells = cells  # Flat lattice index of each fetched cell
+        ci, cj = np.divmod(cells, self.shape[1])
+        self.latitude = self.south + (ci + 0.5) * self.dlat
+        self.longitude = self.west + (cj + 0.5) * self.dlon
+
+        self._values = np.full((self.shape[0] * self.shape[1], len(GRID_FIELDS)), np.nan)
+        self._fetched_at = np.full(len(cells), -np.inf)
+        self._next_attempt = 0.0
+        self._refreshing = False
+        self._listeners = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-grid")
+        self._fetch_pool = ThreadPoolExecutor(max_workers=max_concurrent,
+                                              thread_name_prefix="weather-cell")
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add_listener(self, listener):
+        """Call ``listener(ts, latitude, longitude, values)`` with the cells each refresh fetched
+
+        ``values`` is (cells x GRID_FIELDS), e.g. for a WeatherArchive.
+        """
+        self._listeners.append(listener)
+
+    @property
+    def fetched(self):
+        """Number of cells holding data"""
+        return int(np.isfinite(self._fetched_at).sum())
+
+    def _stale(self):
+        return np.flatnonzero(time.monotonic() - self._fetched_at >= self.ttl)
+
+    def get(self):
+        """This grid, after starting a background refresh of any stale cells"""
+        with self._lock:
+            if (not self._refreshing and not self._closed
+                    and time.monotonic() >= self._next_attempt and len(self._stale())):
+                self._refreshing = True
+                self._pool.submit(self._refresh)
+        return self
+
+    def refresh(self, wait=False):
+        """Refresh the stale cells now, in the background unless ``wait``"""
+        with self._lock:
+            self._next_attempt = 0.0
+            if self._closed or (self._refreshing and not wait):
+                return
+            self._refreshing = True
+        if wait:
+            self._refresh()
+        else:
+            self._pool.submit(self._refresh)
+
+    def _refresh(self):
+        updated = []
+        try:
+            stale = self._stale()
+            for start in range(0, len(stale), self.max_concurrent):
+                wave = stale[start:start + self.max_concurrent]
+                futures = [self._fetch_pool.submit(self.client.current,
+                                                   self.latitude[c], self.longitude[c])
+                           for c in wave]
+                failed = 0
+                for c, future in zip(wave, futures):
+                    try:
+                        values = grid_values(future.result())
+                    except Exception as e:
+                        failed += 1
+                        self.last_error = e
+                        continue
+                    with self._lock:
+                        self._values[self.cells[c]] = values
+                        self._fetched_at[c] = time.monotonic()
+                    updated.append(c)
+                if failed == len(wave):
+                    with self._lock:
+                        self._next_attempt = time.monotonic() + self.retry_seconds
+                    return
+            self.last_error = None
+        finally:
+            with self._lock:
+                self._refreshing = False
+            if updated:
+                updated = np.asarray(updated)
+                values = self._values[self.cells[updated]]
+                for listener in self._listeners:
+                    listener(time.time(), self.latitude[updated], self.longitude[updated], values)
+
+    def close(self):
+        """Stop the worker threads; the cached values stay readable"""
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+    def at(self, latitude, longitude):
+        """Interpolated GRID_FIELDS at each point, as a dict of arrays"""
+        latitude = np.atleast_1d(np.asarray(latitude, dtype=np.float64))
+        longitude = np.atleast_1d(np.asarray(longitude, dtype=np.float64))
+        u = (latitude - self.south) / self.dlat - 0.5
+        v = (longitude - self.west) / self.dlon - 0.5
+        i0, j0 = np.floor(u).astype(np.int64), np.floor(v).astype(np.int64)
+        fu, fv = u - i0, v - j0
+        with self._lock:
+            values = self._values.copy()
+
+        total = np.zeros((len(latitude), len(GRID_FIELDS)))
+        weight = np.zeros((len(latitude), len(GRID_FIELDS)))
+        for di, dj, w in ((0, 0, (1 - fu) * (1 - fv)), (1, 0, fu * (1 - fv)),
+                          (0, 1, (1 - fu) * fv), (1, 1, fu * fv)):
+            i, j = i0 + di, j0 + dj
+            inside = (i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1])
+            corner = np.full((len(latitude), len(GRID_FIELDS)), np.nan)
+            corner[inside] = values[i[inside] * self.shape[1] + j[inside]]
+            known = np.isfinite(corner)
+            total += np.where(known, corner * w[:, None], 0)
+            weight += np.where(known, w[:, None], 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = total / weight
+
+        # No data around the point: take the nearest cell that has some
+        missing = np.flatnonzero(~np.isfinite(result).all(axis=1))
+        have = np.flatnonzero(np.isfinite(values[self.cells]).all(axis=1))
+        if len(missing) and len(have):
+            dist = haversine_km(latitude[missing, None], longitude[missing, None],
+                                self.latitude[have], self.longitude[have])
+            result[missing] = values[self.cells[have[dist.argmin(axis=1)]]]
+        return dict(zip(GRID_FIELDS, result.T))
+
+    def frame(self):
+        """One row per cell: centre, fields and age (seconds)"""
+        with self._lock:
+            values = self._values[self.cells].copy()
+            age = time.monotonic() - self._fetched_at
+        frame = pd.DataFrame(values, columns=list(GRID_FIELDS))
+        frame.insert(0, "latitude", self.latitude)
+        frame.insert(1, "longitude", self.longitude)
+        frame["age_s"] = np.where(np.isfinite(age), age, np.nan)
+        return frame
+
+
+# Rain from this rate (mm/h) slows trucks by RAIN_SLOWDOWN; lighter rain proportionally less
+HEAVY_RAIN_MM = 7.6
+RAIN_SLOWDOWN = 0.25
+HIGH_WIND_KMH = 40.0
+WIND_SLOWDOWN = 0.10
+
+
+def travel_time_factor(rain_mm, wind_speed):
+    """Multiplier on driving time under local rain (mm/h) and wind (km/h); NaN counts as dry and calm"""
+    rain_mm = np.nan_to_num(np.asarray(rain_mm, dtype=np.float64))
+    wind_speed = np.nan_to_num(np.asarray(wind_speed, dtype=np.float64))
+    return (1 + RAIN_SLOWDOWN * np.minimum(rain_mm / HEAVY_RAIN_MM, 1)
+            + WIND_SLOWDOWN * (wind_speed >= HIGH_WIND_KMH))
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from forecasting import fit_fill_rates
+from spatial import haversine_km
+
+# Daily weather the model learns from: degrees above HEAT_BASE_C at the day's
+# warmest, rain over the day (mm) and the day's peak sustained wind (km/h)
+IMPACT_FEATURES = ("heat", "rain", "wind")
+HEAT_BASE_C = 20.0
+
+# A day counts towards overflow risk when the bin's mean fill is at least this (%)
+RISK_FILL = 80.0
+
+
+def weather_features(temp_max, rain_mm, wind_max):
+    """IMPACT_FEATURES stacked on a new last axis"""
+    temp_max = np.asarray(temp_max, dtype=np.float64)
+    heat = np.where(np.isnan(temp_max), np.nan, np.maximum(temp_max - HEAT_BASE_C, 0))
+    return np.stack([heat, np.asarray(rain_mm, dtype=np.float64),
+                     np.asarray(wind_max, dtype=np.float64)], axis=-1)
+
+
+def nearest_place(latitude, longitude, place_lat, place_lon, chunk=4096):
+    """Index of the nearest place to every point"""
+    nearest = np.empty(len(latitude), dtype=np.intp)
+    for start in range(0, len(latitude), chunk):
+        part = slice(start, start + chunk)
+        nearest[part] = haversine_km(np.asarray(latitude)[part, None], np.asarray(longitude)[part, None],
+                                     place_lat, place_lon).argmin(axis=1)
+    return nearest
+
+
+def fill_from_neighbours(place_features, place_lat, place_lon):
+    """Fill each place's missing days from the nearest place observed that day
+
+    Places come and go as the weather grid is rebuilt, so a bin's nearest
+    place may lack most of the history; borrowing day by day from ever
+    farther places keeps every day the archive has anything for.
+    """
+    order = np.argsort(haversine_km(place_lat[:, None], place_lon[:, None], place_lat, place_lon),
+                       axis=1, kind="stable")
+    filled = place_features.copy()
+    for rank in range(1, len(place_lat)):
+        missing = np.isnan(filled)
+        if not missing.any():
+            break
+        filled = np.where(missing, place_features[order[:, rank]], filled)
+    return filled
+
+
+class WeatherImpact:
+    """Per-bin sensitivity of fill rate and overflow risk to the day's weather
+
+    ``rate_coef`` (bins x IMPACT_FEATURES) is the extra fill (%/day) per
+    unit of each feature away from its average, on top of the bin's base
+    rate and weekday effect. ``risk_coef`` is the change in the probability
+    of a day at RISK_FILL or more. Rows follow the bin store at fitting
+    time; bins added later use the fleet-wide coefficients.
+    """
+
+    def __init__(self, bin_ids, rate_coef, risk_coef, fleet_rate, fleet_risk, feature_mean,
+                 observations, days):
+        self.bin_ids = np.asarray(bin_ids)
+        self.rate_coef = rate_coef
+        self.risk_coef = risk_coef
+        self.fleet_rate = fleet_rate
+        self.fleet_risk = fleet_risk
+        self.feature_mean = feature_mean
+        self.observations = observations
+        self.days = days
+        self._last = None
+
+    def __len__(self):
+        return len(self.bin_ids)
+
+    @staticmethod
+    def _coef(coef, fleet, bins):
+        if bins <= len(coef):
+            return coef[:bins]
+        return np.vstack([coef, np.tile(fleet, (bins - len(coef), 1))])
+
+    def rate_effect(self, features, bins=None):
+        """(bins x days) extra fill %/day for the given (days x IMPACT_FEATURES); none where NaN"""
+        deviation = np.nan_to_num(np.atleast_2d(features) - self.feature_mean)
+        return self._coef(self.rate_coef, self.fleet_rate, bins or len(self)) @ deviation.T
+
+    def risk_effect(self, features, bins=None):
+        """(bins x days) change in the probability of a day at RISK_FILL or more"""
+        deviation = np.nan_to_num(np.atleast_2d(features) - self.feature_mean)
+        return self._coef(self.risk_coef, self.fleet_risk, bins or len(self)) @ deviation.T
+
+    def contributions(self, features):
+        """Fleet-wide extra fill %/day from each feature, for one day's features"""
+        deviation = np.nan_to_num(np.asarray(features, dtype=np.float64) - self.feature_mean)
+        return dict(zip(IMPACT_FEATURES, self.fleet_rate * deviation))
+
+    @staticmethod
+    def forecast_features(outlook, start, horizon):
+        """(horizon x IMPACT_FEATURES) for the days after ``start`` from a weather Forecast, NaN past its end"""
+        daily = outlook.daily()
+        features = np.full((horizon, len(IMPACT_FEATURES)), np.nan)
+        offset = (daily["date"].to_numpy().astype("datetime64[D]")
+                  - np.datetime64(start, "D")).astype(np.int64) - 1
+        use = (offset >= 0) & (offset < horizon)
+        features[offset[use]] = weather_features(daily["temp_max"].to_numpy()[use],
+                                                 daily["precip_mm"].to_numpy()[use],
+                                                 daily["wind_max"].to_numpy()[use])
+        return features
+
+    def forecast_effect(self, outlook, bins, start, horizon):
+        """Rate effect (bins x horizon) for the ``horizon`` days after ``start`` under a weather Forecast
+
+        Days the forecast does not reach get no effect. The last result is
+        memoized, so every render in between forecast refreshes reuses it.
+        """
+        key = (outlook, bins, start, horizon)
+        if self._last is not None and self._last[0] == key:
+            return self._last[1]
+        effect = self.rate_effect(self.forecast_features(outlook, start, horizon), bins)
+        self._last = (key, effect)
+        return effect
+
+    def frame(self):
+        """Coefficients per bin, one column per target and feature"""
+        frame = pd.DataFrame({"bin_id": self.bin_ids, "days": self.observations})
+        for i, name in enumerate(IMPACT_FEATURES):
+            frame[f"rate_{name}"] = self.rate_coef[:, i]
+        for i, name in enumerate(IMPACT_FEATURES):
+            frame[f"risk_{name}"] = self.risk_coef[:, i]
+        return frame
+
+
+def _normal_equations(X, y, valid):
+    """Per-bin X'X and X'y over the valid days, in one batched pass"""
+    Xv = np.where(valid[..., None], X, 0.0)
+    return (np.einsum("bdk,bdl->bkl", Xv, Xv),
+            np.einsum("bdk,bd->bk", Xv, np.where(valid, y, 0.0)))
+
+
+def _shrunk_solve(xtx, xty, shrinkage):
+    """Per-bin least squares shrunk towards the pooled fit by ``shrinkage`` average days"""
+    pooled_xtx, pooled_xty = xtx.sum(axis=0), xty.sum(axis=0)
+    k = len(pooled_xty)
+    days = max(pooled_xtx[0, 0], 1.0)  # The intercept column counts the observations
+    ridge = 1e-6 * np.eye(k)
+    # Least norm, so a feature that never varied gets no effect
+    pooled = np.linalg.lstsq(pooled_xtx, pooled_xty, rcond=None)[0]
+    prior = shrinkage * pooled_xtx / days + ridge
+    return np.linalg.solve(xtx + prior, (xty + prior @ pooled)[..., None])[..., 0], pooled
+
+
+def fit_weather_impact(history, weekdays, place_features, place_of_bin, bin_ids,
+                       shrinkage=14.0, chunk=2048, progress=None):
+    """Fit every bin's weather sensitivity at once with batched regressions
+
+    ``history`` is (bins x days) daily mean fill %, newest last, NaN where
+    missing, and ``weekdays`` the weekday of each day. ``place_features``
+    is (places x days x IMPACT_FEATURES) of daily weather, NaN where
+    missing, and ``place_of_bin`` maps bins to places.
+
+    Fill rate: day-over-day increments (drops are collections and are
+    ignored) less the bin's base rate and weekday effect from
+    ``fit_fill_rates`` are regressed on the centred features. Overflow
+    risk: whether the day's mean fill is at least RISK_FILL, as a linear
+    probability model. Both are solved per bin from batched normal
+    equations, shrunk towards the pooled fleet fit by ``shrinkage`` days'
+    worth of data. ``progress(done, total)`` is called per chunk of bins.
+    """
+    bins, days = history.shape
+    daily_rate, weekday_effect = fit_fill_rates(history, weekdays)
+    weekdays = np.asarray(weekdays)
+    # Weather of the day each increment ends on
+    features = place_features[:, 1:]
+    known = ~np.isnan(features).any(axis=-1)
+    feature_mean = np.nanmean(features[known], axis=0) if known.any() \
+        else np.zeros(len(IMPACT_FEATURES))
+
+    k = len(IMPACT_FEATURES) + 1
+    rate_xtx, rate_xty = np.zeros((bins, k, k)), np.zeros((bins, k))
+    risk_xtx, risk_xty = np.zeros((bins, k, k)), np.zeros((bins, k))
+    observations = np.zeros(bins, dtype=np.int64)
+    for start in range(0, bins, chunk):
+        part = slice(start, start + chunk)
+        place = place_of_bin[part]
+        X = np.concatenate([np.ones(known[place].shape + (1,)),
+                            np.nan_to_num(features[place] - feature_mean)], axis=-1)
+        fill = history[part]
+        increments = np.diff(fill, axis=1)
+        with np.errstate(invalid="ignore"):
+            rate_valid = known[place] & (increments >= 0)
+            risk = (fill[:, 1:] >= RISK_FILL).astype(np.float64)
+        residual = increments - daily_rate[part, None] - weekday_effect[part][:, weekdays[1:]]
+        rate_xtx[part], rate_xty[part] = _normal_equations(X, residual, rate_valid)
+        risk_valid = known[place] & ~np.isnan(fill[:, 1:])
+        risk_xtx[part], risk_xty[part] = _normal_equations(X, risk, risk_valid)
+        observations[part] = rate_valid.sum(axis=1)
+        if progress is not None:
+            progress(min(start + chunk, bins), bins)
+
+    rate_coef, fleet_rate = _shrunk_solve(rate_xtx, rate_xty, shrinkage)
+    risk_coef, fleet_risk = _shrunk_solve(risk_xtx, risk_xty, shrinkage)
+    # Drop the intercepts: effects are relative to average weather
+    return WeatherImpact(bin_ids, rate_coef[:, 1:], risk_coef[:, 1:], fleet_rate[1:],
+                         fleet_risk[1:], feature_mean, observations, days)
+
+
+def learn_weather_impact(reading_archive, weather_archive, bin_ids, latitude, longitude, end,
+                         days=180, shrinkage=14.0, progress=None):
+    """Join archived daily fill with archived weather near each bin and fit the impact model"""
+    place_lat, place_lon, daily = weather_archive.daily(end, days)
+    if not len(place_lat):
+        raise ValueError("No archived weather to learn from")
+    history = reading_archive.daily_means(bin_ids, end, days)
+    first_day = int(end // 86400) - days + 1
+    weekdays = (first_day + np.arange(days) + 3) % 7  # 1970-01-01 was a Thursday
+    place_features = fill_from_neighbours(
+        weather_features(daily["temp_max"], daily["rain_mm"], daily["wind_max"]), place_lat, place_lon)
+    place_of_bin = nearest_place(latitude, longitude, place_lat, place_lon)
+    return fit_weather_impact(history, weekdays, place_features, place_of_bin, bin_ids,
+                              shrinkage=shrinkage, progress=progress)
@@ -0,0 +1,118 @@
+"""Local stand-in for the OpenWeather API, for tests and benchmarks
+
+Serves ``/weather`` and ``/forecast`` (5 days of 3-hour steps) with
+deterministic synthetic data for any coordinates, after an optional
+artificial latency. Point ``OPENWEATHER_URL`` in app.py at it, or use it
+in-process:
+
+    with StubWeatherServer(latency=0.5) as server:
+        client = WeatherClient("test", base_url=server.url)
+
+    python weather_stub.py --port 8765 --latency 0.2
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONDITIONS = ("Clear", "Clouds", "Rain", "Clouds", "Drizzle", "Clear", "Thunderstorm")
+
+
+def synthetic_conditions(lat, lon, ts):
+    """Deterministic OpenWeather-shaped conditions for a place and time"""
+    phase = (ts / 86400 + lat * 3 + lon * 7) * 2 * math.pi
+    temp = 18 + 8 * math.sin(phase) + (lat - 40) * 2
+    main = CONDITIONS[int(ts // 10800 + abs(lat * 100) + abs(lon * 100)) % len(CONDITIONS)]
+    rain = 2.5 * (1 + math.sin(phase / 3)) if main in ("Rain", "Drizzle", "Thunderstorm") else 0.0
+    return {
+        "dt": int(ts),
+        "main": {"temp": round(temp, 2), "feels_like": round(temp + 1, 2),
+                 "temp_min": round(temp - 1.5, 2), "temp_max": round(temp + 1.5, 2),
+                 "humidity": int(60 + 25 * math.cos(phase)), "pressure": 1013},
+        "wind": {"speed": round(4 + 3 * abs(math.sin(phase / 2)), 2),
+                 "deg": int((lat + lon) * 1000 + ts / 3600) % 360},
+        "clouds": {"all": int(50 + 50 * math.sin(phase / 5))},
+        "weather": [{"main": main, "description": main.lower(), "icon": "02d"}],
+        "rain": {"3h": round(rain, 2)},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            lat, lon = float(query["lat"][0]), float(query["lon"][0])
+        except (KeyError, ValueError):
+            self.send_error(400, "lat and lon are required")
+            return
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        now = time.time()
+        if endpoint == "weather":
+            body = synthetic_conditions(lat, lon, now)
+        elif endpoint == "forecast":
+            start = (now // 10800 + 1) * 10800
+            body = {"cnt": 40, "list": [synthetic_conditions(lat, lon, start + i * 10800)
+                                        for i in range(40)]}
+        else:
+            self.send_error(404)
+            return
+        self.server.stub.requests += 1
+        time.sleep(self.server.stub.latency)
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubWeatherServer:
+    """OpenWeather stand-in on a local port (0 picks a free one), in a background thread"""
+
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenWeather API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+    server = StubWeatherServer(args.port, args.latency)
+    print(f"Serving stand-in weather on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()